@@ -2,14 +2,21 @@
 Audit log support for Flask routes.
 
 """
+from atexit import register
 from collections import namedtuple
 from contextlib import contextmanager
 from distutils.util import strtobool
-from functools import wraps
+from functools import lru_cache, wraps
 from json import loads
 from logging import DEBUG, getLogger
+from queue import Full, Queue
+from random import random
+from re import compile as re_compile
+from sys import exc_info
+from threading import Lock, Thread
 from traceback import format_exc
 from uuid import UUID
+from zlib import crc32
 
 from flask import current_app, g, request
 from inflection import underscore
@@ -17,12 +24,14 @@ from microcosm.api import defaults, typed
 from microcosm.config.types import boolean
 from microcosm_logging.timing import elapsed_time
 
+from microcosm_flask.conventions.encoding import decode_request_json
 from microcosm_flask.errors import (
     extract_context,
     extract_error_message,
     extract_include_stack_trace,
     extract_status_code,
 )
+from microcosm_flask.timing import get_phase_timings
 
 
 DEFAULT_INCLUDE_REQUEST_BODY = 400
@@ -35,13 +44,33 @@ AuditOptions = namedtuple("AuditOptions", [
     "include_path",
     "include_query_string",
     "log_as_debug",
-])
+    "sink",
+    "sampler",
+], defaults=(False, None, None))
+
+
+# backpressure policies for asynchronous audit logging
+BLOCK = "block"
+DROP = "drop"
+SAMPLE = "sample"
 
 
 SKIP_LOGGING = "_microcosm_flask_skip_audit_logging"
 
+UUID_PATTERN = re_compile(r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}")
+ID_HEADER_PATTERN = re_compile(r"X-([^-]+)-Id")
+
 
 def is_uuid(value):
+    try:
+        # fast path: canonical (and unhyphenated) UUIDs and short values
+        if UUID_PATTERN.fullmatch(value):
+            return True
+        if len(value) < 32:
+            return False
+    except TypeError:
+        pass
+
     try:
         UUID(value)
         return True
@@ -49,6 +78,21 @@ def is_uuid(value):
         return False
 
 
+@lru_cache(maxsize=256)
+def id_header_field(key):
+    """
+    Map an `X-<>-Id` header (see `encode_id_header`) to an audit log field.
+
+    Returns None for other headers.
+
+    """
+    matcher = ID_HEADER_PATTERN.fullmatch(key)
+    if matcher is None:
+        return None
+
+    return "{}_id".format(underscore(matcher.group(1)))
+
+
 def skip_logging(func):
     """
     Decorate a function so logging will be skipped.
@@ -112,87 +156,94 @@ class RequestInfo:
     """
     Capture of key information for requests.
 
+    Request data is read lazily (and only if it will be logged).
+
     """
+    __slots__ = (
+        "options",
+        "func",
+        "request",
+        "app",
+        "request_context",
+        "timing",
+        "error",
+        "exc_info",
+        "stack_trace",
+        "request_body",
+        "response_body",
+        "response_headers",
+        "status_code",
+        "success",
+        "sample_rate",
+    )
+
     def __init__(self, options, func, request_context):
         self.options = options
-        self.operation = request.endpoint
-        self.func = func.__name__
-        self.method = request.method
-        self.args = request.args
-        self.view_args = request.view_args
+        self.func = func
+        # NB: resolve context locals once
+        self.request = request._get_current_object()
+        self.app = current_app._get_current_object()
         self.request_context = request_context
         self.timing = dict()
 
         self.error = None
+        self.exc_info = None
         self.stack_trace = None
         self.request_body = None
         self.response_body = None
         self.response_headers = None
         self.status_code = None
         self.success = None
+        self.sample_rate = None
 
-    def to_dict(self):
-        dct = dict(
-            operation=self.operation,
-            func=self.func,
-            method=self.method,
-            **self.timing
-        )
-        if self.options.include_path and self.view_args:
-            dct.update({
-                key: value
-                for key, value in self.view_args.items()
-            })
-        if self.options.include_query_string and self.args:
-            dct.update({
-                key: values[0]
-                for key, values in self.args.lists()
-                if len(values) == 1 and is_uuid(values[0])
-            })
+    @property
+    def operation(self):
+        return self.request.endpoint
 
-        if self.request_context is not None:
-            dct.update(self.request_context())
+    def snapshot(self):
+        """
+        Capture everything that depends on the request (or app) context.
 
-        if self.success is True:
-            dct.update(
-                success=self.success,
-                status_code=self.status_code,
-            )
-        if self.success is False:
-            dct.update(
-                success=self.success,
-                message=extract_error_message(self.error)[:2048],
-                context=extract_context(self.error),
-                stack_trace=self.stack_trace,
-                status_code=self.status_code,
-            )
+        Formatting the record is deferred (see `AuditRecord`).
 
-        self.post_process_request_body(dct)
-        self.post_process_response_body(dct)
-        self.post_process_response_headers(dct)
+        """
+        request_g = g._get_current_object()
+
+        return AuditRecord(
+            options=self.options,
+            operation=self.request.endpoint,
+            func=self.func.__name__,
+            method=self.request.method,
+            args=self.request.args if self.options.include_query_string else None,
+            view_args=self.request.view_args if self.options.include_path else None,
+            context=None if self.request_context is None else self.request_context(),
+            timing=dict(self.timing),
+            phase_timings=dict(get_phase_timings()),
+            error=self.error,
+            exc_info=self.exc_info,
+            stack_trace=self.stack_trace,
+            request_body=self.request_body,
+            response_body=self.response_body,
+            response_headers=None if not self.response_headers else list(self.response_headers.items()),
+            status_code=self.status_code,
+            success=self.success,
+            sample_rate=self.sample_rate,
+            hide_body=request_g.get("hide_body"),
+            show_request_fields=request_g.get("show_request_fields", {}),
+            hide_request_fields=request_g.get("hide_request_fields", []),
+            show_response_fields=request_g.get("show_response_fields", {}),
+            hide_response_fields=request_g.get("hide_response_fields", []),
+            debug=self.app.debug or self.app.testing,
+        )
 
-        return dct
+    def to_dict(self):
+        return self.snapshot().to_dict()
 
     def log(self, logger):
-        if self.status_code == 500:
-            # something actually went wrong; investigate
-            dct = self.to_dict()
-
-            if current_app.debug or current_app.testing:
-                message = dct.pop("message")
-                logger.warning(message, extra=dct, exc_info=True)
-            else:
-                logger.warning(dct)
-        else:
-            # usually log at INFO; a raised exception can be an error or
-            # expected behavior (e.g. 404)
-            if not self.options.log_as_debug:
-                logger.info(self.to_dict())
-            else:
-                logger.debug(self.to_dict())
+        self.snapshot().log(logger)
 
     def capture_request(self):
-        if not current_app.debug:
+        if not self.app.debug:
             # only capture request body on debug
             return
 
@@ -201,25 +252,26 @@ class RequestInfo:
             return
 
         if (
-                request.content_length and
+                self.request.content_length and
                 self.options.include_request_body is not True and
-                request.content_length >= self.options.include_request_body
+                self.request.content_length >= self.options.include_request_body
         ):
             # don't capture request body if it's too large
             return
 
-        if not request.get_json(force=True, silent=True):
+        request_json = decode_request_json()
+        if not request_json:
             # only capture request body if json
             return
 
-        self.request_body = request.get_json(force=True)
+        self.request_body = request_json
 
     def capture_response(self, response):
         self.success = True
 
         body, self.status_code, self.response_headers = parse_response(response)
 
-        if not current_app.debug:
+        if not self.app.debug:
             # only capture responsebody on debug
             return
 
@@ -238,11 +290,8 @@ class RequestInfo:
             # don't capture response body if it's too large
             return
 
-        try:
-            self.response_body = loads(body)
-        except (TypeError, ValueError):
-            # not json
-            pass
+        # NB: decoded when the record is formatted
+        self.response_body = body
 
     def capture_error(self, error):
         self.error = error
@@ -250,47 +299,164 @@ class RequestInfo:
         self.success = 0 < self.status_code < 400
         include_stack_trace = extract_include_stack_trace(error)
         self.stack_trace = format_exc(limit=10) if (not self.success and include_stack_trace) else None
+        if self.status_code == 500 and (self.app.debug or self.app.testing):
+            self.exc_info = exc_info()
+
+
+class AuditRecord(namedtuple("AuditRecord", [
+    "options",
+    "operation",
+    "func",
+    "method",
+    "args",
+    "view_args",
+    "context",
+    "timing",
+    "phase_timings",
+    "error",
+    "exc_info",
+    "stack_trace",
+    "request_body",
+    "response_body",
+    "response_headers",
+    "status_code",
+    "success",
+    "sample_rate",
+    "hide_body",
+    "show_request_fields",
+    "hide_request_fields",
+    "show_response_fields",
+    "hide_response_fields",
+    "debug",
+])):
+    """
+    An (immutable) snapshot of a request for the audit log.
+
+    Records do not depend on the request context and may be formatted on another thread.
+
+    """
+    def to_dict(self):
+        dct = dict(
+            operation=self.operation,
+            func=self.func,
+            method=self.method,
+            **self.timing
+        )
+        if self.options.include_path and self.view_args:
+            dct.update({
+                key: value
+                for key, value in self.view_args.items()
+            })
+        if self.options.include_query_string and self.args:
+            dct.update({
+                key: values[0]
+                for key, values in self.args.lists()
+                if len(values) == 1 and is_uuid(values[0])
+            })
+
+        if self.context is not None:
+            dct.update(self.context)
+
+        if self.success is True:
+            dct.update(
+                success=self.success,
+                status_code=self.status_code,
+            )
+        if self.success is False:
+            dct.update(
+                success=self.success,
+                message=extract_error_message(self.error)[:2048],
+                context=extract_context(self.error),
+                stack_trace=self.stack_trace,
+                status_code=self.status_code,
+            )
+
+        if self.sample_rate is not None:
+            dct.update(
+                sample_rate=self.sample_rate,
+            )
+
+        if self.phase_timings:
+            dct.update(
+                phase_timings=self.phase_timings,
+            )
+
+        self.post_process_request_body(dct)
+        self.post_process_response_body(dct)
+        self.post_process_response_headers(dct)
+
+        return dct
+
+    def log(self, logger):
+        if self.status_code == 500:
+            # something actually went wrong; investigate
+            dct = self.to_dict()
+
+            if self.debug:
+                message = dct.pop("message")
+                logger.warning(message, extra=dct, exc_info=self.exc_info or True)
+            else:
+                logger.warning(dct)
+        else:
+            # usually log at INFO; a raised exception can be an error or
+            # expected behavior (e.g. 404)
+            if not self.options.log_as_debug:
+                logger.info(self.to_dict())
+            else:
+                logger.debug(self.to_dict())
 
     def post_process_request_body(self, dct):
-        if g.get("hide_body") or not self.request_body:
+        if self.hide_body or not self.request_body:
             return
 
-        for name, new_name in g.get("show_request_fields", {}).items():
+        # NB: the decoded request body may be shared (see `decode_request_json`)
+        request_body = dict(self.request_body) if isinstance(self.request_body, dict) else self.request_body
+
+        for name, new_name in self.show_request_fields.items():
             try:
-                value = self.request_body.pop(name)
-                self.request_body[new_name] = value
+                value = request_body.pop(name)
+                request_body[new_name] = value
             except KeyError:
                 pass
 
-        for field in g.get("hide_request_fields", []):
+        for field in self.hide_request_fields:
             try:
-                del self.request_body[field]
+                del request_body[field]
             except KeyError:
                 pass
 
         dct.update(
-            request_body=self.request_body,
+            request_body=request_body,
         )
 
     def post_process_response_body(self, dct):
-        if g.get("hide_body") or not self.response_body:
+        if self.hide_body or not self.response_body:
+            return
+
+        try:
+            response_body = loads(self.response_body)
+        except (TypeError, ValueError):
+            # not json
             return
 
-        for name, new_name in g.get("show_response_fields", {}).items():
+        if not response_body:
+            return
+
+        for name, new_name in self.show_response_fields.items():
             try:
-                value = self.response_body.pop(name)
-                self.response_body[new_name] = value
+                value = response_body.pop(name)
+                response_body[new_name] = value
             except KeyError:
                 pass
 
-        for field in g.get("hide_response_fields", []):
+        for field in self.hide_response_fields:
             try:
-                del self.response_body[field]
+                del response_body[field]
             except KeyError:
                 pass
 
         dct.update(
-            response_body=self.response_body,
+            response_body=response_body,
         )
 
     def post_process_response_headers(self, dct):
@@ -300,16 +466,202 @@ class RequestInfo:
         if not self.response_headers:
             return
 
-        for key, value in self.response_headers.items():
-            parts = key.split("-")
-            if len(parts) != 3:
-                continue
-            if parts[0] != "X":
-                continue
-            if parts[-1] != "Id":
-                continue
+        for key, value in self.response_headers:
+            field = id_header_field(key)
+            if field is not None:
+                dct[field] = value
+
+
+class SynchronousAuditSink:
+    """
+    Write audit records on the request thread.
+
+    """
+    def emit(self, record, logger):
+        record.log(logger)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class AsynchronousAuditSink:
+    """
+    Write audit records on a background thread.
+
+    Records are passed through a bounded queue; when the queue fills up, records are handled
+    according to a backpressure policy:
+
+     -  `drop` discards new records
+     -  `block` waits for the writer to catch up
+     -  `sample` keeps only a fraction (`sample_rate`) of new records once the queue is half
+        full, and discards new records once it is full
+
+    Discarded records are counted (and periodically reported). Pending records are flushed
+    on exit.
+
+    """
+    STOP = object()
+
+    def __init__(self, queue_size=10000, backpressure=DROP, sample_rate=0.1):
+        if backpressure not in (BLOCK, DROP, SAMPLE):
+            raise ValueError("Unsupported audit backpressure policy: {}".format(backpressure))
+
+        self.queue = Queue(maxsize=queue_size)
+        self.backpressure = backpressure
+        self.sample_rate = sample_rate
+
+        self.dropped = 0
+        self.sampled_out = 0
+        self.reported = 0
+
+        self.lock = Lock()
+        self.thread = None
+        register(self.close)
+
+    def start(self):
+        # NB: start lazily (e.g. after forking worker processes)
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self.run, name="audit", daemon=True)
+                self.thread.start()
+
+    def emit(self, record, logger):
+        self.start()
+
+        if self.backpressure == BLOCK:
+            self.queue.put((record, logger))
+            return
+
+        if (
+                self.backpressure == SAMPLE and
+                self.queue.qsize() * 2 >= self.queue.maxsize and
+                random() >= self.sample_rate
+        ):
+            with self.lock:
+                self.sampled_out += 1
+            return
+
+        try:
+            self.queue.put_nowait((record, logger))
+        except Full:
+            with self.lock:
+                self.dropped += 1
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is self.STOP:
+                    return
+                record, logger = item
+                record.log(logger)
+                self.report(logger)
+            except Exception:
+                getLogger(__name__).exception("Unable to write audit record")
+            finally:
+                self.queue.task_done()
+
+    def report(self, logger):
+        discarded = self.dropped + self.sampled_out
+        if discarded > self.reported:
+            logger.warning(
+                "Discarded audit records",
+                extra=dict(dropped=self.dropped, sampled_out=self.sampled_out),
+            )
+            self.reported = discarded
+
+    def flush(self):
+        """
+        Wait until all queued records are written.
+
+        """
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    def close(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(self.STOP)
+            self.thread.join()
+
 
-            dct["{}_id".format(underscore(parts[1]))] = value
+SYNCHRONOUS_AUDIT_SINK = SynchronousAuditSink()
+
+
+class AuditSampler:
+    """
+    Decide which requests are written to the audit log.
+
+    Errors (and 5xx responses) and slow requests are always logged; other requests are
+    logged at a rate configured per endpoint (e.g. `foo.search.v1`), per operation (e.g.
+    `search`), or by default.
+
+    Sampling is deterministic in the request id (if any), so that services that share
+    the same rates make the same decision for a given request.
+
+    """
+    def __init__(self, rate=1.0, rates=None, slow_request_threshold_ms=None, header="X-Request-Id"):
+        self.rate = rate
+        self.rates = rates or dict()
+        self.slow_request_threshold_ms = slow_request_threshold_ms
+        self.header = header
+
+    @property
+    def enabled(self):
+        return self.rate < 1.0 or any(rate < 1.0 for rate in self.rates.values())
+
+    def rate_for(self, endpoint):
+        if not endpoint:
+            return self.rate
+
+        try:
+            return self.rates[endpoint]
+        except KeyError:
+            pass
+
+        parts = endpoint.split(".")
+        if len(parts) > 1:
+            return self.rates.get(parts[1], self.rate)
+
+        return self.rate
+
+    def should_log(self, request_info):
+        """
+        Decide whether to log a request (and record its sample rate).
+
+        """
+        if request_info.error is not None or request_info.success is not True:
+            return True
+
+        if request_info.status_code is not None and request_info.status_code >= 500:
+            return True
+
+        if (
+                self.slow_request_threshold_ms is not None and
+                request_info.timing.get("elapsed_time", 0) >= self.slow_request_threshold_ms
+        ):
+            return True
+
+        rate = self.rate_for(request_info.operation)
+        if rate >= 1.0:
+            return True
+
+        if self.sample(rate, request_info):
+            request_info.sample_rate = rate
+            return True
+
+        return False
+
+    def sample(self, rate, request_info):
+        request_id = request_info.request.headers.get(self.header)
+        if not request_id:
+            return random() < rate
+
+        return crc32(request_id.encode("utf-8")) < rate * 0x100000000
 
 
 def _audit_request(options, func, request_context, *args, **kwargs):  # noqa: C901
@@ -334,8 +686,9 @@ def _audit_request(options, func, request_context, *args, **kwargs):  # noqa: C9
         request_info.capture_response(response)
         return response
     finally:
-        if not should_skip_logging(func):
-            request_info.log(logger)
+        if not should_skip_logging(func) and (options.sampler is None or options.sampler.should_log(request_info)):
+            sink = options.sink or SYNCHRONOUS_AUDIT_SINK
+            sink.emit(request_info.snapshot(), logger)
 
 
 def parse_response(response):
@@ -353,7 +706,9 @@ def parse_response(response):
         elif len(response) > 1:
             return response[0], response[1], {}
     try:
-        return response.data, response.status_code, response.headers
+        # NB: do not buffer streamed responses
+        body = None if getattr(response, "is_streamed", False) is True else response.data
+        return body, response.status_code, response.headers
     except AttributeError:
         return response, 200, {}
 
@@ -364,17 +719,52 @@ def parse_response(response):
     include_path=typed(type=boolean, default_value=False),
     include_query_string=typed(type=boolean, default_value=False),
     log_as_debug=typed(type=boolean, default_value=False),
+    asynchronous=typed(type=boolean, default_value=False),
+    queue_size=typed(type=int, default_value=10000),
+    backpressure=DROP,
+    backpressure_sample_rate=typed(type=float, default_value=0.1),
+    sample_rate=typed(type=float, default_value=1.0),
+    sample_rates=dict(),
+    sample_header="X-Request-Id",
+    slow_request_threshold_ms=typed(type=int, default_value=None),
 )
 def configure_audit_decorator(graph):
     """
     Configure the audit decorator.
 
+    Audit records are formatted and written on a background thread if `audit.asynchronous`
+    is set (see `AsynchronousAuditSink`); the sink is available as `graph.audit.sink`.
+
+    Successful requests may be sampled using `audit.sample_rate` and `audit.sample_rates`
+    (see `AuditSampler`). Route metrics are unaffected by sampling.
+
     Example Usage:
 
         @graph.audit
         def login(username, password):
             ...
     """
+    if graph.config.audit.asynchronous:
+        sink = AsynchronousAuditSink(
+            queue_size=graph.config.audit.queue_size,
+            backpressure=graph.config.audit.backpressure,
+            sample_rate=graph.config.audit.backpressure_sample_rate,
+        )
+    else:
+        sink = SYNCHRONOUS_AUDIT_SINK
+
+    sampler = AuditSampler(
+        rate=graph.config.audit.sample_rate,
+        rates={
+            key: float(value)
+            for key, value in graph.config.audit.sample_rates.items()
+        },
+        slow_request_threshold_ms=graph.config.audit.slow_request_threshold_ms,
+        header=graph.config.audit.sample_header,
+    )
+    if not sampler.enabled:
+        sampler = None
+
     def _audit(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
@@ -384,7 +774,11 @@ def configure_audit_decorator(graph):
                 include_path=graph.config.audit.include_path,
                 include_query_string=graph.config.audit.include_query_string,
                 log_as_debug=graph.config.audit.log_as_debug,
+                sink=sink,
+                sampler=sampler,
             )
             return _audit_request(options, func, graph.request_context, *args, **kwargs)
         return wrapper
+
+    _audit.sink = sink
     return _audit
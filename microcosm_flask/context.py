@@ -1,12 +1,18 @@
 from flask import request
 from microcosm.api import defaults
 
+from microcosm_flask.profiling import PROFILE_HEADER
+
 
 X_REQUEST = "X-Request"
 HEADER_PREFIXES = [X_REQUEST]
+# headers that carry credentials (and must not be logged)
+EXCLUDE_HEADERS = [PROFILE_HEADER]
+
 
+def context_wrapper(include_header_prefixes, exclude_headers=()):
+    exclude_headers = {header.lower() for header in exclude_headers}
 
-def context_wrapper(include_header_prefixes):
     def retrieve_context():
         context = {
             header: value
@@ -14,7 +20,7 @@ def context_wrapper(include_header_prefixes):
             if any([
                 header.lower().startswith(prefix.lower())
                 for prefix in include_header_prefixes
-            ])
+            ]) and header.lower() not in exclude_headers
         }
         return context
     return retrieve_context
@@ -22,6 +28,7 @@ def context_wrapper(include_header_prefixes):
 
 @defaults(
     include_header_prefixes=HEADER_PREFIXES,
+    exclude_headers=EXCLUDE_HEADERS,
 )
 def configure_request_context(graph):
     """
@@ -33,4 +40,5 @@ def configure_request_context(graph):
 
     """
     include_header_prefixes = graph.config.request_context.include_header_prefixes
-    return context_wrapper(include_header_prefixes)
+    exclude_headers = graph.config.request_context.exclude_headers
+    return context_wrapper(include_header_prefixes, exclude_headers)
@@ -39,7 +39,7 @@ class AliasConvention(Convention):
                 if definition.request_schema
                 else dict()
             )
-            resource = definition.func(**merge_data(path_data, request_data))
+            resource = definition.call(**merge_data(path_data, request_data))
 
             kwargs = dict()
             identifier = "{}_id".format(name_for(ns.subject))
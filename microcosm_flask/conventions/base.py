@@ -6,6 +6,8 @@ from werkzeug.exceptions import NotAcceptable
 
 from microcosm_flask.conventions.encoding import find_response_format
 from microcosm_flask.operations import Operation
+from microcosm_flask.serializing import compile_schema
+from microcosm_flask.timing import FUNC, timed
 
 
 def identity(x):
@@ -21,36 +23,57 @@ class EndpointDefinition(tuple):
     A definition for an endpoint.
 
     """
-    def __new__(cls, func=None, request_schema=None, response_schema=None, header_func=None, response_formats=None):
+    def __new__(
+        cls,
+        func=None,
+        request_schema=None,
+        response_schema=None,
+        header_func=None,
+        response_formats=None,
+        version_func=None,
+    ):
         """
         Define an API endpoint.
 
         Defines the behavior of an API endpoint in conjunction with a `Namespace` and an `Operation`.
 
-        Supports a callbable `func`, request and response (marshmallow) schemas, a header-modifying function, and
-        optional response formats.
+        Supports a callbable `func`, request and response (marshmallow) schemas, a header-modifying function,
+        optional response formats, and an optional resource-version function.
 
         The callable `func` should accept `**kwargs` and return a marshmallow-compatible object or dictionary.
 
         The callable `header_func` (if any) should accept a `headers` dictionary and the return value from the
         callable `func`.
 
+        The callable `version_func` (if any) should accept a resource (as returned by `func` or as an item of
+        a search result) and return its version (e.g. an `updated_at` datetime or a row version); versions
+        are used to answer conditional requests (`If-None-Match`/`If-Modified-Since`) without serialization.
+
         :param func: a function to process request data and return response data
         :param request_schema: a marshmallow schema to decode/validate request data
         :param response_schema: a marshmallow schema to encode response data
         :param header_func: a header-modifying function
         :param response_formats: an optional list of support response formats
+        :param version_func: a resource-version function
 
         """
         return tuple.__new__(
             EndpointDefinition,
-            (func, request_schema, response_schema, header_func, response_formats),
+            (func, request_schema, response_schema, header_func, response_formats, version_func),
         )
 
     @property
     def func(self):
         return self[0]
 
+    def call(self, *args, **kwargs):
+        """
+        Call `func`, timing it as a phase of the current request.
+
+        """
+        with timed(FUNC):
+            return self.func(*args, **kwargs)
+
     @property
     def request_schema(self):
         return self[1]
@@ -67,6 +90,10 @@ class EndpointDefinition(tuple):
     def response_formats(self):
         return self[4] or []
 
+    @property
+    def version_func(self):
+        return self[5]
+
 
 class Convention:
     """
@@ -124,6 +151,17 @@ class Convention:
             raise NotAcceptable()
         return response_format
 
+    def compile_response_schema(self, response_schema):
+        """
+        Compile a response schema for faster serialization, if enabled.
+
+        Compilation happens once, at route registration time.
+
+        """
+        if not response_schema or not self.graph.config.route.compile_response_schemas:
+            return response_schema
+        return compile_schema(response_schema)
+
     def _make_definition(self, definition):
         """
         Generate a definition.
@@ -10,27 +10,38 @@ from marshmallow import Schema
 from microcosm_flask.conventions.base import Convention
 from microcosm_flask.conventions.encoding import (
     dump_response_data,
+    dump_streaming_response_data,
+    encode_collection_version_headers,
     encode_count_header,
     encode_id_header,
+    encode_resource_version_headers,
+    is_not_modified,
+    is_streaming,
     load_query_string_data,
     load_request_data,
+    make_not_modified_response,
     merge_data,
     require_response_data,
 )
 from microcosm_flask.conventions.registry import qs, request, response
 from microcosm_flask.operations import Operation
-from microcosm_flask.paging import OffsetLimitPage, OffsetLimitPageSchema, identity
+from microcosm_flask.paging import OffsetLimitPage, identity
 
 
 class CRUDConvention(Convention):
 
+    def __init__(self, graph, page_cls=None):
+        super(CRUDConvention, self).__init__(graph)
+        self._page_cls = page_cls
+        self.page_cls.validate(graph.flask)
+
     @property
     def page_cls(self):
-        return OffsetLimitPage
+        return self._page_cls or OffsetLimitPage
 
     @property
     def page_schema(self):
-        return OffsetLimitPageSchema
+        return self.page_cls.schema_cls
 
     def configure_search(self, ns, definition):
         """
@@ -41,6 +52,9 @@ class CRUDConvention(Convention):
         - return a tuple of (items, count) where count is the total number of items
           available (in the case of pagination)
 
+        If items is an iterator (e.g. a generator), items will be serialized one at a time
+        into a streamed response body (for formats that support streaming).
+
         The definition's request_schema will be used to process query string arguments.
 
         :param ns: the namespace
@@ -51,6 +65,8 @@ class CRUDConvention(Convention):
             ns,
             definition.response_schema,
         )()
+        response_schema = self.compile_response_schema(paginated_list_schema)
+        item_schema = self.compile_response_schema(definition.response_schema)
 
         @self.add_route(ns.collection_path, Operation.Search, ns)
         @qs(definition.request_schema)
@@ -58,12 +74,23 @@ class CRUDConvention(Convention):
         @wraps(definition.func)
         def search(**path_data):
             page = self.page_cls.from_query_string(definition.request_schema)
-            result = definition.func(**merge_data(path_data, page.to_dict(func=identity)))
+            result = definition.call(**merge_data(path_data, page.to_dict(func=identity)))
             response_data, headers = page.to_paginated_list(result, ns, Operation.Search)
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
+            headers.update(encode_collection_version_headers(definition.version_func, response_data, response_format))
+            if is_not_modified(headers):
+                return make_not_modified_response(headers)
+            if is_streaming(response_data):
+                return dump_streaming_response_data(
+                    response_schema,
+                    item_schema,
+                    response_data,
+                    headers=headers,
+                    response_format=response_format,
+                )
             return dump_response_data(
-                paginated_list_schema,
+                response_schema,
                 response_data,
                 headers=headers,
                 response_format=response_format,
@@ -91,7 +118,7 @@ class CRUDConvention(Convention):
         def count(**path_data):
             request_data = load_query_string_data(definition.request_schema)
             response_data = dict()
-            count = definition.func(**merge_data(path_data, request_data))
+            count = definition.call(**merge_data(path_data, request_data))
             headers = encode_count_header(count)
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
@@ -116,18 +143,20 @@ class CRUDConvention(Convention):
         :param definition: the endpoint definition
 
         """
+        response_schema = self.compile_response_schema(definition.response_schema)
+
         @self.add_route(ns.collection_path, Operation.Create, ns)
         @request(definition.request_schema)
         @response(definition.response_schema)
         @wraps(definition.func)
         def create(**path_data):
             request_data = load_request_data(definition.request_schema)
-            response_data = definition.func(**merge_data(path_data, request_data))
+            response_data = definition.call(**merge_data(path_data, request_data))
             headers = encode_id_header(response_data)
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
             return dump_response_data(
-                definition.response_schema,
+                response_schema,
                 response_data,
                 status_code=Operation.Create.value.default_code,
                 headers=headers,
@@ -149,6 +178,7 @@ class CRUDConvention(Convention):
 
         """
         operation = Operation.UpdateBatch
+        response_schema = self.compile_response_schema(definition.response_schema)
 
         @self.add_route(ns.collection_path, operation, ns)
         @request(definition.request_schema)
@@ -157,11 +187,11 @@ class CRUDConvention(Convention):
         def update_batch(**path_data):
             headers = dict()
             request_data = load_request_data(definition.request_schema)
-            response_data = definition.func(**merge_data(path_data, request_data))
+            response_data = definition.call(**merge_data(path_data, request_data))
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
             return dump_response_data(
-                definition.response_schema,
+                response_schema,
                 response_data,
                 status_code=operation.value.default_code,
                 headers=headers,
@@ -191,7 +221,7 @@ class CRUDConvention(Convention):
         def delete_batch(**path_data):
             headers = dict()
             request_data = load_query_string_data(request_schema)
-            response_data = require_response_data(definition.func(**merge_data(path_data, request_data)))
+            response_data = require_response_data(definition.call(**merge_data(path_data, request_data)))
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
             return dump_response_data(
@@ -217,6 +247,7 @@ class CRUDConvention(Convention):
 
         """
         request_schema = definition.request_schema or Schema()
+        response_schema = self.compile_response_schema(definition.response_schema)
 
         @self.add_route(ns.instance_path, Operation.Retrieve, ns)
         @qs(request_schema)
@@ -225,11 +256,14 @@ class CRUDConvention(Convention):
         def retrieve(**path_data):
             headers = dict()
             request_data = load_query_string_data(request_schema)
-            response_data = require_response_data(definition.func(**merge_data(path_data, request_data)))
+            response_data = require_response_data(definition.call(**merge_data(path_data, request_data)))
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
+            headers.update(encode_resource_version_headers(definition.version_func, response_data, response_format))
+            if is_not_modified(headers):
+                return make_not_modified_response(headers)
             return dump_response_data(
-                definition.response_schema,
+                response_schema,
                 response_data,
                 headers=headers,
                 response_format=response_format,
@@ -257,7 +291,7 @@ class CRUDConvention(Convention):
         def delete(**path_data):
             headers = dict()
             request_data = load_query_string_data(request_schema)
-            response_data = require_response_data(definition.func(**merge_data(path_data, request_data)))
+            response_data = require_response_data(definition.call(**merge_data(path_data, request_data)))
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
             return dump_response_data(
@@ -282,6 +316,8 @@ class CRUDConvention(Convention):
         :param definition: the endpoint definition
 
         """
+        response_schema = self.compile_response_schema(definition.response_schema)
+
         @self.add_route(ns.instance_path, Operation.Replace, ns)
         @request(definition.request_schema)
         @response(definition.response_schema)
@@ -292,11 +328,11 @@ class CRUDConvention(Convention):
             # Replace/put should create a resource if not already present, but we do not
             # enforce these semantics at the HTTP layer. If `func` returns falsey, we
             # will raise a 404.
-            response_data = require_response_data(definition.func(**merge_data(path_data, request_data)))
+            response_data = require_response_data(definition.call(**merge_data(path_data, request_data)))
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
             return dump_response_data(
-                definition.response_schema,
+                response_schema,
                 response_data,
                 headers=headers,
                 response_format=response_format,
@@ -316,6 +352,8 @@ class CRUDConvention(Convention):
         :param definition: the endpoint definition
 
         """
+        response_schema = self.compile_response_schema(definition.response_schema)
+
         @self.add_route(ns.instance_path, Operation.Update, ns)
         @request(definition.request_schema)
         @response(definition.response_schema)
@@ -323,11 +361,11 @@ class CRUDConvention(Convention):
         def update(**path_data):
             headers = dict()
             request_data = load_request_data(definition.request_schema)
-            response_data = require_response_data(definition.func(**merge_data(path_data, request_data)))
+            response_data = require_response_data(definition.call(**merge_data(path_data, request_data)))
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
             return dump_response_data(
-                definition.response_schema,
+                response_schema,
                 response_data,
                 headers=headers,
                 response_format=response_format,
@@ -346,6 +384,7 @@ class CRUDConvention(Convention):
             ns,
             definition.response_schema,
         )()
+        response_schema = self.compile_response_schema(paginated_list_schema)
 
         @self.add_route(ns.collection_path, Operation.CreateCollection, ns)
         @request(definition.request_schema)
@@ -355,7 +394,7 @@ class CRUDConvention(Convention):
             request_data = load_request_data(definition.request_schema)
             page = self.page_cls.from_query_string(self.page_schema(), {})
 
-            result = definition.func(**merge_data(
+            result = definition.call(**merge_data(
                 path_data,
                 merge_data(
                     request_data,
@@ -367,7 +406,7 @@ class CRUDConvention(Convention):
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
             return dump_response_data(
-                paginated_list_schema,
+                response_schema,
                 response_data,
                 headers=headers,
                 response_format=response_format,
@@ -376,7 +415,7 @@ class CRUDConvention(Convention):
         create_collection.__doc__ = "Create the collection of {}".format(pluralize(ns.subject_name))
 
 
-def configure_crud(graph, ns, mappings):
+def configure_crud(graph, ns, mappings, page_cls=None):
     """
     Register CRUD endpoints for a resource object.
 
@@ -393,6 +432,9 @@ def configure_crud(graph, ns, mappings):
             Operation.Search: (search_foo, SearchFooSchema(), FooSchema(), [ResponseFormats.CSV]),
         }
 
+    :param page_cls: the page implementation used for search endpoints (defaults to `OffsetLimitPage`;
+                     see also: `CursorPage`)
+
     """
-    convention = CRUDConvention(graph)
+    convention = CRUDConvention(graph, page_cls=page_cls)
     convention.configure(ns, mappings)
@@ -2,6 +2,7 @@
 Adapter between conventional crud functions and the `microcosm_postgres.store.Store` interface.
 
 """
+import microcosm_flask.executors  # noqa: F401
 from microcosm_flask.naming import name_for
 
 
@@ -12,9 +13,15 @@ class CRUDStoreAdapter:
     Does NOT impose transactions; use the `microcosm_postgres.context.transactional` decorator.
 
     """
-    def __init__(self, graph, store):
+    def __init__(self, graph, store, count_estimator=None):
         self.graph = graph
         self.store = store
+        self.count_estimator = count_estimator
+        self.search_executor = graph.search_executor
+
+    @property
+    def search_concurrently(self):
+        return self.search_executor.enabled and getattr(self.store, "concurrent_sessions", False)
 
     @property
     def identifier_key(self):
@@ -37,12 +44,41 @@ class CRUDStoreAdapter:
         identifier = kwargs.pop(self.identifier_key)
         return self.store.retrieve(identifier)
 
-    def search(self, offset, limit, **kwargs):
-        items = self.store.search(offset=offset, limit=limit, **kwargs)
-        count = self.store.count(**kwargs)
-        return items, count
+    def search(self, offset=None, limit=None, after=None, count=None, **kwargs):
+        """
+        Search the store.
+
+        Supports both offset/limit and cursor paging (see `CursorPage`); for the latter, the
+        store's `search` must accept the decoded cursor as `after`.
+
+        When `count` is false (see `HasMorePage` and `CursorPage`), the store is not counted;
+        the (optional) `count_estimator` is called with the search kwargs instead.
+
+        If the `search_executor` is enabled, stores that use a session (or connection) per
+        thread may be counted on another thread while searching. Stores must opt in by
+        setting `concurrent_sessions`, e.g. when using a session registered with
+        `register_session_factory` (as each task opens its own); `microcosm_postgres`
+        stores share a process-wide session and are always searched and counted serially.
+
+        """
+        if count is False:
+            if self.count_estimator is None:
+                return self.search_items(offset, limit, after, **kwargs), None
+            return self.search_items(offset, limit, after, **kwargs), self.count_estimator(**kwargs)
+
+        if not self.search_concurrently:
+            return self.search_items(offset, limit, after, **kwargs), self.store.count(**kwargs)
+
+        count_future = self.search_executor.submit(self.store.count, **kwargs)
+        items = self.search_items(offset, limit, after, **kwargs)
+        return items, count_future.result()
+
+    def search_items(self, offset, limit, after, **kwargs):
+        if after is None:
+            return self.store.search(offset=offset, limit=limit, **kwargs)
+        return self.store.search(after=after, limit=limit, **kwargs)
 
-    def count(self, offset=None, limit=None, **kwargs):
+    def count(self, offset=None, limit=None, after=None, count=None, **kwargs):
         count = self.store.count(**kwargs)
         return count
 
@@ -43,10 +43,7 @@ class DiscoveryConvention(Convention):
         Evaluated as a property to defer evaluation.
 
         """
-        def match_func(operation, ns, rule):
-            return operation in self.matching_operations
-
-        return list(iter_endpoints(self.graph, match_func))
+        return list(iter_endpoints(self.graph, operations=self.matching_operations))
 
     def configure_discover(self, ns, definition):
         """
@@ -2,13 +2,37 @@
 Support for encoding and decoding request/response content.
 
 """
-from flask import request
+from collections.abc import Iterator
+from datetime import datetime
+from hashlib import md5
+
+from flask import (
+    Response,
+    _request_ctx_stack,
+    current_app,
+    request,
+)
 from inflection import camelize
 from marshmallow.exceptions import ValidationError
 from werkzeug.exceptions import NotFound, UnprocessableEntity
+from werkzeug.http import (
+    http_date,
+    parse_date,
+    quote_etag,
+    unquote_etag,
+)
 
 from microcosm_flask.enums import ResponseFormats
+from microcosm_flask.formatting.json_backends import get_json_backend
 from microcosm_flask.naming import name_for
+from microcosm_flask.negotiation import find_acceptable_format
+from microcosm_flask.serializing import get_compiled_schema, remove_null_values
+from microcosm_flask.timing import (
+    DUMP,
+    LOAD,
+    SKIP_NULL,
+    timed,
+)
 
 
 def with_headers(error, headers):
@@ -56,6 +80,134 @@ def encode_headers(resource):
     return {}
 
 
+def encode_version_headers(version, last_modified=None, response_format=None):
+    """
+    Generate conditional request headers from a resource version.
+
+    The (weak) ETag is derived from the version and the response format, so it can be
+    computed without serializing the response.
+
+    """
+    if response_format is None:
+        response_format = ResponseFormats.JSON
+
+    digest = md5(repr((response_format.content_type, version)).encode("utf-8")).hexdigest()
+    headers = {
+        "ETag": quote_etag(digest, weak=True),
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def encode_resource_version_headers(version_func, resource, response_format=None):
+    """
+    Generate conditional request headers for a single resource.
+
+    Datetime versions (e.g. `updated_at`) are also used for `Last-Modified`.
+
+    """
+    if version_func is None:
+        return {}
+
+    version = version_func(resource)
+    if version is None:
+        return {}
+
+    last_modified = version if isinstance(version, datetime) else None
+    return encode_version_headers(version, last_modified, response_format)
+
+
+def encode_collection_version_headers(version_func, paginated_list, response_format=None):
+    """
+    Generate conditional request headers for a page of resources.
+
+    The page version combines the total count with the version of every item.
+
+    """
+    if version_func is None or isinstance(paginated_list.items, Iterator):
+        # NB: computing versions would consume streamed items
+        return {}
+
+    versions = [version_func(item) for item in paginated_list.items]
+    if any(version is None for version in versions):
+        return {}
+
+    if versions and all(isinstance(version, datetime) for version in versions):
+        last_modified = max(versions)
+    else:
+        last_modified = None
+
+    count = getattr(paginated_list, "count", None)
+    return encode_version_headers((count, versions), last_modified, response_format)
+
+
+def is_not_modified(headers):
+    """
+    Evaluate conditional request headers against response headers (per RFC 7232).
+
+    `If-None-Match` takes precedence over `If-Modified-Since`.
+
+    """
+    if request.method not in ("GET", "HEAD"):
+        return False
+
+    etag = headers.get("ETag")
+    if etag is not None and request.if_none_match:
+        return request.if_none_match.contains_weak(unquote_etag(etag)[0])
+
+    last_modified = headers.get("Last-Modified")
+    if last_modified is not None and request.if_modified_since:
+        return parse_date(last_modified) <= request.if_modified_since
+
+    return False
+
+
+def make_not_modified_response(headers):
+    """
+    Generate a 304 (Not Modified) response.
+
+    """
+    response = Response(status=304)
+    response.headers.extend(headers)
+    return response
+
+
+def decode_request_json():
+    """
+    Decode the request body as JSON.
+
+    The body is parsed at most once per request (using the configured JSON backend) and the
+    result is cached on the request context (not on `g`, which may outlive the request), so
+    that request loading and audit logging share the same document.
+
+    Returns None if the body is empty or is not valid JSON.
+
+    """
+    request_ctx = _request_ctx_stack.top
+    if hasattr(request_ctx, "request_json"):
+        return request_ctx.request_json
+
+    backend = get_json_backend(current_app.config.get("JSON_BACKEND"))
+
+    if backend is None:
+        try:
+            request_json = request.get_json(force=True, silent=True)
+        except Exception:
+            # if `simplejson` is installed, simplejson.scanner.JSONDecodeError will be raised
+            # on malformed JSON, where as built-in `json` returns None
+            request_json = None
+    else:
+        data = request.get_data(cache=True)
+        try:
+            request_json = backend.loads(data) if data else None
+        except ValueError:
+            request_json = None
+
+    request_ctx.request_json = request_json
+    return request_json
+
+
 def load_request_data(request_schema):
     """
     Load request data as JSON using the given schema.
@@ -66,14 +218,10 @@ def load_request_data(request_schema):
     HTTP 400 and 415 errors.
 
     """
+    json_data = decode_request_json() or {}
     try:
-        json_data = request.get_json(force=True) or {}
-    except Exception:
-        # if `simplejson` is installed, simplejson.scanner.JSONDecodeError will be raised
-        # on malformed JSON, where as built-in `json` returns None
-        json_data = {}
-    try:
-        return request_schema.load(json_data)
+        with timed(LOAD):
+            return request_schema.load(json_data)
     except ValidationError as error:
         raise with_context(
             UnprocessableEntity("Validation error"),
@@ -98,7 +246,8 @@ def load_query_string_data(request_schema, query_string_data=None):
         query_string_data = request.args
 
     try:
-        return request_schema.load(query_string_data)
+        with timed(LOAD):
+            return request_schema.load(query_string_data)
     except ValidationError as error:
         raise with_context(
             UnprocessableEntity("Validation error"),
@@ -106,16 +255,39 @@ def load_query_string_data(request_schema, query_string_data=None):
         )
 
 
-def remove_null_values(data):
-    if isinstance(data, dict):
-        return {
-            key: remove_null_values(value)
-            for key, value in data.items()
-            if value is not None
-        }
-    if type(data) in (list, tuple):
-        return type(data)(map(remove_null_values, data))
-    return data
+def should_skip_null():
+    """
+    Should null values be omitted from the response?
+
+    Swagger does not currently support null values; clients may request their removal.
+
+    """
+    return bool(request.headers.get("X-Response-Skip-Null"))
+
+
+def dump_data(response_schema, response_data, skip_null=False):
+    """
+    Dump response data using the given schema, optionally omitting null values.
+
+    Null values are omitted as part of serialization: schemas that are not already compiled
+    are compiled (once) to do so.
+
+    """
+    if skip_null:
+        response_schema = get_compiled_schema(response_schema)
+        with timed(DUMP):
+            return response_schema.dump(response_data, skip_null=True)
+
+    with timed(DUMP):
+        return response_schema.dump(response_data)
+
+
+def is_streaming(response_data):
+    """
+    Does response data contain lazily evaluated items (e.g. from a generator)?
+
+    """
+    return isinstance(getattr(response_data, "items", None), Iterator)
 
 
 def dump_response_data(response_schema,
@@ -132,10 +304,50 @@ def dump_response_data(response_schema,
     HTTP 400 and 406 errors.
 
     """
-    if response_schema:
-        response_data = response_schema.dump(response_data)
+    if not response_schema:
+        return make_response(response_data, response_schema, response_format, status_code, headers)
+
+    response_data = dump_data(response_schema, response_data, skip_null=should_skip_null())
+    return make_response(response_data, response_schema, response_format, status_code, headers, skip_null=False)
+
+
+def dump_streaming_response_data(response_schema,
+                                 item_schema,
+                                 response_data,
+                                 status_code=200,
+                                 headers=None,
+                                 response_format=None):
+    """
+    Dumps a paginated list whose items are an iterator.
+
+    The list's envelope (e.g. `count` and `_links`) is dumped eagerly; items are dumped one
+    at a time as the response body is streamed, so memory use does not scale with page size.
+
+    Formats that do not support streaming receive fully materialized items.
+
+    """
+    if response_format is None:
+        response_format = ResponseFormats.JSON
 
-    return make_response(response_data, response_schema, response_format, status_code, headers)
+    if not response_format.value.formatter.supports_streaming:
+        response_data.items = list(response_data.items)
+        return dump_response_data(response_schema, response_data, status_code, headers, response_format)
+
+    skip_null = should_skip_null()
+    items, response_data.items = response_data.items, []
+    response_data = dump_data(response_schema, response_data, skip_null)
+    response_data["items"] = (dump_data(item_schema, item, skip_null) for item in items)
+
+    # NB: computing an etag would require buffering the entire response
+    return make_response(
+        response_data,
+        response_schema,
+        response_format,
+        status_code,
+        headers,
+        include_etag=False,
+        skip_null=False,
+    )
 
 
 def make_response(response_data,
@@ -143,18 +355,38 @@ def make_response(response_data,
                   response_format=None,
                   status_code=200,
                   headers=None,
+                  include_etag=True,
+                  skip_null=None,
+                  compress=None,
                   ):
+    """
+    Format response data.
+
+    Null values are removed if `skip_null` is set; by default, this is controlled
+    by the `X-Response-Skip-Null` header.
+
+    An ETag is computed from the response body unless one is provided in `headers`
+    (e.g. from a resource version).
+
+    Compression is controlled by configuration unless `compress` is set.
+
+    """
+    if headers and "ETag" in headers:
+        include_etag = False
 
     if response_format is None:
         response_format = ResponseFormats.JSON
 
     formatter = response_format.value.formatter(response_schema)
 
-    if request.headers.get("X-Response-Skip-Null"):
-        # swagger does not currently support null values; remove these conditionally
-        response_data = remove_null_values(response_data)
+    if skip_null is None:
+        skip_null = should_skip_null()
+
+    if skip_null:
+        with timed(SKIP_NULL):
+            response_data = remove_null_values(response_data)
 
-    response = formatter(response_data, headers)
+    response = formatter(response_data, headers, include_etag=include_etag, compress=compress)
     response.status_code = status_code
     return response
 
@@ -188,9 +420,11 @@ def require_response_data(response_data):
 
 def find_response_format(allowed_response_formats):
     """
-    Basic content negotiation logic.
+    Content negotiation logic.
 
-    If the 'Accept' header doesn't exactly match a format we can handle, we return JSON
+    Honors q-values and media range specificity in the 'Accept' header (see `negotiation`).
+
+    If the 'Accept' header doesn't match a format we can handle, we return JSON
 
     """
     # allowed formats default to [] before this
@@ -205,11 +439,5 @@ def find_response_format(allowed_response_formats):
         # Finally, default to JSON
         return ResponseFormats.JSON
 
-    for response_format in ResponseFormats.prioritized():
-        if response_format not in allowed_response_formats:
-            continue
-        if response_format.matches(content_type):
-            return response_format
-
-    # fallback for previous behavior
-    return ResponseFormats.JSON
+    # fallback to JSON for previous behavior
+    return find_acceptable_format(content_type, allowed_response_formats, default=ResponseFormats.JSON)
@@ -34,21 +34,10 @@ def configure_landing(graph):   # noqa: C901
         Finds all swagger conventions that are bound to the graph
 
         """
-        versions = []
-
-        def matches(operation, ns, rule):
-            """
-            Defines a condition to determine which endpoints are swagger type
-
-            """
-            if(ns.subject == graph.config.swagger_convention.name):
-                return True
-            return False
-
-        for operation, ns, rule, func in iter_endpoints(graph, matches):
-            versions.append(ns.version)
-
-        return versions
+        return [
+            ns.version
+            for operation, ns, rule, func in iter_endpoints(graph, subject=graph.config.swagger_convention.name)
+        ]
 
     def pretty_dict(dict_):
         return dumps(dict_, sort_keys=True, indent=2, separators=(',', ': '))
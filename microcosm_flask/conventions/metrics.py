@@ -0,0 +1,468 @@
+"""
+Metrics exposition convention.
+
+Serves route latencies, request counts, in-flight requests and process stats from the
+"/api/metrics" endpoint in the (Prometheus) text exposition format.
+
+Route metrics are read from the in-process histograms of `route_metrics` (which should be
+configured with `route_metrics.aggregate`).
+
+In multiprocess mode (`metrics_convention.multiprocess_dir`), each (e.g. prefork) worker
+periodically writes its metrics to a memory mapped file in a shared directory and scrapes
+report the sum over all workers. Files are named by pid and a unique id, so that a worker that
+reuses the pid of a stopped worker does not overwrite its (cumulative) metrics. The directory
+should be emptied when the pod starts.
+
+"""
+from atexit import register
+from glob import glob
+from json import dumps, loads
+from logging import getLogger
+from mmap import PAGESIZE, mmap
+from os import (
+    O_CREAT,
+    O_RDONLY,
+    O_RDWR,
+    O_TRUNC,
+    close,
+    ftruncate,
+    getpid,
+    kill,
+    listdir,
+    open as os_open,
+    pread,
+    sysconf,
+    times,
+)
+from os.path import basename, join
+from struct import Struct
+from threading import Lock, Thread, active_count
+from time import sleep, time
+from uuid import uuid4
+
+from flask import Response
+from microcosm.api import defaults, typed
+
+from microcosm_flask.audit import skip_logging
+from microcosm_flask.conventions.base import Convention
+from microcosm_flask.histograms import Histogram
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+
+
+logger = getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# sequence number (odd while writing), data length
+HEADER = Struct("<QQ")
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_sample(name, labels, value):
+    if not labels:
+        return "{} {}".format(name, format_value(value))
+
+    return "{}{{{}}} {}".format(
+        name,
+        ",".join(
+            '{}="{}"'.format(key, escape(label))
+            for key, label in labels
+        ),
+        format_value(value),
+    )
+
+
+def format_value(value):
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+
+def process_start_time(pid="self"):
+    """
+    Compute the start time of a process (in seconds since the epoch).
+
+    """
+    try:
+        with open("/proc/{}/stat".format(pid)) as stat:
+            # NB: the command may contain spaces; fields resume after its closing paren
+            start_ticks = int(stat.read().rpartition(")")[2].split()[19])
+        with open("/proc/stat") as stat:
+            boot_time = next(
+                int(line.split()[1])
+                for line in stat
+                if line.startswith("btime")
+            )
+        return boot_time + start_ticks / sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
+PROCESS_START_TIME = process_start_time() or time()
+
+
+def process_stats():
+    """
+    Collect stats for the current process.
+
+    """
+    cpu_times = times()
+    stats = dict(
+        cpu_seconds_total=cpu_times.user + cpu_times.system,
+        start_time_seconds=PROCESS_START_TIME,
+        threads=active_count(),
+    )
+
+    try:
+        with open("/proc/self/statm") as statm:
+            stats["resident_memory_bytes"] = int(statm.read().split()[1]) * PAGESIZE
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        stats["open_fds"] = len(listdir("/proc/self/fd"))
+    except OSError:
+        pass
+
+    return stats
+
+
+def is_running(pid):
+    try:
+        kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_live(pid, start_time=None):
+    """
+    Is a process running (and not just another process that reuses its pid)?
+
+    """
+    if not is_running(pid):
+        return False
+
+    if start_time is None:
+        return True
+
+    actual_start_time = process_start_time(pid)
+    return actual_start_time is None or abs(actual_start_time - start_time) < 1
+
+
+def parse_pid(path):
+    """
+    Parse the pid of a metrics file, named "metrics_<pid>_<id>.db".
+
+    """
+    return int(basename(path)[len("metrics_"):-len(".db")].split("_")[0])
+
+
+class MetricsFile:
+    """
+    A (per-process) memory mapped file of serialized metrics.
+
+    Writes are guarded by a sequence number that is odd while a write is in progress, so
+    that readers (in other processes) never use partially written data.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fd = os_open(path, O_RDWR | O_CREAT | O_TRUNC, 0o644)
+        self.mmap = None
+        self.size = 0
+        self.sequence = 0
+
+    def write(self, data):
+        size = HEADER.size + len(data)
+        if size > self.size:
+            self.resize(size)
+
+        self.sequence += 1
+        HEADER.pack_into(self.mmap, 0, self.sequence, 0)
+        self.mmap[HEADER.size:size] = data
+        self.sequence += 1
+        HEADER.pack_into(self.mmap, 0, self.sequence, len(data))
+
+    def resize(self, size):
+        size = max(PAGESIZE, 1 << (size - 1).bit_length())
+        ftruncate(self.fd, size)
+        if self.mmap is not None:
+            self.mmap.close()
+        self.mmap = mmap(self.fd, size)
+        self.size = size
+
+    @staticmethod
+    def read(path, attempts=10):
+        """
+        Read (consistent) data from a metrics file.
+
+        Returns None if the file has no data or is being continuously written.
+
+        """
+        fd = os_open(path, O_RDONLY)
+        try:
+            for _ in range(attempts):
+                header = pread(fd, HEADER.size, 0)
+                if len(header) < HEADER.size:
+                    return None
+                sequence, length = HEADER.unpack(header)
+                if sequence % 2:
+                    continue
+
+                data = pread(fd, length, HEADER.size)
+                if HEADER.unpack(pread(fd, HEADER.size, 0))[0] == sequence:
+                    return data or None
+
+            return None
+        finally:
+            close(fd)
+
+
+class Metrics:
+    """
+    Collect metrics for exposition.
+
+    """
+    def __init__(self, graph, buckets, multiprocess_dir=None, write_interval=5.0):
+        self.graph = graph
+        self.buckets = sorted(float(bucket) for bucket in buckets)
+        # NB: histograms count microseconds
+        self.bucket_bounds = [bucket * 1000000 for bucket in self.buckets]
+        self.multiprocess_dir = multiprocess_dir
+        self.write_interval = write_interval
+
+        self.lock = Lock()
+        self.pid = None
+        self.file = None
+        self.path = None
+
+    def collect(self):
+        """
+        Collect metrics for the current process.
+
+        """
+        route_metrics = self.graph.route_metrics
+        return dict(
+            histograms=[
+                [endpoint, label, histogram.to_dict()]
+                for (endpoint, label), histogram in route_metrics.histograms.snapshot().items()
+            ],
+            phases=[
+                [endpoint, phase, histogram.to_dict()]
+                for (endpoint, phase), histogram in route_metrics.phases.snapshot().items()
+            ],
+            in_flight=route_metrics.in_flight.snapshot(),
+            process=process_stats(),
+        )
+
+    def collect_all(self):
+        """
+        Collect metrics for all processes (by metrics file path).
+
+        Each sample includes the pid of its process.
+
+        """
+        if not self.multiprocess_dir:
+            return {None: dict(self.collect(), pid=None)}
+
+        # NB: report up to date metrics for the scraped worker
+        self.write()
+
+        samples = dict()
+        for path in glob(join(self.multiprocess_dir, "metrics_*.db")):
+            try:
+                pid = parse_pid(path)
+                data = MetricsFile.read(path)
+            except (OSError, ValueError):
+                continue
+            if data is None:
+                continue
+            samples[path] = dict(loads(data), pid=pid)
+
+        return samples
+
+    def start(self):
+        """
+        Start writing metrics for this worker (if in multiprocess mode).
+
+        """
+        if not self.multiprocess_dir or self.pid == getpid():
+            return
+
+        with self.lock:
+            if self.pid == getpid():
+                return
+
+            self.pid = getpid()
+            self.path = join(self.multiprocess_dir, "metrics_{}_{}.db".format(self.pid, uuid4().hex))
+            self.file = MetricsFile(self.path)
+            Thread(target=self.run, name="metrics", daemon=True).start()
+            register(self.write)
+
+    def run(self):
+        while True:
+            sleep(self.write_interval)
+            try:
+                self.write()
+            except Exception:
+                logger.exception("Unable to write metrics")
+
+    def write(self):
+        if self.file is None:
+            return
+
+        data = dumps(self.collect()).encode("utf-8")
+        with self.lock:
+            self.file.write(data)
+
+    def to_text(self):
+        """
+        Render metrics in the text exposition format.
+
+        """
+        samples = self.collect_all()
+        live = {
+            path: sample
+            for path, sample in samples.items()
+            if path is None or path == self.path or is_live(
+                sample["pid"],
+                sample["process"].get("start_time_seconds"),
+            )
+        }
+
+        histograms = self.merge_histograms(sample["histograms"] for sample in samples.values())
+        phases = self.merge_histograms(sample.get("phases", []) for sample in samples.values())
+
+        in_flight = dict()
+        for sample in live.values():
+            for endpoint, value in sample["in_flight"].items():
+                in_flight[endpoint] = in_flight.get(endpoint, 0) + value
+
+        lines = []
+        lines.extend(self.iter_route_duration(histograms))
+        lines.extend(self.iter_route_phase_duration(phases))
+        lines.extend(self.iter_route_requests(histograms))
+        lines.extend(self.iter_route_in_flight(in_flight))
+        lines.extend(self.iter_process(live))
+        lines.append("")
+        return "\n".join(lines)
+
+    def merge_histograms(self, entries):
+        histograms = dict()
+        for entry in entries:
+            for endpoint, label, dct in entry:
+                histogram = Histogram.from_dict(dct)
+                try:
+                    histograms[(endpoint, label)].merge(histogram)
+                except KeyError:
+                    histograms[(endpoint, label)] = histogram
+
+        return histograms
+
+    def iter_route_duration(self, histograms):
+        name = "route_duration_seconds"
+        yield "# HELP {} Route latency.".format(name)
+        yield "# TYPE {} histogram".format(name)
+        for (endpoint, label), histogram in sorted(histograms.items()):
+            yield from self.iter_histogram(name, [("endpoint", endpoint), ("classifier", label)], histogram)
+
+    def iter_route_phase_duration(self, histograms):
+        name = "route_phase_duration_seconds"
+        yield "# HELP {} Route latency by phase.".format(name)
+        yield "# TYPE {} histogram".format(name)
+        for (endpoint, phase), histogram in sorted(histograms.items()):
+            yield from self.iter_histogram(name, [("endpoint", endpoint), ("phase", phase)], histogram)
+
+    def iter_histogram(self, name, labels, histogram):
+        for bucket, count in zip(self.buckets, histogram.cumulative_counts(self.bucket_bounds)):
+            yield format_sample(name + "_bucket", labels + [("le", bucket)], count)
+        yield format_sample(name + "_bucket", labels + [("le", "+Inf")], histogram.count)
+        yield format_sample(name + "_sum", labels, histogram.total / 1000000)
+        yield format_sample(name + "_count", labels, histogram.count)
+
+    def iter_route_requests(self, histograms):
+        name = "route_requests_total"
+        yield "# HELP {} Route requests by status code class.".format(name)
+        yield "# TYPE {} counter".format(name)
+        for (endpoint, label), histogram in sorted(histograms.items()):
+            yield format_sample(name, [("endpoint", endpoint), ("classifier", label)], histogram.count)
+
+    def iter_route_in_flight(self, in_flight):
+        name = "route_in_flight"
+        yield "# HELP {} Route requests in progress.".format(name)
+        yield "# TYPE {} gauge".format(name)
+        for endpoint, value in sorted(in_flight.items()):
+            yield format_sample(name, [("endpoint", endpoint)], value)
+
+    def iter_process(self, samples):
+        for key, metric_type, description in (
+                ("cpu_seconds_total", "counter", "Total user and system CPU time in seconds."),
+                ("start_time_seconds", "gauge", "Start time of the process since the epoch in seconds."),
+                ("resident_memory_bytes", "gauge", "Resident memory size in bytes."),
+                ("open_fds", "gauge", "Number of open file descriptors."),
+                ("threads", "gauge", "Number of threads."),
+        ):
+            name = "process_{}".format(key)
+            yield "# HELP {} {}".format(name, description)
+            yield "# TYPE {} {}".format(name, metric_type)
+            for sample in sorted(samples.values(), key=lambda sample: sample["pid"] or 0):
+                if key in sample["process"]:
+                    labels = [] if sample["pid"] is None else [("pid", sample["pid"])]
+                    yield format_sample(name, labels, sample["process"][key])
+
+
+class MetricsConvention(Convention):
+
+    def __init__(self, graph, metrics):
+        super().__init__(graph)
+        self.metrics = metrics
+
+    def configure_retrieve(self, ns, definition):
+
+        @self.add_route(ns.singleton_path, Operation.Retrieve, ns)
+        @skip_logging
+        def metrics():
+            return Response(self.metrics.to_text(), content_type=CONTENT_TYPE)
+
+
+@defaults(
+    buckets=DEFAULT_BUCKETS,
+    multiprocess_dir=None,
+    write_interval=typed(float, default_value=5.0),
+)
+def configure_metrics(graph):
+    """
+    Configure the metrics endpoint.
+
+    :returns: a handle to the `Metrics` object
+
+    """
+    ns = Namespace(
+        subject=Metrics,
+    )
+
+    metrics = Metrics(
+        graph,
+        buckets=graph.config.metrics_convention.buckets,
+        multiprocess_dir=graph.config.metrics_convention.multiprocess_dir,
+        write_interval=graph.config.metrics_convention.write_interval,
+    )
+
+    if metrics.multiprocess_dir:
+        # NB: start writing (per worker) on the first request
+        graph.flask.before_request(metrics.start)
+
+    convention = MetricsConvention(graph, metrics)
+    convention.configure(ns, retrieve=tuple())
+    return convention.metrics
@@ -0,0 +1,67 @@
+"""
+Profile convention.
+
+Serves the samples of the `continuous_profiler` from the "/api/profile" endpoint, either
+as collapsed stacks (for flame graph tools) or in the speedscope file format.
+
+The endpoint is protected with basic auth (see `basic_auth.credentials`).
+
+"""
+from flask import Response
+from marshmallow import Schema, fields, validate
+
+from microcosm_flask.audit import skip_logging
+from microcosm_flask.conventions.base import Convention
+from microcosm_flask.conventions.encoding import load_query_string_data, make_response
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+
+
+COLLAPSED = "collapsed"
+SPEEDSCOPE = "speedscope"
+
+
+class RetrieveProfileSchema(Schema):
+    format = fields.String(
+        missing=COLLAPSED,
+        validate=validate.OneOf([COLLAPSED, SPEEDSCOPE]),
+    )
+    endpoint = fields.String()
+    # the number of completed windows to include (in addition to the current window)
+    windows = fields.Integer(validate=validate.Range(min=0))
+
+
+class ProfileConvention(Convention):
+
+    def __init__(self, graph, profiler):
+        super().__init__(graph)
+        self.profiler = profiler
+
+    def configure_retrieve(self, ns, definition):
+
+        @self.add_route(ns.singleton_path, Operation.Retrieve, ns)
+        @skip_logging
+        def profile():
+            query_params = load_query_string_data(RetrieveProfileSchema())
+            profile_format = query_params.pop("format")
+            if profile_format == SPEEDSCOPE:
+                return make_response(self.profiler.to_speedscope(**query_params))
+
+            return Response(self.profiler.to_collapsed(**query_params), content_type="text/plain")
+
+
+def configure_profile(graph):
+    """
+    Configure the profile endpoint.
+
+    :returns: a handle to the `ContinuousProfiler` object
+
+    """
+    ns = Namespace(
+        subject="profile",
+        enable_basic_auth=True,
+    )
+
+    convention = ProfileConvention(graph, graph.continuous_profiler)
+    convention.configure(ns, retrieve=tuple())
+    return convention.profiler
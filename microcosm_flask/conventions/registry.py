@@ -2,6 +2,10 @@
 Support for registering function metadata.
 
 """
+from bisect import bisect_left, insort
+from collections import defaultdict, namedtuple
+from threading import Lock
+
 from werkzeug.exceptions import InternalServerError
 from werkzeug.routing import parse_rule
 
@@ -11,9 +15,153 @@ from microcosm_flask.namespaces import Namespace
 REQUEST = "__request__"
 RESPONSE = "__response__"
 QS = "__qs__"
+COMPRESS = "__compress__"
+
+ENDPOINT_REGISTRY = "microcosm_flask.endpoint_registry"
+
+
+Endpoint = namedtuple("Endpoint", ["position", "operation", "ns", "rule"])
+
+
+class EndpointRegistry:
+    """
+    An index over the (conventional) endpoints of a Flask app.
 
+    Each rule is parsed into an (operation, namespace) pair once; rules are indexed by operation,
+    subject, version, and path so that queries need not scan (and re-parse) the url map.
+
+    Rules are indexed lazily, on the first query after they are registered (so that registering
+    routes stays linear): first the endpoints registered through `graph.route` (in registration
+    order), then any other rules. Indexing and queries share a lock, so queries never see a
+    partially indexed rule.
 
-def iter_endpoints(graph, match_func):
+    """
+    def __init__(self):
+        self.endpoints = []
+        self.by_operation = defaultdict(list)
+        self.by_subject = defaultdict(list)
+        self.by_version = defaultdict(list)
+        self.paths = []
+        self.rules = set()
+        self.pending = []
+        self.lock = Lock()
+
+    def register(self, endpoint):
+        """
+        Queue an endpoint to be indexed (in registration order) on the next sync.
+
+        """
+        self.pending.append(endpoint)
+
+    def sync(self, url_map):
+        """
+        Index any rules added to the url map since the last sync.
+
+        """
+        # NB: rules are never removed (but may be reordered)
+        if not self.pending and len(self.rules) == len(url_map._rules):
+            return
+        with self.lock:
+            pending, self.pending = self.pending, []
+            for endpoint in pending:
+                for rule in url_map._rules_by_endpoint.get(endpoint, ()):
+                    self.add_once(rule)
+
+            if len(self.rules) == len(url_map._rules):
+                return
+            for rule in url_map.iter_rules():
+                self.add_once(rule)
+
+    def add_once(self, rule):
+        # NB: rules are not hashable
+        if id(rule) not in self.rules:
+            self.add(rule)
+
+    def add(self, rule):
+        self.rules.add(id(rule))
+        try:
+            operation, ns = Namespace.parse_endpoint(rule.endpoint, get_converter(rule))
+        except (IndexError, ValueError, InternalServerError):
+            # operation follows a different convention (e.g. "static")
+            return
+
+        endpoint = Endpoint(len(self.endpoints), operation, ns, rule)
+        self.endpoints.append(endpoint)
+        self.by_operation[operation].append(endpoint)
+        self.by_subject[ns.subject].append(endpoint)
+        self.by_version[ns.version].append(endpoint)
+        insort(self.paths, (rule.rule, endpoint.position))
+
+    def iter_path_prefix(self, path_prefix):
+        for path, position in self.paths[bisect_left(self.paths, (path_prefix,)):]:
+            if not path.startswith(path_prefix):
+                break
+            yield self.endpoints[position]
+
+    def find(self, operations=None, subject=None, version=None, path_prefix=None):
+        """
+        Find endpoints matching all of the given criteria, in registration order.
+
+        :param operations: an iterable of `Operation`s
+        :param subject: a subject name
+        :param version: a version (e.g. "v1")
+        :param path_prefix: a rule path prefix
+
+        """
+        with self.lock:
+            candidates = []
+            if operations is not None:
+                candidates.append([
+                    endpoint
+                    for operation in operations
+                    for endpoint in self.by_operation.get(operation, ())
+                ])
+            if subject is not None:
+                candidates.append(self.by_subject.get(subject, ()))
+            if version is not None:
+                candidates.append(self.by_version.get(version, ()))
+            if path_prefix is not None:
+                candidates.append(list(self.iter_path_prefix(path_prefix)))
+
+            if not candidates:
+                return list(self.endpoints)
+
+            smallest, *others = sorted(candidates, key=len)
+            others = [{endpoint.position for endpoint in other} for other in others]
+            return sorted(
+                (
+                    endpoint
+                    for endpoint in smallest
+                    if all(endpoint.position in other for other in others)
+                ),
+                key=lambda endpoint: endpoint.position,
+            )
+
+
+def get_endpoint_registry(app, sync=True):
+    """
+    Get the (synchronized) endpoint registry for an app.
+
+    """
+    try:
+        endpoint_registry = app.extensions[ENDPOINT_REGISTRY]
+    except KeyError:
+        # NB: setdefault is atomic, so concurrent first queries share a registry
+        endpoint_registry = app.extensions.setdefault(ENDPOINT_REGISTRY, EndpointRegistry())
+    if sync:
+        endpoint_registry.sync(app.url_map)
+    return endpoint_registry
+
+
+def register_endpoint(app, endpoint):
+    """
+    Register an endpoint with the endpoint registry (to be indexed on the next query).
+
+    """
+    get_endpoint_registry(app, sync=False).register(endpoint)
+
+
+def iter_endpoints(graph, match_func=None, operations=None, subject=None, version=None, path_prefix=None):
     """
     Iterate through matching endpoints.
 
@@ -22,20 +170,23 @@ def iter_endpoints(graph, match_func):
         def matches(operation, ns, rule):
             return True
 
+    Prefer the (indexed) `operations`, `subject`, `version`, and `path_prefix` criteria where
+    possible; `match_func` is evaluated against endpoints that meet these criteria.
+
     :returns: a generator over (`Operation`, `Namespace`, rule, func) tuples.
 
     """
-    for rule in graph.flask.url_map.iter_rules():
-        try:
-            operation, ns = Namespace.parse_endpoint(rule.endpoint, get_converter(rule))
-        except (IndexError, ValueError, InternalServerError):
-            # operation follows a different convention (e.g. "static")
-            continue
-        else:
-            # match_func gets access to rule to support path version filtering
-            if match_func(operation, ns, rule):
-                func = graph.flask.view_functions[rule.endpoint]
-                yield operation, ns, rule, func
+    endpoints = get_endpoint_registry(graph.flask).find(
+        operations=operations,
+        subject=subject,
+        version=version,
+        path_prefix=path_prefix,
+    )
+    for _, operation, ns, rule in endpoints:
+        # match_func gets access to rule to support path version filtering
+        if match_func is None or match_func(operation, ns, rule):
+            func = graph.flask.view_functions[rule.endpoint]
+            yield operation, ns, rule, func
 
 
 def get_converter(rule):
@@ -86,6 +237,19 @@ def qs(schema):
     return wrapper
 
 
+def compress(enabled=True):
+    """
+    Decorate a function to enable (or disable) response compression.
+
+    Overrides the application-wide `flask.compression_enabled` setting.
+
+    """
+    def wrapper(func):
+        setattr(func, COMPRESS, enabled)
+        return func
+    return wrapper
+
+
 def get_request_schema(func):
     return getattr(func, REQUEST, None)
 
@@ -96,3 +260,7 @@ def get_response_schema(func):
 
 def get_qs_schema(func):
     return getattr(func, QS, None)
+
+
+def get_compress(func):
+    return getattr(func, COMPRESS, None)
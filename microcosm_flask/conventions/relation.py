@@ -13,9 +13,15 @@ from marshmallow import Schema
 from microcosm_flask.conventions.base import Convention
 from microcosm_flask.conventions.encoding import (
     dump_response_data,
+    dump_streaming_response_data,
+    encode_collection_version_headers,
     encode_id_header,
+    encode_resource_version_headers,
+    is_not_modified,
+    is_streaming,
     load_query_string_data,
     load_request_data,
+    make_not_modified_response,
     merge_data,
     require_response_data,
 )
@@ -28,10 +34,12 @@ class RelationConvention(Convention):
 
     @property
     def page_cls(self):
-        return OffsetLimitPage
+        return self._page_cls or OffsetLimitPage
 
-    def __init__(self, graph):
+    def __init__(self, graph, page_cls=None):
         super(RelationConvention, self).__init__(graph)
+        self._page_cls = page_cls
+        self.page_cls.validate(graph.flask)
 
     def configure_createfor(self, ns, definition):
         """
@@ -45,18 +53,20 @@ class RelationConvention(Convention):
         :param definition: the endpoint definition
 
         """
+        response_schema = self.compile_response_schema(definition.response_schema)
+
         @self.add_route(ns.relation_path, Operation.CreateFor, ns)
         @request(definition.request_schema)
         @response(definition.response_schema)
         @wraps(definition.func)
         def create(**path_data):
             request_data = load_request_data(definition.request_schema)
-            response_data = require_response_data(definition.func(**merge_data(path_data, request_data)))
+            response_data = require_response_data(definition.call(**merge_data(path_data, request_data)))
             headers = encode_id_header(response_data)
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
             return dump_response_data(
-                definition.response_schema,
+                response_schema,
                 response_data,
                 Operation.CreateFor.value.default_code,
                 headers=headers,
@@ -82,7 +92,7 @@ class RelationConvention(Convention):
         def delete(**path_data):
             headers = dict()
             response_data = dict()
-            require_response_data(definition.func(**path_data))
+            require_response_data(definition.call(**path_data))
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
             return dump_response_data(
@@ -114,6 +124,8 @@ class RelationConvention(Convention):
         :param definition: the endpoint definition
 
         """
+        response_schema = self.compile_response_schema(definition.response_schema)
+
         @self.add_route(ns.relation_path, Operation.ReplaceFor, ns)
         @request(definition.request_schema)
         @response(definition.response_schema)
@@ -121,11 +133,11 @@ class RelationConvention(Convention):
         def replace(**path_data):
             headers = dict()
             request_data = load_request_data(definition.request_schema)
-            response_data = require_response_data(definition.func(**merge_data(path_data, request_data)))
+            response_data = require_response_data(definition.call(**merge_data(path_data, request_data)))
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
             return dump_response_data(
-                definition.response_schema,
+                response_schema,
                 response_data,
                 status_code=Operation.ReplaceFor.value.default_code,
                 headers=headers,
@@ -153,6 +165,8 @@ class RelationConvention(Convention):
         :param definition: the endpoint definition
 
         """
+        response_schema = self.compile_response_schema(definition.response_schema)
+
         @self.add_route(ns.relation_path, Operation.UpdateFor, ns)
         @request(definition.request_schema)
         @response(definition.response_schema)
@@ -160,11 +174,11 @@ class RelationConvention(Convention):
         def replace(**path_data):
             headers = dict()
             request_data = load_request_data(definition.request_schema)
-            response_data = require_response_data(definition.func(**merge_data(path_data, request_data)))
+            response_data = require_response_data(definition.call(**merge_data(path_data, request_data)))
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
             return dump_response_data(
-                definition.response_schema,
+                response_schema,
                 response_data,
                 status_code=Operation.UpdateFor.value.default_code,
                 headers=headers,
@@ -188,6 +202,7 @@ class RelationConvention(Convention):
 
         """
         request_schema = definition.request_schema or Schema()
+        response_schema = self.compile_response_schema(definition.response_schema)
 
         @self.add_route(ns.relation_path, Operation.RetrieveFor, ns)
         @qs(request_schema)
@@ -196,11 +211,14 @@ class RelationConvention(Convention):
         def retrieve(**path_data):
             headers = dict()
             request_data = load_query_string_data(request_schema)
-            response_data = require_response_data(definition.func(**merge_data(path_data, request_data)))
+            response_data = require_response_data(definition.call(**merge_data(path_data, request_data)))
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
+            headers.update(encode_resource_version_headers(definition.version_func, response_data, response_format))
+            if is_not_modified(headers):
+                return make_not_modified_response(headers)
             return dump_response_data(
-                definition.response_schema,
+                response_schema,
                 response_data,
                 headers=headers,
                 response_format=response_format,
@@ -218,6 +236,9 @@ class RelationConvention(Convention):
           available (in the case of pagination) and context is a dictionary providing any
           needed context variables for constructing pagination links
 
+        If items is an iterator (e.g. a generator), items will be serialized one at a time
+        into a streamed response body (for formats that support streaming).
+
         The definition's request_schema will be used to process query string arguments.
 
         :param ns: the namespace
@@ -228,6 +249,8 @@ class RelationConvention(Convention):
             ns.object_ns,
             definition.response_schema,
         )()
+        response_schema = self.compile_response_schema(paginated_list_schema)
+        item_schema = self.compile_response_schema(definition.response_schema)
 
         @self.add_route(ns.relation_path, Operation.SearchFor, ns)
         @qs(definition.request_schema)
@@ -235,12 +258,23 @@ class RelationConvention(Convention):
         @wraps(definition.func)
         def search(**path_data):
             page = self.page_cls.from_query_string(definition.request_schema)
-            result = definition.func(**merge_data(path_data, page.to_dict(func=identity)))
+            result = definition.call(**merge_data(path_data, page.to_dict(func=identity)))
             response_data, headers = page.to_paginated_list(result, ns, Operation.SearchFor)
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
+            headers.update(encode_collection_version_headers(definition.version_func, response_data, response_format))
+            if is_not_modified(headers):
+                return make_not_modified_response(headers)
+            if is_streaming(response_data):
+                return dump_streaming_response_data(
+                    response_schema,
+                    item_schema,
+                    response_data,
+                    headers=headers,
+                    response_format=response_format,
+                )
             return dump_response_data(
-                paginated_list_schema,
+                response_schema,
                 response_data,
                 headers=headers,
                 response_format=response_format,
@@ -249,10 +283,10 @@ class RelationConvention(Convention):
         search.__doc__ = "Search for {} relative to a {}".format(pluralize(ns.object_name), ns.subject_name)
 
 
-def configure_relation(graph, ns, mappings):
+def configure_relation(graph, ns, mappings, page_cls=None):
     """
     Register relation endpoint(s) between two resources.
 
     """
-    convention = RelationConvention(graph)
+    convention = RelationConvention(graph, page_cls=page_cls)
     convention.configure(ns, mappings)
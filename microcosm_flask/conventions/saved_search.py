@@ -47,7 +47,7 @@ class SavedSearchConvention(Convention):
             request_data = load_request_data(definition.request_schema)
             page = self.page_cls.from_dict(request_data)
             request_data.update(page.to_dict(func=identity))
-            result = definition.func(**merge_data(path_data, request_data))
+            result = definition.call(**merge_data(path_data, request_data))
             response_data, headers = page.to_paginated_list(result, ns, Operation.SavedSearch)
             definition.header_func(headers, response_data)
             response_format = self.negotiate_response_content(definition.response_formats)
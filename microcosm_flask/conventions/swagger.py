@@ -3,25 +3,54 @@ Swagger (OpenAPI) convention.
 
 Exposes swagger definitions for matching operations.
 
+Serialized definitions are cached (and served with an ETag); they are rebuilt only once new
+routes have been registered.
+
+Documents are built lazily, on the first request for each namespace and script root (paths
+include the script root, so apps mounted under a prefix get their own documents). If
+`swagger_convention.prebuild` is set, documents are also built when the convention is
+configured, for the app's configured `APPLICATION_ROOT` (and `SERVER_NAME`); this only
+saves work if the convention is configured after the routes it documents (e.g. last in
+`graph.use`) and if requests are served from the configured root.
+
 """
-from flask import g
+from collections import namedtuple
+from threading import Lock
+
+from flask import Response, g, request as flask_request
 from marshmallow import Schema, fields
-from microcosm.api import defaults
+from microcosm.api import defaults, typed
+from microcosm.config.types import boolean
 
 from microcosm_flask.conventions.base import Convention
-from microcosm_flask.conventions.encoding import load_query_string_data, make_response
-from microcosm_flask.conventions.registry import iter_endpoints, request
+from microcosm_flask.conventions.encoding import (
+    is_not_modified,
+    load_query_string_data,
+    make_not_modified_response,
+    make_response,
+    should_skip_null,
+)
+from microcosm_flask.conventions.registry import get_endpoint_registry, iter_endpoints, request
+from microcosm_flask.formatting.compression import compress_response
 from microcosm_flask.namespaces import Namespace
 from microcosm_flask.operations import Operation
 from microcosm_flask.swagger.definitions import build_swagger
 
 
+SwaggerDocument = namedtuple("SwaggerDocument", ["rule_count", "data", "content_type", "etag"])
+
+
 class ValidateSwaggerSchema(Schema):
     validate_schema = fields.Boolean()
 
 
 class SwaggerConvention(Convention):
 
+    def __init__(self, graph):
+        super(SwaggerConvention, self).__init__(graph)
+        self.documents = dict()
+        self.lock = Lock()
+
     @property
     def matching_operations(self):
         return {
@@ -36,14 +65,12 @@ class SwaggerConvention(Convention):
         Evaluated as a property to defer evaluation.
 
         """
-        def match_func(operation, ns, rule):
-            # only expose endpoints that have the correct path prefix and operation
-            return (
-                rule.rule.startswith(self.graph.build_route_path(swagger_ns.path, swagger_ns.prefix)) and
-                operation in self.matching_operations
-            )
-
-        return list(iter_endpoints(self.graph, match_func))
+        # only expose endpoints that have the correct path prefix and operation
+        return list(iter_endpoints(
+            self.graph,
+            operations=self.matching_operations,
+            path_prefix=self.graph.build_route_path(swagger_ns.path, swagger_ns.prefix),
+        ))
 
     def configure_discover(self, ns, definition):
         """
@@ -55,9 +82,65 @@ class SwaggerConvention(Convention):
         def discover():
             request_data = load_query_string_data(ValidateSwaggerSchema())
 
-            swagger = build_swagger(self.graph, ns, self.find_matching_endpoints(ns), **request_data)
+            document = self.get_document(ns, **request_data)
             g.hide_body = True
-            return make_response(swagger)
+
+            headers = dict(ETag=document.etag)
+            if is_not_modified(headers):
+                return make_not_modified_response(headers)
+
+            response = Response(document.data, content_type=document.content_type)
+            response.headers.extend(headers)
+            compress_response(response)
+            return response
+
+        if self.graph.config.swagger_convention.prebuild:
+            self.prebuild(ns)
+
+    def prebuild(self, ns):
+        """
+        Build the document for a namespace, for requests to the app's configured root.
+
+        """
+        with self.graph.flask.test_request_context():
+            self.get_document(ns)
+
+    def get_document(self, ns, validate_schema=False):
+        """
+        Get the (cached) serialized swagger definitions for a namespace.
+
+        Definitions depend on the registered routes (and on the script root that prefixes
+        their paths); a document is rebuilt if any routes were added since it was built.
+
+        """
+        rule_count = len(get_endpoint_registry(self.graph.flask).rules)
+        key = (ns.path, ns.prefix, flask_request.script_root, bool(validate_schema), should_skip_null())
+
+        document = self.documents.get(key)
+        if document is not None and document.rule_count == rule_count:
+            return document
+
+        with self.lock:
+            document = self.documents.get(key)
+            if document is not None and document.rule_count == rule_count:
+                return document
+
+            swagger = build_swagger(
+                self.graph,
+                ns,
+                self.find_matching_endpoints(ns),
+                validate_schema=validate_schema,
+            )
+            # NB: compression (if any) applies per request
+            response = make_response(swagger, compress=False)
+            document = SwaggerDocument(
+                rule_count=rule_count,
+                data=response.get_data(),
+                content_type=response.content_type,
+                etag=response.headers["ETag"],
+            )
+            self.documents[key] = document
+            return document
 
 
 @defaults(
@@ -80,6 +163,7 @@ class SwaggerConvention(Convention):
         "upload_for",
     ],
     version="",
+    prebuild=typed(boolean, default_value=False),
 )
 def configure_swagger(graph):
     """
@@ -82,7 +82,7 @@ class UploadConvention(Convention):
                 if not self.exclude_func(name, fileobj)
             ]
             with nested(*uploads) as files:
-                response_data = definition.func(files, **merge_data(path_data, request_data))
+                response_data = definition.call(files, **merge_data(path_data, request_data))
                 if response_data is None:
                     return "", 204
 
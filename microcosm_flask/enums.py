@@ -2,9 +2,12 @@ from collections import namedtuple
 from enum import Enum, unique
 
 from microcosm_flask.formatting import (
+    ArrowFormatter,
     CSVFormatter,
     HTMLFormatter,
     JSONFormatter,
+    MsgpackFormatter,
+    NDJSONFormatter,
     TextFormatter,
 )
 
@@ -34,6 +37,21 @@ class ResponseFormats(Enum):
         formatter=TextFormatter,
         priority=150,
     )
+    NDJSON = ResponseFormatSpec(
+        content_type=NDJSONFormatter.CONTENT_TYPE,
+        formatter=NDJSONFormatter,
+        priority=200,
+    )
+    MSGPACK = ResponseFormatSpec(
+        content_type=MsgpackFormatter.CONTENT_TYPE,
+        formatter=MsgpackFormatter,
+        priority=210,
+    )
+    ARROW = ResponseFormatSpec(
+        content_type=ArrowFormatter.CONTENT_TYPE,
+        formatter=ArrowFormatter,
+        priority=220,
+    )
 
     @property
     def content_type(self):
@@ -43,6 +61,10 @@ class ResponseFormats(Enum):
     def priority(self):
         return self.value.priority
 
+    @property
+    def available(self):
+        return self.value.formatter.available
+
     def matches(self, content_types):
         for content_type in content_types.split(","):
             if self.matches_content_type(content_type):
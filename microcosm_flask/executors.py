@@ -0,0 +1,97 @@
+"""
+Bounded thread pools for running request work concurrently.
+
+Work submitted during a request runs within a (plain) app context, with a copy of the values
+of `flask.g`; the request context itself is not shared (and its teardown handlers only run on
+the request thread). Per-request sessions (see `microcosm_flask.session`) are not shared across
+threads either: each task opens (and closes) its own.
+
+NB: `graph.opaque` is process-wide and is visible to worker threads as is.
+
+"""
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from functools import wraps
+from threading import Lock
+
+from flask import current_app, g, has_app_context
+from microcosm.api import binding, defaults, typed
+from microcosm.config.types import boolean
+
+from microcosm_flask.session import begin_sessions, end_sessions, get_session_keys
+
+
+def copy_current_context(func):
+    """
+    Wrap a function so that it runs (on another thread) within an app context with a copy
+    of the values of `flask.g`.
+
+    Mutable values are (shallow) copied; sessions are replaced with new ones.
+
+    """
+    if not has_app_context():
+        return func
+
+    app = current_app._get_current_object()
+    excluded_keys = get_session_keys(app)
+    g_data = {
+        key: copy(value)
+        for key, value in vars(g).items()
+        if key not in excluded_keys
+    }
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with app.app_context():
+            vars(g).update(g_data)
+            begin_sessions(app)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                end_sessions(app)
+
+    return wrapper
+
+
+@binding("search_executor")
+@defaults(
+    enabled=typed(boolean, default_value=False),
+    max_workers=typed(int, default_value=4),
+)
+class SearchExecutor:
+    """
+    Run search functions (e.g. a page query and its count) concurrently.
+
+    The pool is bounded and created on first use.
+
+    """
+    def __init__(self, graph):
+        self.enabled = graph.config.search_executor.enabled
+        self.max_workers = graph.config.search_executor.max_workers
+        self._executor = None
+        self._lock = Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="search",
+                    )
+        return self._executor
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Submit a function to the pool, with a copy of the current context.
+
+        :returns: a `Future`
+
+        """
+        return self.executor.submit(copy_current_context(func), *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
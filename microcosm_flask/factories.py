@@ -4,13 +4,24 @@ Factories to configure Flask.
 """
 import microcosm.opaque  # noqa
 from flask import Flask
-from microcosm.api import defaults
+from microcosm.api import defaults, typed
+from microcosm.config.types import boolean, comma_separated_list
+
+from microcosm_flask.timing import configure_server_timing
 
 
 @defaults(
     port=5000,
     enable_profiling=False,
+    profiling_mode="request",
     profile_dir=None,
+    json_backend="flask",
+    json_sort_keys=typed(boolean, default_value=True),
+    compression_enabled=typed(boolean, default_value=False),
+    compression_encodings=typed(comma_separated_list, default_value="br,zstd,gzip"),
+    compression_min_size=typed(int, default_value=1024),
+    cursor_secret_key=None,
+    enable_server_timing=typed(boolean, default_value=False),
 )
 def configure_flask(graph):
     """
@@ -30,6 +41,28 @@ def configure_flask(graph):
         if not isinstance(value, dict)
     })
 
+    # JSON encoding options (see `microcosm_flask.formatting.json_backends`)
+    app.config.update(
+        JSON_BACKEND=graph.config.flask.json_backend,
+        JSON_SORT_KEYS=graph.config.flask.json_sort_keys,
+    )
+
+    # response compression options (see `microcosm_flask.formatting.compression`)
+    app.config.update(
+        COMPRESSION_ENABLED=graph.config.flask.compression_enabled,
+        COMPRESSION_ENCODINGS=graph.config.flask.compression_encodings,
+        COMPRESSION_MIN_SIZE=graph.config.flask.compression_min_size,
+    )
+
+    # cursor signing (see `microcosm_flask.paging.CursorPage`)
+    app.config.update(
+        CURSOR_SECRET_KEY=graph.config.flask.cursor_secret_key,
+    )
+
+    # phase timing (see `microcosm_flask.timing`)
+    if graph.config.flask.enable_server_timing:
+        configure_server_timing(app)
+
     return app
 
 
@@ -0,0 +1,68 @@
+"""
+Arrow (IPC stream) response formatting.
+
+Items are encoded as columns of a single table; the rest of a paginated list (e.g. `count`
+and `_links`) is JSON-encoded (using the configured JSON backend) into the table's schema
+metadata.
+
+Requires `pyarrow` (see the "arrow" extra).
+
+"""
+from flask import current_app
+
+from microcosm_flask.formatting.base import BaseFormatter
+from microcosm_flask.formatting.json_backends import StdlibJSONBackend, get_json_backend
+
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class ArrowFormatter(BaseFormatter):
+
+    CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
+    available = pyarrow is not None
+
+    @property
+    def content_type(self):
+        return ArrowFormatter.CONTENT_TYPE
+
+    def get_column_names(self, items):
+        column_names = dict()
+        for item in items:
+            column_names.update(dict.fromkeys(item))
+        return list(column_names)
+
+    def build_table(self, response_data):
+        if "items" in response_data:
+            items = list(response_data["items"])
+            # NB: the "flask" backend only encodes responses; use the standard library instead
+            backend = get_json_backend(current_app.config.get("JSON_BACKEND")) or StdlibJSONBackend()
+            metadata = {
+                key: backend.dumps(value)
+                for key, value in response_data.items()
+                if key != "items"
+            }
+        else:
+            items = [response_data]
+            metadata = None
+
+        table = pyarrow.table(
+            {
+                column_name: [item.get(column_name) for item in items]
+                for column_name in self.get_column_names(items)
+            },
+            metadata=metadata,
+        )
+        return table
+
+    def format(self, response_data):
+        table = self.build_table(response_data)
+
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
@@ -4,11 +4,20 @@ Response formatting base class.
 """
 from abc import ABCMeta, abstractmethod
 from binascii import hexlify
+from collections.abc import Iterator
 
-from flask import Response
+from flask import Response, has_request_context, stream_with_context
 from werkzeug.http import quote_etag
 from werkzeug.utils import get_content_type
 
+from microcosm_flask.formatting.compression import compress_response
+from microcosm_flask.timing import (
+    COMPRESS,
+    ETAG,
+    FORMAT,
+    timed,
+)
+
 
 try:
     import spooky
@@ -16,18 +25,37 @@ except ImportError:
     spooky = None
 
 
+def is_streaming_content(response_data):
+    """
+    Does (dumped) response data contain lazily evaluated items?
+
+    """
+    return isinstance(response_data, dict) and isinstance(response_data.get("items"), Iterator)
+
+
 class BaseFormatter(metaclass=ABCMeta):
 
+    # can this formatter stream lazily evaluated items (see `dump_streaming_response_data`)?
+    supports_streaming = False
+
+    # are this formatter's (optional) dependencies installed?
+    available = True
+
     def __init__(self, response_schema=None):
         # Formatting could need the response schema
         # e.g. to specify column ordering in CSV response
         self.response_schema = response_schema
 
     def __call__(self, response_data, headers=None, **kwargs):
-        response = self.build_response(response_data)
-        headers = self.build_headers(headers=headers or {}, **kwargs)
-        response.headers.extend(headers)
-        self.build_etag(response, **kwargs)
+        with timed(FORMAT):
+            response = self.build_response(response_data)
+            headers = self.build_headers(headers=headers or {}, **kwargs)
+            response.headers.extend(headers)
+        # NB: compress first so that the etag describes the encoded variant
+        with timed(COMPRESS):
+            self.build_compression(response, **kwargs)
+        with timed(ETAG):
+            self.build_etag(response, **kwargs)
         return response
 
     @property
@@ -39,14 +67,27 @@ class BaseFormatter(metaclass=ABCMeta):
         return response_data
 
     def build_response(self, response_data):
+        content = self.format(response_data)
+
+        if self.supports_streaming and is_streaming_content(response_data) and has_request_context():
+            # items are dumped as they are written; keep the request context around for them
+            content = stream_with_context(content)
+
         return Response(
-            self.format(response_data),
+            content,
             content_type=get_content_type(self.content_type, Response.charset)
         )
 
     def build_headers(self, headers, **kwargs):
         return headers
 
+    def build_compression(self, response, compress=None, **kwargs):
+        """
+        Compress the response body, if enabled and accepted by the client.
+
+        """
+        compress_response(response, compress)
+
     def build_etag(self, response, include_etag=True, **kwargs):
         """
         Add an etag to the response body.
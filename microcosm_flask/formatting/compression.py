@@ -0,0 +1,185 @@
+"""
+Response compression.
+
+Compresses response bodies according to the client's `Accept-Encoding` header. Supports
+gzip, plus brotli and zstd when installed.
+
+Buffered responses are compressed only above a minimum size; streamed responses are
+compressed incrementally, chunk by chunk.
+
+"""
+from abc import ABCMeta, abstractmethod
+from zlib import DEFLATED, Z_DEFAULT_COMPRESSION, compressobj
+
+from flask import current_app, has_request_context, request
+
+from microcosm_flask.conventions.registry import get_compress
+
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# NB: gzip framing (with a zero mtime, so output is deterministic)
+GZIP_WBITS = 31
+
+
+class Encoding(metaclass=ABCMeta):
+    """
+    A content coding.
+
+    Compressors are created per response and must support `compress(data)` and `flush()`.
+
+    """
+    name = None
+
+    @property
+    def available(self):
+        return True
+
+    @abstractmethod
+    def compressor(self):
+        pass
+
+
+class GzipEncoding(Encoding):
+    name = "gzip"
+
+    def compressor(self):
+        return compressobj(Z_DEFAULT_COMPRESSION, DEFLATED, GZIP_WBITS)
+
+
+class BrotliCompressor:
+
+    def __init__(self):
+        self.compressor = brotli.Compressor()
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.finish()
+
+
+class BrotliEncoding(Encoding):
+    name = "br"
+
+    @property
+    def available(self):
+        return brotli is not None
+
+    def compressor(self):
+        return BrotliCompressor()
+
+
+class ZstdEncoding(Encoding):
+    name = "zstd"
+
+    @property
+    def available(self):
+        return zstandard is not None
+
+    def compressor(self):
+        return zstandard.ZstdCompressor().compressobj()
+
+
+ENCODINGS = dict(
+    br=BrotliEncoding(),
+    gzip=GzipEncoding(),
+    zstd=ZstdEncoding(),
+)
+
+
+def compress_data(data, encoding):
+    compressor = encoding.compressor()
+    return compressor.compress(data) + compressor.flush()
+
+
+def iter_compressed(chunks, encoding):
+    """
+    Incrementally compress an iterable of chunks.
+
+    """
+    compressor = encoding.compressor()
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def is_compression_enabled(compress=None):
+    """
+    Is compression enabled for the current endpoint?
+
+    Endpoints may opt in or out (see `registry.compress`); otherwise the app config decides.
+
+    """
+    if compress is None:
+        compress = get_compress(current_app.view_functions.get(request.endpoint))
+    if compress is None:
+        compress = current_app.config.get("COMPRESSION_ENABLED", False)
+    return compress
+
+
+def select_encoding():
+    """
+    Choose a content coding for the current request.
+
+    Returns None if the client does not accept any available coding.
+
+    """
+    names = [
+        name
+        for name in current_app.config.get("COMPRESSION_ENCODINGS", ["gzip"])
+        if name in ENCODINGS and ENCODINGS[name].available
+    ]
+    name = request.accept_encodings.best_match(names)
+    if name is None:
+        return None
+    return ENCODINGS[name]
+
+
+def compress_response(response, compress=None):
+    """
+    Compress a response (in place), if enabled and accepted by the client.
+
+    Any strong ETag set before compression is weakened, since the encoded variant is
+    semantically (but not byte-for-byte) equivalent.
+
+    """
+    if not has_request_context() or not is_compression_enabled(compress):
+        return
+
+    if response.status_code in (204, 304) or "Content-Encoding" in response.headers:
+        return
+
+    response.vary.add("Accept-Encoding")
+
+    encoding = select_encoding()
+    if encoding is None:
+        return
+
+    if response.is_streamed:
+        response.response = iter_compressed(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config.get("COMPRESSION_MIN_SIZE", 0):
+            return
+        response.set_data(compress_data(data, encoding))
+
+    response.headers["Content-Encoding"] = encoding.name
+
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
@@ -4,14 +4,53 @@ CSV response formatting.
 """
 from csv import QUOTE_MINIMAL, writer
 from io import StringIO
+from itertools import chain
+from weakref import WeakKeyDictionary
 
 from microcosm_flask.formatting.base import BaseFormatter
 
 
+# flush rows to the response in chunks of (roughly) this many characters
+CHUNK_SIZE = 64 * 1024
+
+# column orders, resolved once per schema
+COLUMN_ORDERS = WeakKeyDictionary()
+
+
+def get_column_order(response_schema):
+    """
+    Resolve a schema's (optional) `csv_column_order`.
+
+    Returns a copy; the schema's own list is never modified.
+
+    """
+    if response_schema is None:
+        return None
+
+    try:
+        return COLUMN_ORDERS[response_schema]
+    except (KeyError, TypeError):
+        pass
+
+    column_order = getattr(response_schema, "csv_column_order", None)
+    if column_order is not None:
+        column_order = tuple(column_order)
+
+    try:
+        COLUMN_ORDERS[response_schema] = column_order
+    except TypeError:
+        # not weakly referenceable
+        pass
+
+    return column_order
+
+
 class CSVFormatter(BaseFormatter):
 
     CONTENT_TYPE = "text/csv"
 
+    supports_streaming = True
+
     @property
     def content_type(self):
         return CSVFormatter.CONTENT_TYPE
@@ -26,43 +65,53 @@ class CSVFormatter(BaseFormatter):
     def get_column_names(self, list_response_data):
         response_fields = list(list_response_data[0].keys())
 
-        column_order = getattr(self.response_schema, "csv_column_order", None)
+        column_order = get_column_order(self.response_schema)
         if column_order is None:
             # We should still be able to return a CSV even if no column order has been specified
-            column_names = response_fields
-        else:
-            column_names = self.response_schema.csv_column_order
-
-            # The column order be only partially specified
-            column_names.extend([field_name for field_name in response_fields if field_name not in column_names])
+            return response_fields
 
-        return column_names
+        # The column order be only partially specified
+        return list(column_order) + [
+            field_name
+            for field_name in response_fields
+            if field_name not in column_order
+        ]
 
     def format(self, response_data):
         """
-        Make Flask `Response` object, with data returned as a generator for the CSV content
-        The CSV is built from JSON-like object (Python `dict` or list of `dicts`)
+        Generate CSV content, row by row.
+
+        The CSV is built from JSON-like object (Python `dict` or list of `dicts`); items
+        may also be an iterator, in which case memory use does not scale with the number
+        of rows.
 
         """
         if "items" in response_data:
-            list_response_data = response_data["items"]
+            items = iter(response_data["items"])
         else:
-            list_response_data = [response_data]
+            items = iter([response_data])
 
-        write_column_names = type(list_response_data[0]) not in (tuple, list)
+        try:
+            first_item = next(items)
+        except StopIteration:
+            return
 
         output = StringIO()
         csv_writer = writer(output, quoting=QUOTE_MINIMAL)
 
+        write_column_names = type(first_item) not in (tuple, list)
         if write_column_names:
-            column_names = self.get_column_names(list_response_data)
+            column_names = self.get_column_names([first_item])
             csv_writer.writerow(column_names)
 
-        for item in list_response_data:
+        for item in chain([first_item], items):
             csv_writer.writerow(
-                [item[column] for column in column_names] if write_column_names else list(item)
+                [item.get(column) for column in column_names] if write_column_names else list(item)
             )
 
-        # Ideally we'd want to `yield` each line to stream the content
-        # But something downstream seems to break streaming
+            if output.tell() >= CHUNK_SIZE:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+
         yield output.getvalue()
@@ -0,0 +1,152 @@
+"""
+Pluggable JSON encoding backends.
+
+Backends encode response data directly to (compact) UTF-8 bytes, handling common
+non-JSON types (UUIDs, dates and times, enums) natively rather than requiring values
+to pass through `str` first. Backends also decode request bodies.
+
+The "flask" backend (the default) preserves the behavior of `flask.jsonify` and
+`flask.Request.get_json`.
+
+"""
+from abc import ABCMeta, abstractmethod
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from json import dumps, loads
+from uuid import UUID
+
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+FLASK_BACKEND = "flask"
+DEFAULT_BACKEND = "json"
+
+
+def encode_default(value):
+    """
+    Encode values that are not natively supported by JSON.
+
+    """
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "__html__"):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JSONBackend(metaclass=ABCMeta):
+    """
+    Encode response data as JSON bytes.
+
+    """
+    @property
+    def available(self):
+        return True
+
+    @abstractmethod
+    def dumps(self, data, sort_keys=True):
+        pass
+
+    @abstractmethod
+    def loads(self, data):
+        """
+        Decode JSON from bytes; raises ValueError on malformed input.
+
+        """
+        pass
+
+
+class StdlibJSONBackend(JSONBackend):
+
+    def dumps(self, data, sort_keys=True):
+        return dumps(
+            data,
+            default=encode_default,
+            ensure_ascii=False,
+            separators=(",", ":"),
+            sort_keys=sort_keys,
+        ).encode("utf-8")
+
+    def loads(self, data):
+        return loads(data)
+
+
+class OrjsonBackend(JSONBackend):
+
+    @property
+    def available(self):
+        return orjson is not None
+
+    def dumps(self, data, sort_keys=True):
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, default=encode_default, option=option)
+
+    def loads(self, data):
+        # NB: orjson.JSONDecodeError is a subclass of ValueError
+        return orjson.loads(data)
+
+
+class UjsonBackend(JSONBackend):
+
+    @property
+    def available(self):
+        return ujson is not None
+
+    def dumps(self, data, sort_keys=True):
+        return ujson.dumps(
+            data,
+            default=encode_default,
+            ensure_ascii=False,
+            escape_forward_slashes=False,
+            sort_keys=sort_keys,
+        ).encode("utf-8")
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+JSON_BACKENDS = dict(
+    json=StdlibJSONBackend(),
+    orjson=OrjsonBackend(),
+    ujson=UjsonBackend(),
+)
+
+
+def get_json_backend(name):
+    """
+    Resolve a JSON backend by name.
+
+    Returns None for the "flask" backend; falls back to the standard library if
+    the named backend is not installed.
+
+    """
+    if not name or name == FLASK_BACKEND:
+        return None
+
+    try:
+        backend = JSON_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported JSON backend: {name}")
+
+    if not backend.available:
+        return JSON_BACKENDS[DEFAULT_BACKEND]
+
+    return backend
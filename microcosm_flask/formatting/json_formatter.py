@@ -1,15 +1,80 @@
-from flask import jsonify
+from flask import (
+    Response,
+    current_app,
+    json,
+    jsonify,
+    stream_with_context,
+)
 
-from microcosm_flask.formatting.base import BaseFormatter
+from microcosm_flask.formatting.base import BaseFormatter, is_streaming_content
+from microcosm_flask.formatting.json_backends import get_json_backend
+
+
+def get_json_dumps():
+    """
+    Resolve a function that encodes data as JSON bytes, using the configured backend.
+
+    """
+    backend = get_json_backend(current_app.config.get("JSON_BACKEND"))
+    sort_keys = current_app.config.get("JSON_SORT_KEYS", True)
+
+    if backend is None:
+        def dumps(data):
+            return json.dumps(data).encode("utf-8")
+    else:
+        def dumps(data):
+            return backend.dumps(data, sort_keys=sort_keys)
+
+    return dumps
 
 
 class JSONFormatter(BaseFormatter):
 
     CONTENT_TYPE = "application/json"
 
+    supports_streaming = True
+
     @property
     def content_type(self):
         return JSONFormatter.CONTENT_TYPE
 
     def build_response(self, response_data):
-        return jsonify(response_data)
+        if is_streaming_content(response_data):
+            return Response(
+                stream_with_context(self.iter_streaming_content(response_data)),
+                mimetype=self.content_type,
+            )
+
+        backend = get_json_backend(current_app.config.get("JSON_BACKEND"))
+        if backend is None:
+            return jsonify(response_data)
+
+        return Response(
+            backend.dumps(
+                response_data,
+                sort_keys=current_app.config.get("JSON_SORT_KEYS", True),
+            ),
+            mimetype=self.content_type,
+        )
+
+    def iter_streaming_content(self, response_data):
+        """
+        Generate a JSON document in chunks, encoding one item at a time.
+
+        The `items` array is written first, followed by the rest of the document.
+
+        """
+        dumps = get_json_dumps()
+
+        yield b'{"items":['
+        for index, item in enumerate(response_data["items"]):
+            yield (b"," if index else b"") + dumps(item)
+        yield b"]"
+
+        envelope = dumps({
+            key: value
+            for key, value in response_data.items()
+            if key != "items"
+        })
+        # splice the rest of the envelope into the current object
+        yield b"," + envelope[1:] if envelope != b"{}" else b"}"
@@ -0,0 +1,28 @@
+"""
+MessagePack response formatting.
+
+Requires `msgpack` (see the "msgpack" extra).
+
+"""
+from microcosm_flask.formatting.base import BaseFormatter
+from microcosm_flask.formatting.json_backends import encode_default
+
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class MsgpackFormatter(BaseFormatter):
+
+    CONTENT_TYPE = "application/msgpack"
+
+    available = msgpack is not None
+
+    @property
+    def content_type(self):
+        return MsgpackFormatter.CONTENT_TYPE
+
+    def format(self, response_data):
+        return msgpack.packb(response_data, default=encode_default, use_bin_type=True)
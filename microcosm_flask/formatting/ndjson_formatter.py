@@ -0,0 +1,31 @@
+"""
+Newline-delimited JSON response formatting.
+
+Writes one item per line (the paginated list envelope is omitted; counts remain available
+via the `X-Total-Count` header).
+
+"""
+from microcosm_flask.formatting.base import BaseFormatter
+from microcosm_flask.formatting.json_formatter import get_json_dumps
+
+
+class NDJSONFormatter(BaseFormatter):
+
+    CONTENT_TYPE = "application/x-ndjson"
+
+    supports_streaming = True
+
+    @property
+    def content_type(self):
+        return NDJSONFormatter.CONTENT_TYPE
+
+    def format(self, response_data):
+        dumps = get_json_dumps()
+
+        if "items" in response_data:
+            items = response_data["items"]
+        else:
+            items = [response_data]
+
+        for item in items:
+            yield dumps(item) + b"\n"
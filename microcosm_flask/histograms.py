@@ -0,0 +1,289 @@
+"""
+In-process (HDR-style) histograms.
+
+Values (e.g. latencies in microseconds) are counted in log-linear buckets: values below 128
+are exact, larger values fall into one of 64 buckets per power of two (for a relative error
+of at most 1/64).
+
+"""
+from abc import ABCMeta, abstractmethod
+from bisect import bisect_left
+from math import ceil
+from threading import Lock, current_thread, local
+
+
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT >> 1
+
+
+def bucket_for(value):
+    """
+    Map a non-negative integer to its bucket.
+
+    """
+    if value < SUB_BUCKET_COUNT:
+        return value
+
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return shift * SUB_BUCKET_HALF + (value >> shift)
+
+
+def bucket_range(bucket):
+    """
+    Compute the (inclusive) range of values counted in a bucket.
+
+    """
+    if bucket < SUB_BUCKET_COUNT:
+        return bucket, bucket
+
+    shift = bucket // SUB_BUCKET_HALF - 1
+    lower = (bucket - shift * SUB_BUCKET_HALF) << shift
+    return lower, lower + (1 << shift) - 1
+
+
+class Histogram:
+    """
+    A histogram of non-negative integers.
+
+    Histograms are not thread-safe (see `Histograms`).
+
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = dict()
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        value = max(int(value), 0)
+        bucket = bucket_for(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """
+        Add the values of another histogram (which may be concurrently recorded).
+
+        """
+        # NB: copying a dict is atomic (unlike iterating over it)
+        counts = other.counts.copy()
+        for bucket, count in counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += sum(counts.values())
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def subtract(self, other):
+        """
+        Compute the values recorded since an earlier copy of this histogram.
+
+        """
+        delta = Histogram()
+        if other is None:
+            return delta.merge(self)
+
+        for bucket, count in self.counts.items():
+            count -= other.counts.get(bucket, 0)
+            if count > 0:
+                delta.counts[bucket] = count
+
+        delta.count = sum(delta.counts.values())
+        delta.total = max(self.total - other.total, 0)
+        delta.max = min(bucket_range(max(delta.counts))[1], self.max) if delta.counts else 0
+        return delta
+
+    def cumulative_counts(self, bounds):
+        """
+        Count values less than or equal to each (sorted) bound.
+
+        Values are attributed to bounds by the upper end of their bucket.
+
+        """
+        counts = [0] * (len(bounds) + 1)
+        for bucket, count in self.counts.items():
+            counts[bisect_left(bounds, bucket_range(bucket)[1])] += count
+
+        running = 0
+        for index, count in enumerate(counts[:-1]):
+            running += count
+            counts[index] = running
+        return counts[:-1]
+
+    def to_dict(self):
+        return dict(
+            counts=sorted(self.counts.items()),
+            total=self.total,
+            max=self.max,
+        )
+
+    @classmethod
+    def from_dict(cls, dct):
+        histogram = cls()
+        histogram.counts = {bucket: count for bucket, count in dct["counts"]}
+        histogram.count = sum(histogram.counts.values())
+        histogram.total = dct["total"]
+        histogram.max = dct["max"]
+        return histogram
+
+    @property
+    def mean(self):
+        if not self.count:
+            return 0
+        return self.total / self.count
+
+    def percentile(self, percentile):
+        """
+        Compute the (highest equivalent) value at a percentile (between 0 and 100).
+
+        """
+        if not self.count:
+            return 0
+
+        target = max(ceil(self.count * percentile / 100), 1)
+        running = 0
+        for bucket in sorted(self.counts):
+            running += self.counts[bucket]
+            if running >= target:
+                return min(bucket_range(bucket)[1], self.max)
+
+        return self.max
+
+
+class Sharded(metaclass=ABCMeta):
+    """
+    Values by key, sharded by thread.
+
+    Each thread updates its own shard without locking; reads merge shards across threads.
+
+    The shards of threads that have exited are folded into a (retired) shard, so that
+    thread-per-request servers do not accumulate shards.
+
+    """
+    def __init__(self):
+        self.local = local()
+        self.lock = Lock()
+        # (thread, shard) pairs
+        self.shards = []
+        self.retired = dict()
+
+    def shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = dict()
+            with self.lock:
+                self.prune()
+                self.shards.append((current_thread(), shard))
+            return shard
+
+    def prune(self):
+        """
+        Retire the shards of threads that have exited (with the lock held).
+
+        """
+        shards = []
+        retired = None
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                shards.append((thread, shard))
+                continue
+
+            # NB: copy on write; snapshots may be reading the retired shard
+            if retired is None:
+                retired = dict(self.retired)
+            for key, value in shard.items():
+                retired[key] = self.combine(retired.get(key), value)
+
+        self.shards = shards
+        if retired is not None:
+            self.retired = retired
+
+    @abstractmethod
+    def combine(self, retired_value, value):
+        """
+        Combine a retired value with the value of an exited thread (as a new value).
+
+        """
+        pass
+
+    def iter_shards(self):
+        with self.lock:
+            self.prune()
+            shards = [shard for _, shard in self.shards]
+            retired = self.retired
+
+        yield retired
+        for shard in shards:
+            # NB: copying a dict is atomic (unlike iterating over it)
+            yield shard.copy()
+
+
+class Histograms(Sharded):
+    """
+    Histograms by key (e.g. endpoint and status class).
+
+    Histograms are cumulative.
+
+    """
+    def record(self, key, value):
+        shard = self.shard()
+
+        try:
+            histogram = shard[key]
+        except KeyError:
+            histogram = shard[key] = Histogram()
+
+        histogram.record(value)
+
+    def combine(self, retired_value, value):
+        combined = Histogram()
+        if retired_value is not None:
+            combined.merge(retired_value)
+        return combined.merge(value)
+
+    def snapshot(self):
+        """
+        Merge histograms across threads.
+
+        """
+        merged = dict()
+        for shard in self.iter_shards():
+            for key, histogram in shard.items():
+                try:
+                    merged[key].merge(histogram)
+                except KeyError:
+                    merged[key] = Histogram().merge(histogram)
+
+        return merged
+
+
+class Counters(Sharded):
+    """
+    Counters (or gauges) by key.
+
+    """
+    def add(self, key, value=1):
+        shard = self.shard()
+        shard[key] = shard.get(key, 0) + value
+
+    def combine(self, retired_value, value):
+        return (retired_value or 0) + value
+
+    def snapshot(self):
+        """
+        Sum counters across threads.
+
+        """
+        merged = dict()
+        for shard in self.iter_shards():
+            for key, value in shard.items():
+                merged[key] = merged.get(key, 0) + value
+
+        return merged
@@ -2,25 +2,76 @@
 Metrics extensions for routes.
 
 """
+from atexit import register
+from functools import wraps
+from logging import getLogger
+from threading import Event, Lock, Thread
+from time import perf_counter
+
 from microcosm.api import defaults, typed
 from microcosm.config.types import boolean
 from microcosm.errors import NotBoundError
 
+from microcosm_flask.audit import parse_response
+from microcosm_flask.errors import extract_status_code
+from microcosm_flask.histograms import Counters, Histograms
+from microcosm_flask.timing import get_phase_timings
+
+
+logger = getLogger(__name__)
+
+
+def status_class(status_code) -> str:
+    """
+    Label a status code with its class (e.g. 403 becomes "4xx").
+
+    """
+    return str(status_code)[0] + "xx"
+
 
 @defaults(
     enabled=typed(boolean, default_value=True),
+    aggregate=typed(boolean, default_value=False),
+    flush_interval=typed(float, default_value=10.0),
+    percentiles=[50, 90, 99],
 )
 class RouteMetrics:
+    """
+    Route timing and counting metrics.
+
+    By default, every request is sent to the metrics client. If `route_metrics.aggregate`
+    is set, latencies are instead recorded in in-process histograms (by endpoint and status
+    class, and by endpoint and phase; see `microcosm_flask.timing`) and flushed to the metrics
+    client periodically (if there is one).
 
+    """
     def __init__(self, graph):
         self.metrics = self.get_metrics(graph)
-        self.enabled = bool(
+        self.client_enabled = bool(
             self.metrics
             and self.metrics.host != "localhost"
+        )
+        self.aggregate = graph.config.route_metrics.aggregate
+        self.enabled = bool(
+            (self.client_enabled or self.aggregate)
             and graph.config.route_metrics.enabled
         )
         self.graph = graph
 
+        self.flush_interval = graph.config.route_metrics.flush_interval
+        self.percentiles = [
+            float(percentile)
+            for percentile in graph.config.route_metrics.percentiles
+        ]
+        self.histograms = Histograms()
+        self.phases = Histograms()
+        self.in_flight = Counters()
+        self.flushed = dict()
+        self.phases_flushed = dict()
+        self.lock = Lock()
+        self.stopped = Event()
+        self.thread = None
+
     def get_metrics(self, graph):
         """
         Fetch the metrics client from the graph.
@@ -34,6 +85,9 @@ class RouteMetrics:
             return None
 
     def __call__(self, endpoint):
+        if self.aggregate:
+            return self.aggregating(endpoint)
+
         from microcosm_flask.metrics_classifier import StatusCodeClassifier
 
         def decorator(func):
@@ -54,3 +108,129 @@ class RouteMetrics:
             return timing(counting(func))
 
         return decorator
+
+    def aggregating(self, endpoint):
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                self.in_flight.add(endpoint)
+                start_time = perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as error:
+                    self.record(endpoint, extract_status_code(error), start_time)
+                    raise
+                else:
+                    self.record(endpoint, parse_response(result)[1], start_time)
+                    return result
+                finally:
+                    self.in_flight.add(endpoint, -1)
+
+            return wrapper
+
+        return decorator
+
+    def record(self, endpoint, status_code, start_time):
+        elapsed_us = (perf_counter() - start_time) * 1000000
+        self.histograms.record((endpoint, status_class(status_code)), elapsed_us)
+        for phase, elapsed_ms in get_phase_timings().items():
+            self.phases.record((endpoint, phase), elapsed_ms * 1000)
+
+        if self.client_enabled and self.thread is None:
+            self.start()
+
+    def summary(self):
+        """
+        Summarize route latencies (in milliseconds) by endpoint and status class.
+
+        """
+        summary = dict()
+        for (endpoint, label), histogram in sorted(self.histograms.snapshot().items()):
+            summary.setdefault(endpoint, dict())[label] = self.summarize(histogram)
+        return summary
+
+    def phase_summary(self):
+        """
+        Summarize route phase latencies (in milliseconds) by endpoint and phase.
+
+        """
+        summary = dict()
+        for (endpoint, phase), histogram in sorted(self.phases.snapshot().items()):
+            summary.setdefault(endpoint, dict())[phase] = self.summarize(histogram)
+        return summary
+
+    def summarize(self, histogram):
+        summary = dict(
+            count=histogram.count,
+            mean=histogram.mean / 1000,
+            max=histogram.max / 1000,
+        )
+        for percentile in self.percentiles:
+            summary["p{:g}".format(percentile)] = histogram.percentile(percentile) / 1000
+        return summary
+
+    def start(self):
+        # NB: start lazily (e.g. after forking worker processes)
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = Thread(target=self.run, name="route-metrics", daemon=True)
+            self.thread.start()
+            register(self.stop)
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Unable to flush route metrics")
+
+    def stop(self):
+        self.stopped.set()
+        self.flush()
+
+    def flush(self):
+        """
+        Send the latencies recorded since the last flush to the metrics client.
+
+        """
+        if not self.client_enabled:
+            return
+
+        with self.lock:
+            snapshot = self.histograms.snapshot()
+            for (endpoint, label), histogram in snapshot.items():
+                delta = histogram.subtract(self.flushed.get((endpoint, label)))
+                if not delta.count:
+                    continue
+
+                tags = [
+                    f"endpoint:{endpoint}",
+                    "backend_type:microcosm_flask",
+                    f"classifier:{label}",
+                ]
+                self.metrics.increment("route.call.count", delta.count, tags=tags)
+                self.metrics.gauge("route.max", delta.max / 1000, tags=tags)
+                for percentile in self.percentiles:
+                    self.metrics.gauge("route.p{:g}".format(percentile), delta.percentile(percentile) / 1000, tags=tags)
+
+            phases = self.phases.snapshot()
+            for (endpoint, phase), histogram in phases.items():
+                delta = histogram.subtract(self.phases_flushed.get((endpoint, phase)))
+                if not delta.count:
+                    continue
+
+                tags = [
+                    f"endpoint:{endpoint}",
+                    "backend_type:microcosm_flask",
+                    f"phase:{phase}",
+                ]
+                for percentile in self.percentiles:
+                    self.metrics.gauge(
+                        "route.phase.p{:g}".format(percentile),
+                        delta.percentile(percentile) / 1000,
+                        tags=tags,
+                    )
+
+            self.flushed = snapshot
+            self.phases_flushed = phases
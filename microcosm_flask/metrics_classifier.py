@@ -5,6 +5,7 @@ except ImportError:
 
 from microcosm_flask.audit import parse_response
 from microcosm_flask.errors import extract_status_code
+from microcosm_flask.metrics import status_class
 
 
 class StatusCodeClassifier(Classifier):
@@ -25,4 +26,4 @@ class StatusCodeClassifier(Classifier):
     # This will reduce the cardinality of metrics collected which will reduce cost
     # For detailed status code errors we have logs
     def normalize_status_code(self, status_code: int) -> str:
-        return str(status_code)[0] + "xx"
+        return status_class(status_code)
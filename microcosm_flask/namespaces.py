@@ -20,6 +20,7 @@ from microcosm_flask.naming import (
     singleton_path_for,
 )
 from microcosm_flask.operations import Operation
+from microcosm_flask.url_templates import expand_url_template
 
 
 class Namespace:
@@ -171,11 +172,15 @@ class Namespace:
         """
         Construct an full href for an operation against a resource.
 
+        Uses precompiled URL templates where possible (see `microcosm_flask.url_templates`).
+
         :parm qs: the query string dictionary, if any
         :param kwargs: additional arguments for path expansion
 
         """
-        url = urljoin(request.url_root, self.url_for(operation, **kwargs))
+        url = expand_url_template(self.endpoint_for(operation), kwargs)
+        if url is None:
+            url = urljoin(request.url_root, self.url_for(operation, **kwargs))
         qs_character = "?" if url.find("?") == -1 else "&"
 
         return "{}{}".format(
@@ -0,0 +1,125 @@
+"""
+Content negotiation.
+
+Parses `Accept` headers per RFC 7231 (section 5.3.2): each response format is weighted by
+the quality (q-value) of the most specific media range that matches it; formats with equal
+quality fall back to server-side priority.
+
+Negotiation results are memoized: clients send only a handful of distinct `Accept` headers.
+
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from microcosm_flask.enums import ResponseFormats
+
+
+NEGOTIATION_CACHE_SIZE = 256
+
+
+MediaRange = namedtuple("MediaRange", ["type", "subtype", "specificity", "quality"])
+
+
+def parse_media_range(value):
+    """
+    Parse a single media range (e.g. `text/html;level=1;q=0.5`).
+
+    Returns None if the media range is malformed.
+
+    """
+    media_type, *params = value.split(";")
+    try:
+        type_, subtype = media_type.strip().lower().split("/")
+    except ValueError:
+        return None
+
+    if not type_ or not subtype or (type_ == "*" and subtype != "*"):
+        return None
+
+    quality = 1.0
+    extensions = 0
+    for param in params:
+        key, _, param_value = param.partition("=")
+        if key.strip().lower() != "q":
+            extensions += 1
+            continue
+        try:
+            quality = float(param_value.strip())
+        except ValueError:
+            return None
+        if not 0 <= quality <= 1:
+            return None
+        # NB: accept-ext parameters follow the q-value
+        break
+
+    specificity = (type_ != "*") + (subtype != "*")
+    if specificity == 2:
+        specificity += extensions
+
+    return MediaRange(type_, subtype, specificity, quality)
+
+
+def parse_accept(accept):
+    """
+    Parse an `Accept` header into media ranges, most specific first.
+
+    """
+    media_ranges = (
+        parse_media_range(value)
+        for value in accept.split(",")
+        if value.strip()
+    )
+    return sorted(
+        (media_range for media_range in media_ranges if media_range is not None),
+        key=lambda media_range: -media_range.specificity,
+    )
+
+
+def quality_of(content_type, media_ranges):
+    """
+    Compute the quality of a content type: the q-value of the most specific matching range.
+
+    Returns None if no media range matches.
+
+    """
+    type_, subtype = content_type.lower().split("/")
+    for media_range in media_ranges:
+        if media_range.type not in ("*", type_):
+            continue
+        if media_range.subtype not in ("*", subtype):
+            continue
+        return media_range.quality
+    return None
+
+
+@lru_cache(maxsize=NEGOTIATION_CACHE_SIZE)
+def negotiate(accept, allowed_response_formats):
+    """
+    Choose the best response format for an `Accept` header.
+
+    Returns None if no allowed (and available) format is acceptable.
+
+    :param accept: the `Accept` header value
+    :param allowed_response_formats: a (hashable) tuple of `ResponseFormats`
+
+    """
+    media_ranges = parse_accept(accept)
+
+    best_format, best_quality = None, 0
+    for response_format in sorted(allowed_response_formats, key=lambda this: this.priority):
+        if not response_format.available:
+            # optional dependencies are not installed
+            continue
+        quality = quality_of(response_format.content_type, media_ranges)
+        if quality is not None and quality > best_quality:
+            best_format, best_quality = response_format, quality
+
+    return best_format
+
+
+def find_acceptable_format(accept, allowed_response_formats, default=ResponseFormats.JSON):
+    """
+    Negotiate a response format, falling back to a default.
+
+    """
+    return negotiate(accept, tuple(allowed_response_formats)) or default
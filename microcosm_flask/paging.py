@@ -11,6 +11,15 @@ scroll settings. This module encapsulates paging into a set of extensible, inter
     links to other pages.
  -  A `PaginatedListSchema` defines a (marshmallow) schema for encoding a paginated list (e.g. in a response)
 
+Two page implementations are provided:
+
+ -  `OffsetLimitPage` pages by offset and limit
+ -  `HasMorePage` pages by offset and limit, but only counts when asked to (`?count=true`); it
+    fetches one extra item to decide whether there is a next page
+ -  `CursorPage` pages by an opaque (signed) cursor that encodes the sort key of the last item
+    seen; stores can then use a keyset predicate instead of scanning and discarding `offset` rows
+    (like `HasMorePage`, it only counts when asked to)
+
 
 Typical Usage:
 
@@ -37,13 +46,40 @@ Typical Usage:
     return dump_response_Data(paginated_list_schema, paginated_list, headers=headers)
 
 """
-from flask import request
-from marshmallow import Schema, fields
+from collections.abc import Iterator
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
 
-from microcosm_flask.conventions.encoding import encode_count_header, load_query_string_data
+from flask import current_app, request
+from itsdangerous import BadSignature, URLSafeSerializer
+from marshmallow import Schema, fields
+from microcosm.errors import ValidationError
+from werkzeug.exceptions import UnprocessableEntity
+
+from microcosm_flask.conventions.encoding import (
+    encode_count_header,
+    load_query_string_data,
+    with_context,
+)
+from microcosm_flask.formatting.json_backends import StdlibJSONBackend
 from microcosm_flask.linking import Link, Links
 
 
+CURSOR_SALT = "microcosm-flask.cursor"
+
+# cursor values that are not native to JSON are encoded as {"t": tag, "v": str(value)}
+CURSOR_TYPES = [
+    ("uuid", UUID, str, UUID),
+    # NB: datetime is a subclass of date
+    ("datetime", datetime, datetime.isoformat, datetime.fromisoformat),
+    ("date", date, date.isoformat, date.fromisoformat),
+    ("time", time, time.isoformat, time.fromisoformat),
+    ("decimal", Decimal, str, Decimal),
+]
+CURSOR_DECODERS = {tag: decode for tag, _, _, decode in CURSOR_TYPES}
+
+
 def identity(x):
     """
     Identity function.
@@ -52,6 +88,31 @@ def identity(x):
     return x
 
 
+def parse_optional_count_result(result):
+    """
+    Parse an items result, with an optional count and context.
+
+    May be a list of items, an items + count (or context) tuple, or a three item tuple
+    containing items, count, and a context dictionary (see: relation convention).
+
+    """
+    if not isinstance(result, tuple):
+        return result, None, {}
+    if len(result) == 3:
+        return result
+    items, count_or_context = result
+    if isinstance(count_or_context, dict):
+        return items, None, count_or_context
+    return items, count_or_context, {}
+
+
+def default_limit():
+    try:
+        return int(request.headers["X-Request-Limit"])
+    except Exception:
+        return 20
+
+
 # NB: lots of code currently uses `PageSchema` to refer to `OffsetLimitPageSchema`
 # keeping this (mis)naming for backwards compatibilty
 class PageSchema(Schema):
@@ -63,6 +124,16 @@ class OffsetLimitPageSchema(PageSchema):
     pass
 
 
+class HasMorePageSchema(OffsetLimitPageSchema):
+    count = fields.Boolean(missing=False)
+
+
+class CursorPageSchema(Schema):
+    cursor = fields.String(missing=None)
+    limit = fields.Integer(missing=None)
+    count = fields.Boolean(missing=False)
+
+
 class PaginatedList:
     """
     A list of items with knowledge of a page.
@@ -102,7 +173,7 @@ class OffsetLimitPaginatedList(PaginatedList):
     A paginated list using offset/limit style paging.
 
     """
-    def __init__(self, items, count, _page, _ns, _operation, _context):
+    def __init__(self, items, count, _page, _ns, _operation, _context, has_more=None):
         super(OffsetLimitPaginatedList, self).__init__(
             items=items,
             _page=_page,
@@ -111,6 +182,7 @@ class OffsetLimitPaginatedList(PaginatedList):
             _context=_context,
         )
         self.count = count
+        self.has_more = has_more
 
     @property
     def offset(self):
@@ -127,7 +199,11 @@ class OffsetLimitPaginatedList(PaginatedList):
 
         """
         links = super(OffsetLimitPaginatedList, self).links
-        if self._page.offset + self._page.limit < self.count:
+        if self.has_more is None:
+            has_more = self._page.offset + self._page.limit < self.count
+        else:
+            has_more = self.has_more
+        if has_more:
             links["next"] = Link.for_(
                 self._operation,
                 self._ns,
@@ -144,6 +220,46 @@ class OffsetLimitPaginatedList(PaginatedList):
         return links
 
 
+class CursorPaginatedList(PaginatedList):
+    """
+    A paginated list using cursor (keyset) style paging.
+
+    """
+    def __init__(self, items, count, _page, _ns, _operation, _context):
+        super(CursorPaginatedList, self).__init__(
+            items=items,
+            _page=_page,
+            _ns=_ns,
+            _operation=_operation,
+            _context=_context,
+        )
+        self.count = count
+
+    @property
+    def cursor(self):
+        return self._page.cursor
+
+    @property
+    def limit(self):
+        return self._page.limit
+
+    @property
+    def links(self):
+        """
+        Include a next link (for full pages).
+
+        """
+        links = super(CursorPaginatedList, self).links
+        if self.items and len(self.items) >= self._page.limit:
+            links["next"] = Link.for_(
+                self._operation,
+                self._ns,
+                qs=self._page.page_after(self.items[-1]).to_items(),
+                **self._context
+            )
+        return links
+
+
 class Page:
     """
     Encapsulates pagination information.
@@ -176,6 +292,16 @@ class Page:
     def to_dict(self, func=str):
         return dict(self.to_items(func=func))
 
+    @classmethod
+    def validate(cls, app):
+        """
+        Validate the app's configuration for this page implementation.
+
+        Called when a convention that uses this page implementation is configured.
+
+        """
+        pass
+
     def to_paginated_list(self, result, _ns, _operation, **kwargs):
         """
         Convert a controller result to a paginated list.
@@ -244,6 +370,8 @@ class OffsetLimitPage(Page):
     Offset/limit based paging.
 
     """
+    schema_cls = OffsetLimitPageSchema
+
     def __init__(self, offset=None, limit=None, **kwargs):
         super(OffsetLimitPage, self).__init__(**kwargs)
         self.offset = self.default_offset if offset is None else offset
@@ -271,10 +399,7 @@ class OffsetLimitPage(Page):
 
     @property
     def default_limit(self):
-        try:
-            return int(request.headers["X-Request-Limit"])
-        except Exception:
-            return 20
+        return default_limit()
 
     def to_items(self, func=str):
         return [
@@ -327,3 +452,291 @@ class OffsetLimitPage(Page):
                 return getattr(item_schema, "csv_column_order", None)
 
         return PaginatedListSchema
+
+
+class HasMorePage(OffsetLimitPage):
+    """
+    Offset/limit based paging that avoids counting.
+
+    Counting all matching items is often more expensive than fetching a page of them. Instead,
+    search functions are asked for one more item than the page limit; the extra item (if any)
+    is discarded and signals that a next page exists.
+
+    Search functions receive `count` (a boolean) and should only compute an exact count when
+    it is true (i.e. when clients pass `?count=true`). Otherwise, they may return an estimated
+    count (or None); estimates are reported in the `X-Estimated-Count` header, never as `count`.
+
+    """
+    schema_cls = HasMorePageSchema
+
+    def __init__(self, offset=None, limit=None, count=False, **kwargs):
+        super(HasMorePage, self).__init__(offset=offset, limit=limit, **kwargs)
+        self.count = count
+
+    @property
+    def next_page(self):
+        return self.__class__(
+            offset=self.offset + self.limit,
+            limit=self.limit,
+            count=self.count,
+            **self.kwargs
+        )
+
+    @property
+    def prev_page(self):
+        return self.__class__(
+            offset=self.offset - self.limit,
+            limit=self.limit,
+            count=self.count,
+            **self.kwargs
+        )
+
+    def to_items(self, func=str):
+        items = super(HasMorePage, self).to_items(func=func)
+        if self.count:
+            items.insert(2, ("count", True))
+        return items
+
+    def to_dict(self, func=str):
+        """
+        Contruct a dictionary of search function kwargs.
+
+        Requests one more item than the page limit.
+
+        """
+        return dict(
+            offset=self.offset,
+            limit=self.limit + 1,
+            count=self.count,
+            **dict(super(OffsetLimitPage, self).to_items(func=func))
+        )
+
+    def to_paginated_list(self, result, _ns, _operation, **kwargs):
+        items, count, context = self.parse_result(result)
+        items = list(items)
+        has_more = len(items) > self.limit
+
+        if self.count:
+            headers = encode_count_header(count)
+        else:
+            headers = dict() if count is None else {"X-Estimated-Count": count}
+            count = None
+
+        paginated_list = OffsetLimitPaginatedList(
+            items=items[:self.limit],
+            count=count,
+            _page=self,
+            _ns=_ns,
+            _operation=_operation,
+            _context=context,
+            has_more=has_more,
+        )
+        return paginated_list, headers
+
+    @classmethod
+    def parse_result(cls, result):
+        return parse_optional_count_result(result)
+
+    @classmethod
+    def make_paginated_list_schema_class(cls, ns, item_schema):
+        class PaginatedListSchema(Schema):
+            __alias__ = "{}_list".format(ns.subject_name)
+
+            offset = fields.Integer(required=True)
+            limit = fields.Integer(required=True)
+            count = fields.Integer(allow_none=True)
+            items = fields.List(fields.Nested(item_schema), required=True)
+            _links = fields.Raw()
+
+            @property
+            def csv_column_order(self):
+                return getattr(item_schema, "csv_column_order", None)
+
+        return PaginatedListSchema
+
+
+class CursorSerializer:
+    """
+    Encode cursor values as (compact) JSON.
+
+    Values of non-JSON types (see `CURSOR_TYPES`) are tagged, so that they are restored
+    with their type.
+
+    """
+    def dumps(self, value):
+        return StdlibJSONBackend().dumps([
+            self.encode_value(item)
+            for item in value
+        ], sort_keys=False).decode("utf-8")
+
+    def loads(self, value):
+        value = StdlibJSONBackend().loads(value)
+        if not isinstance(value, list):
+            raise ValueError("Cursor must be a list")
+        return [
+            self.decode_value(item)
+            for item in value
+        ]
+
+    def encode_value(self, value):
+        for tag, type_, encode, _ in CURSOR_TYPES:
+            if isinstance(value, type_):
+                return dict(t=tag, v=encode(value))
+        return value
+
+    def decode_value(self, value):
+        if not isinstance(value, dict):
+            return value
+        try:
+            return CURSOR_DECODERS[value["t"]](value["v"])
+        except (KeyError, TypeError, ArithmeticError):
+            raise ValueError("Invalid cursor value")
+
+
+class CursorPage(Page):
+    """
+    Cursor (keyset) based paging.
+
+    A cursor encodes the sort key of the last item of the previous page. Search functions
+    receive the decoded sort key as `after` (a list of values, one per `sort_key` attribute,
+    or None for the first page) and are expected to return the next `limit` items that
+    sort after it.
+
+    As with `HasMorePage`, search functions also receive `count` (a boolean) and should only
+    compute an exact count when it is true (i.e. when clients pass `?count=true`). Otherwise,
+    they may return an estimated count (or None); estimates are reported in the
+    `X-Estimated-Count` header, never as `count`.
+
+    Cursors are signed (with `flask.cursor_secret_key`, falling back to the app's secret key)
+    so that clients treat them as opaque; one of these must be configured.
+
+    Subclass to choose a different sort key:
+
+        class FooPage(CursorPage):
+            sort_key = ("created_at", "id")
+
+    """
+    schema_cls = CursorPageSchema
+    sort_key = ("id",)
+
+    def __init__(self, cursor=None, limit=None, count=False, **kwargs):
+        super(CursorPage, self).__init__(**kwargs)
+        self.cursor = cursor
+        self.after = None if cursor is None else self.decode_cursor(cursor)
+        self.limit = self.default_limit if limit is None else limit
+        self.count = count
+
+    @property
+    def default_limit(self):
+        return default_limit()
+
+    @classmethod
+    def get_secret_key(cls, app):
+        return app.config.get("CURSOR_SECRET_KEY") or app.secret_key
+
+    @classmethod
+    def validate(cls, app):
+        if not cls.get_secret_key(app):
+            raise ValidationError("Missing required configuration for: flask.cursor_secret_key")
+
+    @classmethod
+    def serializer(cls):
+        return URLSafeSerializer(
+            cls.get_secret_key(current_app),
+            salt=CURSOR_SALT,
+            serializer=CursorSerializer(),
+        )
+
+    @classmethod
+    def encode_cursor(cls, sort_key_values):
+        return cls.serializer().dumps(sort_key_values)
+
+    @classmethod
+    def decode_cursor(cls, cursor):
+        try:
+            return cls.serializer().loads(cursor)
+        except (BadSignature, ValueError):
+            raise with_context(
+                UnprocessableEntity("Validation error"),
+                dict(cursor=["Invalid cursor."]),
+            )
+
+    @classmethod
+    def get_sort_key_values(cls, item):
+        return [
+            item[key] if isinstance(item, dict) else getattr(item, key)
+            for key in cls.sort_key
+        ]
+
+    def page_after(self, last_item):
+        return self.__class__(
+            cursor=self.encode_cursor(self.get_sort_key_values(last_item)),
+            limit=self.limit,
+            count=self.count,
+            **self.kwargs
+        )
+
+    def to_items(self, func=str):
+        items = [("limit", self.limit)]
+        if self.cursor is not None:
+            items.insert(0, ("cursor", self.cursor))
+        if self.count:
+            items.append(("count", True))
+        return items + super(CursorPage, self).to_items(func=func)
+
+    def to_dict(self, func=str):
+        """
+        Contruct a dictionary of search function kwargs.
+
+        The decoded cursor is passed as `after` (rather than as an opaque `cursor`).
+
+        """
+        return dict(
+            after=self.after,
+            limit=self.limit,
+            count=self.count,
+            **dict(super(CursorPage, self).to_items(func=func))
+        )
+
+    def to_paginated_list(self, result, _ns, _operation, **kwargs):
+        items, count, context = self.parse_result(result)
+        if isinstance(items, Iterator):
+            # NB: the next cursor depends on the last item
+            items = list(items)
+
+        if self.count:
+            headers = encode_count_header(count) if count is not None else dict()
+        else:
+            headers = dict() if count is None else {"X-Estimated-Count": count}
+            count = None
+
+        paginated_list = CursorPaginatedList(
+            items=items,
+            count=count,
+            _page=self,
+            _ns=_ns,
+            _operation=_operation,
+            _context=context,
+        )
+        return paginated_list, headers
+
+    @classmethod
+    def parse_result(cls, result):
+        return parse_optional_count_result(result)
+
+    @classmethod
+    def make_paginated_list_schema_class(cls, ns, item_schema):
+        class PaginatedListSchema(Schema):
+            __alias__ = "{}_list".format(ns.subject_name)
+
+            cursor = fields.String(allow_none=True)
+            limit = fields.Integer(required=True)
+            count = fields.Integer(allow_none=True)
+            items = fields.List(fields.Nested(item_schema), required=True)
+            _links = fields.Raw()
+
+            @property
+            def csv_column_order(self):
+                return getattr(item_schema, "csv_column_order", None)
+
+        return PaginatedListSchema
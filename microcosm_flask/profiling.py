@@ -1,9 +1,44 @@
+"""
+Request profiling.
+
+`enable_profiling` profiles every request (with `pyinstrument`) and is meant for local use.
+
+`RequestProfiler` profiles selected requests (a sample of requests, requests with an
+authorized `X-Request-Profile` header, and/or chosen endpoints) by periodically sampling the
+stacks of their threads from a background thread; samples are aggregated per endpoint into
+collapsed stacks (as used by flame graph tools) and written to rotating files.
+
+`ContinuousProfiler` samples the stacks of all request threads (attributed to their endpoint)
+at a low frequency into rolling windows; see also the `profile_convention`.
+
+"""
 import sys
+from collections import deque
 from datetime import datetime, timezone
-from os import makedirs
-from os.path import exists, expanduser, join
+from functools import wraps
+from glob import glob
+from logging import getLogger
+from os import getpid, makedirs, remove
+from os.path import (
+    exists,
+    expanduser,
+    getmtime,
+    getsize,
+    join,
+)
+from random import random
+from threading import (
+    Event,
+    Lock,
+    Thread,
+    get_ident,
+)
+from time import monotonic, sleep, time
 
-from flask import g
+from flask import g, request
+from itsdangerous import BadSignature, TimestampSigner
+from microcosm.api import binding, defaults, typed
+from microcosm.config.types import boolean, comma_separated_list
 
 
 try:
@@ -48,3 +83,497 @@ def enable_profiling(graph):
         return response
 
     graph.app.logger.info(f"*** Profiling is ON, Will save profiling data to directory: {profile_dir}")
+
+
+PROFILE_HEADER = "X-Request-Profile"
+PROFILE_SALT = "microcosm_flask.profile"
+PROFILE_TOKEN = "profile"
+
+# NB: frame labels are memoized per code object
+FRAME_LABELS = dict()
+
+logger = getLogger(__name__)
+
+
+def frame_label(code):
+    try:
+        return FRAME_LABELS[code]
+    except KeyError:
+        label = FRAME_LABELS[code] = "{} ({}:{})".format(code.co_name, code.co_filename, code.co_firstlineno)
+        return label
+
+
+def parse_frame_label(label):
+    """
+    Parse a frame label into its name, file, and line.
+
+    """
+    name, _, location = label.partition(" (")
+    file, _, line = location[:-1].rpartition(":")
+    return name, file, int(line)
+
+
+def collapse(frame):
+    """
+    Collapse a stack (from its innermost frame) into a single line, outermost frame first.
+
+    """
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """
+    Sample the stacks of selected threads from a background thread.
+
+    Samples are counted by (collapsed) stack and by key (e.g. endpoint).
+
+    """
+    def __init__(self, interval=0.01, flush_interval=60.0, flush_func=None):
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.flush_func = flush_func
+
+        # thread ident -> key
+        self.threads = dict()
+        # key -> collapsed stack -> count
+        self.samples = dict()
+
+        self.lock = Lock()
+        self.active = Event()
+        self.pid = None
+
+    def begin(self, key):
+        """
+        Start sampling the current thread.
+
+        """
+        self.threads[get_ident()] = key
+        self.active.set()
+        # NB: start lazily (e.g. after forking worker processes)
+        if self.pid != getpid():
+            self.start()
+
+    def end(self):
+        """
+        Stop sampling the current thread.
+
+        """
+        self.threads.pop(get_ident(), None)
+
+    def start(self):
+        with self.lock:
+            if self.pid == getpid():
+                return
+            self.pid = getpid()
+            Thread(target=self.run, name="stack-sampler", daemon=True).start()
+
+    def run(self):
+        flushed_at = monotonic()
+        while True:
+            # NB: don't wake up unless there is something to sample (or flush)
+            if not self.threads:
+                self.active.clear()
+                if not self.threads:
+                    self.active.wait(self.flush_interval)
+
+            sleep(self.interval)
+            self.sample()
+
+            if monotonic() - flushed_at >= self.flush_interval:
+                flushed_at = monotonic()
+                self.flush()
+
+    def sample(self):
+        threads = self.threads.copy()
+        if not threads:
+            return
+
+        frames = sys._current_frames()
+        with self.lock:
+            for ident, key in threads.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                samples = self.samples.setdefault(key, dict())
+                stack = collapse(frame)
+                samples[stack] = samples.get(stack, 0) + 1
+
+    def drain(self):
+        with self.lock:
+            samples, self.samples = self.samples, dict()
+        return samples
+
+    def flush(self):
+        samples = self.drain()
+        if samples and self.flush_func is not None:
+            try:
+                self.flush_func(samples)
+            except Exception:
+                logger.exception("Unable to write profile")
+
+
+@binding("request_profiler")
+@defaults(
+    enabled=typed(boolean, default_value=False),
+    sample_every=typed(int, default_value=0),
+    secret_key=None,
+    token_max_age=typed(int, default_value=3600),
+    endpoints=typed(comma_separated_list, default_value=""),
+    interval=typed(float, default_value=0.01),
+    flush_interval=typed(float, default_value=60.0),
+    profile_dir=None,
+    max_bytes=typed(int, default_value=64 * 1024 * 1024),
+)
+class RequestProfiler:
+    """
+    Profile selected requests.
+
+    A request is profiled if:
+
+     -  its endpoint is one of `request_profiler.endpoints` (if any) and
+     -  it is one of every `request_profiler.sample_every` requests (at random) or it has an
+        `X-Request-Profile` header with a token signed by `request_profiler.secret_key` (see
+        `make_token`; the header is excluded from the request context, so tokens are not logged)
+
+    Collapsed stacks are written per endpoint every `request_profiler.flush_interval` seconds;
+    the oldest files are removed once `request_profiler.max_bytes` is exceeded.
+
+    """
+    def __init__(self, graph):
+        config = graph.config.request_profiler
+
+        self.enabled = config.enabled
+        self.sample_every = config.sample_every
+        self.signer = None if not config.secret_key else TimestampSigner(config.secret_key, salt=PROFILE_SALT)
+        self.token_max_age = config.token_max_age
+        self.endpoints = set(config.endpoints)
+        self.profile_dir = config.profile_dir or default_profile_dir(name=graph.metadata.name)
+        self.max_bytes = config.max_bytes
+
+        self.sampler = StackSampler(
+            interval=config.interval,
+            flush_interval=config.flush_interval,
+            flush_func=self.write,
+        )
+
+    def __call__(self, endpoint):
+        def decorator(func):
+            if self.endpoints and endpoint not in self.endpoints:
+                return func
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.should_profile():
+                    return func(*args, **kwargs)
+
+                self.sampler.begin(endpoint)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.sampler.end()
+
+            return wrapper
+
+        return decorator
+
+    def make_token(self):
+        """
+        Generate a (signed) token for the `X-Request-Profile` header.
+
+        """
+        if self.signer is None:
+            raise Exception("Profiling on request requires 'request_profiler.secret_key'")
+
+        return self.signer.sign(PROFILE_TOKEN).decode("utf-8")
+
+    def should_profile(self):
+        token = request.headers.get(PROFILE_HEADER)
+        if token and self.signer is not None:
+            try:
+                self.signer.unsign(token, max_age=self.token_max_age)
+                return True
+            except BadSignature:
+                pass
+
+        return self.sample_every > 0 and random() * self.sample_every < 1
+
+    def flush(self):
+        """
+        Write pending samples.
+
+        """
+        self.sampler.flush()
+
+    def write(self, samples):
+        if not exists(self.profile_dir):
+            makedirs(self.profile_dir)
+
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H%M%S.%fZ")
+        for endpoint, stacks in samples.items():
+            profile_path = join(self.profile_dir, f"{endpoint}.{timestamp}.collapsed")
+            with open(profile_path, "w") as profile_file:
+                for stack, count in sorted(stacks.items()):
+                    profile_file.write(f"{stack} {count}\n")
+
+        self.rotate()
+
+    def rotate(self):
+        rotate_profiles(self.profile_dir, self.max_bytes)
+
+
+def rotate_profiles(profile_dir, max_bytes):
+    """
+    Remove the oldest profiles in excess of `max_bytes`.
+
+    """
+    paths = sorted(glob(join(profile_dir, "*.collapsed")), key=getmtime, reverse=True)
+    total = 0
+    for path in paths:
+        total += getsize(path)
+        if total > max_bytes:
+            remove(path)
+
+
+class ProfileWindow:
+    """
+    Samples (collapsed stacks by endpoint) over a window of time.
+
+    """
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.end_time = None
+        self.count = 0
+        self.samples = dict()
+
+    def add(self, endpoint, stack):
+        samples = self.samples.setdefault(endpoint, dict())
+        samples[stack] = samples.get(stack, 0) + 1
+        self.count += 1
+
+
+def merge_samples(windows, endpoint=None):
+    """
+    Merge samples (collapsed stacks by endpoint) across windows.
+
+    """
+    samples = dict()
+    for window in windows:
+        for window_endpoint, stacks in window.samples.items():
+            if endpoint is not None and window_endpoint != endpoint:
+                continue
+            merged = samples.setdefault(window_endpoint, dict())
+            for stack, count in stacks.items():
+                merged[stack] = merged.get(stack, 0) + count
+    return samples
+
+
+def format_collapsed(samples):
+    """
+    Format samples as collapsed stacks (rooted at their endpoint).
+
+    """
+    return "".join(
+        f"{endpoint};{stack} {count}\n"
+        for endpoint, stacks in sorted(samples.items())
+        for stack, count in sorted(stacks.items())
+    )
+
+
+@binding("continuous_profiler")
+@defaults(
+    enabled=typed(boolean, default_value=False),
+    hz=typed(float, default_value=19.0),
+    window_seconds=typed(int, default_value=60),
+    windows=typed(int, default_value=10),
+    max_bytes=typed(int, default_value=64 * 1024 * 1024),
+)
+class ContinuousProfiler:
+    """
+    Sample the stacks of all request threads, all the time.
+
+    A background thread samples `sys._current_frames()` at `continuous_profiler.hz` (a low,
+    odd frequency avoids sampling in lockstep with periodic work) and attributes each stack to
+    the endpoint that its thread is serving. Samples are kept in rolling windows of
+    `continuous_profiler.window_seconds`; the last `continuous_profiler.windows` windows are
+    kept in memory and, if `flask.profile_dir` is set, written there as they complete.
+
+    """
+    def __init__(self, graph):
+        config = graph.config.continuous_profiler
+
+        self.graph = graph
+        self.enabled = False
+        self.interval = 1.0 / config.hz
+        self.window_seconds = config.window_seconds
+        self.windows = deque(maxlen=config.windows)
+        self.profile_dir = graph.config.flask.profile_dir
+        self.max_bytes = config.max_bytes
+
+        # thread ident -> endpoint
+        self.endpoints = dict()
+        self.current = ProfileWindow(time())
+
+        self.lock = Lock()
+        self.pid = None
+
+        if config.enabled:
+            self.enable()
+
+    def enable(self):
+        """
+        Start profiling (request threads).
+
+        """
+        if self.enabled:
+            return
+
+        self.enabled = True
+        self.graph.flask.before_request(self.begin_request)
+        self.graph.flask.teardown_request(self.end_request)
+
+    def begin_request(self):
+        self.endpoints[get_ident()] = request.endpoint
+        # NB: start lazily (e.g. after forking worker processes)
+        if self.pid != getpid():
+            self.start()
+
+    def end_request(self, *args, **kwargs):
+        self.endpoints.pop(get_ident(), None)
+
+    def start(self):
+        with self.lock:
+            if self.pid == getpid():
+                return
+            self.pid = getpid()
+            Thread(target=self.run, name="continuous-profiler", daemon=True).start()
+
+    def run(self):
+        next_time = monotonic()
+        while True:
+            next_time = max(next_time + self.interval, monotonic())
+            sleep(next_time - monotonic())
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Unable to sample stacks")
+
+    def sample(self):
+        endpoints = self.endpoints.copy()
+        if not endpoints:
+            self.maybe_rotate()
+            return
+
+        frames = sys._current_frames()
+        with self.lock:
+            for ident, endpoint in endpoints.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.current.add(endpoint, collapse(frame))
+
+        self.maybe_rotate()
+
+    def maybe_rotate(self, now=None):
+        now = now or time()
+        if now - self.current.start_time < self.window_seconds:
+            return
+
+        with self.lock:
+            window, self.current = self.current, ProfileWindow(now)
+            window.end_time = now
+            self.windows.append(window)
+
+        if self.profile_dir and window.count:
+            self.write(window)
+
+    def write(self, window):
+        if not exists(self.profile_dir):
+            makedirs(self.profile_dir)
+
+        timestamp = datetime.fromtimestamp(window.start_time, timezone.utc).strftime("%Y-%m-%dT%H%M%S.%fZ")
+        profile_path = join(self.profile_dir, f"continuous-{getpid()}.{timestamp}.collapsed")
+        with open(profile_path, "w") as profile_file:
+            profile_file.write(format_collapsed(window.samples))
+
+        rotate_profiles(self.profile_dir, self.max_bytes)
+
+    def profile(self, windows=None, endpoint=None):
+        """
+        Merge samples from the current and the most recent (completed) windows.
+
+        Returns samples by endpoint and the time range covered.
+
+        """
+        with self.lock:
+            selected = list(self.windows)
+            if windows is not None:
+                selected = selected[-windows:] if windows > 0 else []
+            selected.append(self.current)
+            samples = merge_samples(selected, endpoint)
+
+        return samples, selected[0].start_time
+
+    def to_collapsed(self, windows=None, endpoint=None):
+        samples, _ = self.profile(windows, endpoint)
+        return format_collapsed(samples)
+
+    def to_speedscope(self, windows=None, endpoint=None):
+        """
+        Render samples in the speedscope (sampled) file format, with one profile per endpoint.
+
+        See: https://www.speedscope.app/file-format-schema.json
+
+        """
+        samples, start_time = self.profile(windows, endpoint)
+
+        frames = []
+        frame_indexes = dict()
+
+        def frame_index(label):
+            try:
+                return frame_indexes[label]
+            except KeyError:
+                name, file, line = parse_frame_label(label)
+                frames.append(dict(name=name, file=file, line=line))
+                index = frame_indexes[label] = len(frames) - 1
+                return index
+
+        profiles = []
+        for profile_endpoint, stacks in sorted(samples.items()):
+            weights = [count * self.interval for count in stacks.values()]
+            profiles.append(dict(
+                type="sampled",
+                name=profile_endpoint,
+                unit="seconds",
+                startValue=0,
+                endValue=sum(weights),
+                samples=[
+                    [frame_index(label) for label in stack.split(";")]
+                    for stack in stacks
+                ],
+                weights=weights,
+            ))
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": "{} since {}".format(
+                self.graph.metadata.name,
+                datetime.fromtimestamp(start_time, timezone.utc).isoformat(),
+            ),
+            "exporter": "microcosm-flask",
+            "activeProfileIndex": 0,
+            "shared": dict(frames=frames),
+            "profiles": profiles,
+        }
+
+
+def enable_continuous_profiling(graph):
+    """
+    Enable continuous profiling (e.g. from `runserver`).
+
+    """
+    graph.continuous_profiler.enable()
+    graph.app.logger.info("*** Continuous profiling is ON")
@@ -9,11 +9,15 @@ from microcosm.api import defaults, typed
 from microcosm.config.types import boolean
 from microcosm_logging.decorators import context_logger
 
+from microcosm_flask.conventions.registry import register_endpoint
+from microcosm_flask.url_templates import register_url_template
+
 
 @defaults(
     converters=[
         "uuid",
     ],
+    compile_response_schemas=typed(boolean, default_value=False),
     enable_audit=typed(boolean, default_value=True),
     enable_basic_auth=typed(boolean, default_value=False),
     enable_context_logger=typed(boolean, default_value=True),
@@ -74,6 +78,9 @@ def configure_route_decorator(graph):
             if graph.memory_profiler.enabled:
                 func = graph.memory_profiler.snapshot_at_intervals(func)
 
+            if graph.request_profiler.enabled:
+                func = graph.request_profiler(endpoint)(func)
+
             # keep audit decoration last (before registering the route) so that
             # errors raised by other decorators are captured in the audit trail
             if enable_audit:
@@ -84,6 +91,10 @@ def configure_route_decorator(graph):
                 endpoint=endpoint,
                 methods=[operation.value.method],
             )(func)
+            # precompile links to this endpoint (see `Namespace.href_for`)
+            register_url_template(graph.app, endpoint)
+            # index this endpoint (lazily; see `iter_endpoints`)
+            register_endpoint(graph.app, endpoint)
             return func
         return decorator
     return route
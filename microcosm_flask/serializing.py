@@ -0,0 +1,405 @@
+"""
+Compiled response serialization.
+
+Marshmallow's `Schema.dump` dispatches through several layers of generic machinery for
+every field of every object (accessors, defaults, per-field `serialize` calls). For hot
+endpoints, this overhead dominates the cost of building a response.
+
+This module compiles a schema into a specialized dump function once (typically at route
+registration), resolving field keys, attributes, and value encoders up front. Fields that
+cannot be compiled (custom `serialize` or `get_value` implementations) fall back to
+marshmallow; schemas that cannot be compiled (e.g. those with `pre_dump` or `post_dump`
+hooks) fall back to `Schema.dump` entirely.
+
+Compiled schemas can also omit null values while serializing (`skip_null=True`), which
+avoids a second pass over the dumped data. Responses that omit null values (see the
+`X-Response-Skip-Null` header) are always dumped with compiled schemas.
+
+Usage:
+
+    compiled_schema = compile_schema(FooSchema())
+    data = compiled_schema.dump(foo)
+
+"""
+from collections.abc import Iterator
+from weakref import WeakKeyDictionary
+
+from marshmallow import Schema, fields, missing
+from marshmallow.decorators import POST_DUMP, PRE_DUMP
+from marshmallow.utils import ensure_text_type
+
+
+def remove_null_values(data):
+    """
+    Recursively remove null values from (already serialized) data.
+
+    """
+    if isinstance(data, dict):
+        return {
+            key: remove_null_values(value)
+            for key, value in data.items()
+            if value is not None
+        }
+    if type(data) in (list, tuple):
+        return type(data)(map(remove_null_values, data))
+    if isinstance(data, Iterator):
+        # preserve laziness for streamed items
+        return map(remove_null_values, data)
+    return data
+
+
+def get_attribute_value(obj, key):
+    """
+    Fetch an (undotted) attribute or key from an object.
+
+    Mirrors marshmallow's default accessor.
+
+    """
+    if not hasattr(obj, "__getitem__"):
+        return getattr(obj, key, missing)
+
+    try:
+        return obj[key]
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return getattr(obj, key, missing)
+
+
+def serialize_text(value, obj):
+    if value is None:
+        return None
+    return ensure_text_type(value)
+
+
+def serialize_raw(value, obj):
+    return value
+
+
+def compile_number(field, skip_null=False):
+    if field.as_string or type(field)._format_num is not fields.Number._format_num:
+        return None
+
+    num_type = field.num_type
+
+    def serialize_number(value, obj):
+        if value is None:
+            return None
+        return num_type(value)
+
+    return serialize_number
+
+
+def compile_boolean(field, skip_null=False):
+    truthy, falsy = field.truthy, field.falsy
+
+    def serialize_boolean(value, obj):
+        if value is None:
+            return None
+        try:
+            if value in truthy:
+                return True
+            elif value in falsy:
+                return False
+        except TypeError:
+            pass
+        return bool(value)
+
+    return serialize_boolean
+
+
+def compile_nested(field, skip_null=False):
+    # NB: nested schemas are compiled lazily so that recursive schemas terminate
+    compiled = []
+
+    def serialize_nested(value, obj):
+        if not compiled:
+            schema = field.schema
+            compiled.append((compile_schema(schema).dump, schema.many or field.many))
+        if value is None:
+            return None
+        dump, many = compiled[0]
+        return dump(value, many=many, skip_null=skip_null)
+
+    return serialize_nested
+
+
+def compile_list(field, skip_null=False):
+    inner = compile_value(field.inner, field.name, skip_null)
+
+    def serialize_list(value, obj):
+        if value is None:
+            return None
+        return [inner(each, obj) for each in value]
+
+    return serialize_list
+
+
+def compile_method(field, skip_null=False):
+    if not field.serialize_method_name:
+        return lambda value, obj: missing
+
+    method = getattr(field.parent, field.serialize_method_name, None)
+    if not callable(method):
+        return None
+
+    if skip_null:
+        return lambda value, obj: remove_null_values(method(obj))
+    return lambda value, obj: method(obj)
+
+
+def compile_raw(field, skip_null=False):
+    if skip_null:
+        return lambda value, obj: remove_null_values(value)
+    return serialize_raw
+
+
+# value compilers, keyed by the `_serialize` implementation they replace
+VALUE_COMPILERS = {
+    fields.Boolean._serialize: compile_boolean,
+    fields.Field._serialize: compile_raw,
+    fields.List._serialize: compile_list,
+    fields.Method._serialize: compile_method,
+    fields.Nested._serialize: compile_nested,
+    fields.Number._serialize: compile_number,
+    fields.String._serialize: lambda field, skip_null=False: serialize_text,
+}
+
+
+def compile_value(field, attr, skip_null=False):
+    """
+    Compile a function that serializes an already extracted value for a field.
+
+    The returned function has the signature `(value, obj)`. When `skip_null` is set,
+    null values are omitted from any nested data the function produces.
+
+    """
+    compiler = VALUE_COMPILERS.get(type(field)._serialize)
+    serialize_value = compiler(field, skip_null) if compiler is not None else None
+
+    if serialize_value is None:
+        # fall back to the field's own value serialization
+        if skip_null:
+            def serialize_value(value, obj):
+                return remove_null_values(field._serialize(value, attr, obj))
+        else:
+            def serialize_value(value, obj):
+                return field._serialize(value, attr, obj)
+
+    return serialize_value
+
+
+def is_compilable_field(field):
+    """
+    Can field extraction be compiled?
+
+    Fields that customize `serialize` or `get_value` are left to marshmallow.
+
+    """
+    return (
+        type(field).serialize is fields.Field.serialize
+        and type(field).get_value is fields.Field.get_value
+    )
+
+
+def dump_default_for(field):
+    # NB: marshmallow renamed `default` to `dump_default` in 3.13
+    try:
+        return field.dump_default
+    except AttributeError:
+        return field.default
+
+
+def attribute_expression(attribute):
+    """
+    Generate a source expression that extracts an attribute (possibly dotted) from `obj`.
+
+    """
+    keys = attribute.split(".")
+    if len(keys) == 1:
+        return f"get_attribute_value(obj, {attribute!r}) if indexable else getattr(obj, {attribute!r}, missing)"
+
+    expression = "obj"
+    for key in keys:
+        expression = f"get_attribute_value({expression}, {key!r})"
+    return expression
+
+
+def value_expression(field, index, namespace, skip_null=False):
+    """
+    Generate a source expression that encodes `value` for a field.
+
+    Simple encodings are inlined; everything else calls a compiled value function.
+
+    """
+    serialize = type(field)._serialize
+
+    if serialize is fields.Field._serialize and not skip_null:
+        return "value"
+
+    if serialize is fields.String._serialize:
+        return "value if value is None or type(value) is str else ensure_text_type(value)"
+
+    if serialize is fields.Number._serialize and compile_number(field) is not None:
+        namespace[f"num_type_{index}"] = field.num_type
+        return f"None if value is None else num_type_{index}(value)"
+
+    namespace[f"serialize_value_{index}"] = compile_value(field, field.name, skip_null)
+    return f"serialize_value_{index}(value, obj)"
+
+
+def iter_assignment_source(key, expression, skip_null, indent="    "):
+    """
+    Generate source lines that assign an encoded value into `result`.
+
+    """
+    if not skip_null:
+        yield f"{indent}result[{key!r}] = {expression}"
+        return
+
+    if expression != "value":
+        yield f"{indent}value = {expression}"
+    yield f"{indent}if value is not None:"
+    yield f"{indent}    result[{key!r}] = value"
+
+
+def iter_field_source(schema, attr_name, field, index, namespace, skip_null=False):
+    """
+    Generate source lines that serialize a single field into `result`.
+
+    """
+    key = attr_name if field.data_key is None else field.data_key
+
+    if not is_compilable_field(field):
+        # defer to marshmallow entirely
+        namespace[f"field_{index}"] = field
+        namespace[f"accessor_{index}"] = schema.get_attribute
+        yield f"    value = field_{index}.serialize({attr_name!r}, obj, accessor=accessor_{index})"
+        yield "    if value is not missing:"
+        expression = "remove_null_values(value)" if skip_null else "value"
+        yield from iter_assignment_source(key, expression, skip_null, indent="        ")
+        return
+
+    if not field._CHECK_ATTRIBUTE:
+        # NB: fields that do not read an attribute (e.g. `Method`) serialize None
+        namespace[f"serialize_value_{index}"] = compile_value(field, field.name, skip_null)
+        yield f"    value = serialize_value_{index}(None, obj)"
+        yield "    if value is not missing:"
+        yield from iter_assignment_source(key, "value", skip_null, indent="        ")
+        return
+
+    attribute = attr_name if field.attribute is None else field.attribute
+    yield f"    value = {attribute_expression(attribute)}"
+
+    default = dump_default_for(field)
+    if default is missing:
+        yield "    if value is not missing:"
+        yield from iter_assignment_source(
+            key,
+            value_expression(field, index, namespace, skip_null),
+            skip_null,
+            indent="        ",
+        )
+        return
+
+    namespace[f"default_{index}"] = default
+    yield "    if value is missing:"
+    yield f"        value = default_{index}()" if callable(default) else f"        value = default_{index}"
+    yield from iter_assignment_source(key, value_expression(field, index, namespace, skip_null), skip_null)
+
+
+def compile_dump_function(schema, skip_null=False):
+    """
+    Compile a function that dumps a single object using a schema.
+
+    Generates (and executes) Python source specialized to the schema's fields, so
+    that attribute names, output keys, defaults, and simple encodings are resolved once.
+
+    Returns None if the schema cannot be compiled.
+
+    """
+    if (
+        schema._has_processors(PRE_DUMP)
+        or schema._has_processors(POST_DUMP)
+        or type(schema)._serialize is not Schema._serialize
+        or type(schema).get_attribute is not Schema.get_attribute
+    ):
+        return None
+
+    namespace = dict(
+        dict_class=schema.dict_class,
+        ensure_text_type=ensure_text_type,
+        get_attribute_value=get_attribute_value,
+        missing=missing,
+        remove_null_values=remove_null_values,
+    )
+    lines = [
+        "def dump_one(obj):",
+        "    result = dict_class()",
+        "    indexable = hasattr(obj, '__getitem__')",
+    ]
+    for index, (attr_name, field) in enumerate(schema.dump_fields.items()):
+        lines.extend(iter_field_source(schema, attr_name, field, index, namespace, skip_null))
+    lines.append("    return result")
+
+    exec("\n".join(lines), namespace)
+    return namespace["dump_one"]
+
+
+class CompiledSchema:
+    """
+    A marshmallow schema with a precompiled `dump` function.
+
+    All other attribute access is delegated to the underlying schema, so compiled schemas
+    may be passed anywhere a response schema is expected (e.g. to formatters).
+
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.dump_one = compile_dump_function(schema)
+        self.dump_one_skip_null = compile_dump_function(schema, skip_null=True)
+
+    def dump(self, obj, many=None, skip_null=False):
+        """
+        Dump an object (or objects), optionally omitting null values.
+
+        """
+        if self.dump_one is None:
+            data = self.schema.dump(obj, many=many)
+            return remove_null_values(data) if skip_null else data
+
+        dump_one = self.dump_one_skip_null if skip_null else self.dump_one
+        many = self.schema.many if many is None else bool(many)
+        if many and obj is not None:
+            return [dump_one(item) for item in obj]
+        return dump_one(obj)
+
+    def __getattr__(self, name):
+        return getattr(self.schema, name)
+
+
+def compile_schema(schema):
+    """
+    Compile a marshmallow schema (instance) for fast serialization.
+
+    """
+    if isinstance(schema, CompiledSchema):
+        return schema
+    return CompiledSchema(schema)
+
+
+# compiled schemas by (uncompiled) schema instance
+COMPILED_SCHEMAS = WeakKeyDictionary()
+
+
+def get_compiled_schema(schema):
+    """
+    Compile a marshmallow schema (instance) on first use.
+
+    """
+    if isinstance(schema, CompiledSchema):
+        return schema
+
+    try:
+        return COMPILED_SCHEMAS[schema]
+    except KeyError:
+        compiled_schema = COMPILED_SCHEMAS[schema] = CompiledSchema(schema)
+        return compiled_schema
@@ -2,9 +2,14 @@
 Support a user-defined per-request session.
 
 """
+from functools import partial
+
 from flask import g
 
 
+SESSION_FACTORIES = "microcosm_flask.session_factories"
+
+
 def register_session_factory(graph, key, session_factory):
     """
     Register a session creation function so that a new session (of user-defined type)
@@ -21,6 +26,8 @@ def register_session_factory(graph, key, session_factory):
     If the session instance is closeable, it will be closed on teardown.
 
     """
+    graph.flask.extensions.setdefault(SESSION_FACTORIES, {})[key] = partial(session_factory, graph)
+
     @graph.flask.before_request
     def begin_session():
         setattr(g, key, session_factory(graph))
@@ -31,3 +38,29 @@ def register_session_factory(graph, key, session_factory):
         session = getattr(g, key, None)
         if session is not None and hasattr(session, "close"):
             session.close()
+
+
+def get_session_keys(app):
+    return app.extensions.get(SESSION_FACTORIES, {}).keys()
+
+
+def begin_sessions(app):
+    """
+    Save new sessions to `flask.g` for all registered session factories.
+
+    Used to give work on another thread (e.g. see `microcosm_flask.executors`) its own sessions.
+
+    """
+    for key, session_factory in app.extensions.get(SESSION_FACTORIES, {}).items():
+        setattr(g, key, session_factory())
+
+
+def end_sessions(app):
+    """
+    Close the sessions opened by `begin_sessions`.
+
+    """
+    for key in get_session_keys(app):
+        session = g.pop(key, None)
+        if session is not None and hasattr(session, "close"):
+            session.close()
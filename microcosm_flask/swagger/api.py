@@ -2,12 +2,16 @@
 API interfaces for swagger operations.
 
 """
+from copy import deepcopy
 from typing import (
     Any,
+    Dict,
+    Hashable,
     Iterable,
     Mapping,
     Tuple,
 )
+from weakref import WeakKeyDictionary
 
 from marshmallow import Schema
 from marshmallow.fields import Field
@@ -16,13 +20,29 @@ from microcosm_flask.swagger.parameters import Parameters
 from microcosm_flask.swagger.schemas import Schemas
 
 
+# NB: conversions are memoized (across swagger builds) because schemas and fields do not
+# change once declared; JSON schemas are keyed by schema class and options, parameters by field
+SCHEMA_CACHE: Dict[Hashable, Mapping[str, Any]] = dict()
+PARAMETER_CACHE: WeakKeyDictionary = WeakKeyDictionary()
+PARAMETER_BUILDERS: Dict[Hashable, Parameters] = dict()
+
+
+def build_schemas(strict_enums: bool = True) -> Schemas:
+    """
+    Create a (memoizing) JSON schema builder.
+
+    Each builder generates a given schema (and its nested schemas) at most once.
+
+    """
+    return Schemas(build_parameter=build_parameter, strict_enums=strict_enums, cache=SCHEMA_CACHE)
+
+
 def build_schema(schema: Schema, strict_enums: bool = True) -> Mapping[str, Any]:
     """
     Build JSON schema from a marshmallow schema.
 
     """
-    builder = Schemas(build_parameter=build_parameter, strict_enums=strict_enums)
-    return builder.build(schema)
+    return build_schemas(strict_enums).build(schema)
 
 
 def iter_schemas(schema: Schema, strict_enums: bool = True) -> Iterable[Tuple[str, Any]]:
@@ -32,14 +52,28 @@ def iter_schemas(schema: Schema, strict_enums: bool = True) -> Iterable[Tuple[st
     Generates: name, schema pairs.
 
     """
-    builder = Schemas(build_parameter=build_parameter, strict_enums=strict_enums)
-    return builder.iter_schemas(schema)
+    return build_schemas(strict_enums).iter_schemas(schema)
 
 
 def build_parameter(field: Field, **kwargs) -> Mapping[str, Any]:
     """
     Build JSON parameter from a marshmallow field.
 
+    Returns a new dictionary (even if cached); callers may modify it.
+
     """
-    builder = Parameters(**kwargs)
-    return builder.build(field)
+    key = tuple(sorted(kwargs.items()))
+
+    try:
+        return deepcopy(PARAMETER_CACHE[field][key])
+    except KeyError:
+        pass
+
+    try:
+        builder = PARAMETER_BUILDERS[key]
+    except KeyError:
+        builder = PARAMETER_BUILDERS[key] = Parameters(**kwargs)
+
+    parameter = builder.build(field)
+    PARAMETER_CACHE.setdefault(field, dict())[key] = parameter
+    return deepcopy(parameter)
@@ -40,7 +40,7 @@ from microcosm_flask.errors import ErrorContextSchema, ErrorSchema, SubErrorSche
 from microcosm_flask.namespaces import Namespace
 from microcosm_flask.naming import name_for
 from microcosm_flask.operations import Operation
-from microcosm_flask.swagger.api import build_parameter, iter_schemas
+from microcosm_flask.swagger.api import build_parameter, build_schemas
 from microcosm_flask.swagger.naming import operation_name, type_name
 
 
@@ -136,13 +136,19 @@ def add_definitions(definitions, operations):
     Add definitions to swagger.
 
     """
+    # NB: share builders across operations so that each schema type is generated once per side
+    builders = dict()
+
     for definition_schema, request_side in iter_definitions(definitions, operations):
         if definition_schema is None:
             continue
         if isinstance(definition_schema, str):
             continue
 
-        for name, schema in iter_schemas(definition_schema, strict_enums=request_side != RequestSide.RESPONSE):
+        strict_enums = request_side != RequestSide.RESPONSE
+        builder = builders.setdefault(strict_enums, build_schemas(strict_enums=strict_enums))
+
+        for name, schema in builder.iter_schemas(definition_schema):
             definitions.setdefault(name, swagger.Schema(schema))
 
 
@@ -4,6 +4,7 @@ from typing import (
     Any,
     List,
     Mapping,
+    Optional,
     Type,
 )
 
@@ -26,28 +27,33 @@ class Parameters:
     """
     def __init__(self, strict_enums: bool = True):
         self.strict_enums = strict_enums
+        self._builders: Optional[List[ParameterBuilder]] = None
+
+    @property
+    def builders(self) -> List[ParameterBuilder]:
+        if self._builders is None:
+            builder_types = self.builder_types() + [
+                # put default last
+                self.default_builder_type()
+            ]
+
+            self._builders = [
+                builder_type(
+                    build_parameter=self.build,  # type: ignore
+                    strict_enums=self.strict_enums,
+                )
+                for builder_type in builder_types
+            ]
+        return self._builders
 
     def build(self, field: Field) -> Mapping[str, Any]:
         """
         Build a swagger parameter from a marshmallow field.
 
         """
-        builder_types = self.builder_types() + [
-            # put default last
-            self.default_builder_type()
-        ]
-
-        builders: List[ParameterBuilder] = [
-            builder_type(
-                build_parameter=self.build,  # type: ignore
-                strict_enums=self.strict_enums,
-            )
-            for builder_type in builder_types
-        ]
-
         builder = next(
             builder
-            for builder in builders
+            for builder in self.builders
             if builder.supports_field(field)
         )
 
@@ -2,11 +2,15 @@
 Generate JSON Schema for Marshmallow schemas.
 
 """
+from copy import deepcopy
 from typing import (
     Any,
     Callable,
+    Dict,
+    Hashable,
     Iterable,
     Mapping,
+    Optional,
     Set,
     Tuple,
     Type,
@@ -24,6 +28,21 @@ def definition_name_for_schema(schema_cls):
     return type_name(name_for(schema_cls))
 
 
+def schema_key(schema: Schema) -> Hashable:
+    """
+    Identify a schema by its class and the options that affect its fields.
+
+    """
+    return (
+        type(schema),
+        None if schema.only is None else frozenset(schema.only),
+        frozenset(schema.exclude),
+        frozenset(schema.load_only),
+        frozenset(schema.dump_only),
+        tuple(schema.fields),
+    )
+
+
 class Schemas:
     """
     Swagger schema builder.
@@ -33,19 +52,34 @@ class Schemas:
         self,
         build_parameter: Callable[..., Mapping[str, Any]],
         strict_enums: bool = True,
+        cache: Optional[Dict[Hashable, Mapping[str, Any]]] = None,
     ):
         self.build_parameter = build_parameter
         self.strict_enums = strict_enums
+        # NB: built JSON schemas may be shared (across builders) via the cache, so are copied
+        self.cache = cache
 
-        # NB: This will break if this class is ever instantiated and then has
-        # `build` called more than once
+        # NB: `iter_schemas` generates each schema type once per builder instance
         self.seen_schemas: Set[Type[Schema]] = set()
 
     def build(self, schema: Schema) -> Mapping[str, Any]:
         """
         Build JSON schema from a marshmallow schema.
 
+        Returns a new dictionary (even if cached); callers may modify it.
+
         """
+        if self.cache is None:
+            return self.build_uncached(schema)
+
+        key = (schema_key(schema), self.strict_enums)
+        try:
+            result = self.cache[key]
+        except KeyError:
+            result = self.cache[key] = self.build_uncached(schema)
+        return deepcopy(result)
+
+    def build_uncached(self, schema: Schema) -> Mapping[str, Any]:
         fields = list(self.iter_fields(schema))
 
         properties = {
@@ -0,0 +1,155 @@
+"""
+Conditional request tests.
+
+"""
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+
+from hamcrest import (
+    assert_that,
+    equal_to,
+    has_key,
+    is_,
+    is_not,
+)
+from microcosm.api import create_object_graph
+from werkzeug.http import http_date
+
+from microcosm_flask.conventions.base import EndpointDefinition
+from microcosm_flask.conventions.crud import configure_crud
+from microcosm_flask.conventions.relation import configure_relation
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+from microcosm_flask.paging import OffsetLimitPageSchema
+from microcosm_flask.tests.conventions.fixtures import (
+    ADDRESS_1,
+    PERSON_1,
+    PERSON_2,
+    Address,
+    AddressCSVSchema,
+    Person,
+    PersonSchema,
+    person_retrieve,
+    person_search,
+)
+
+
+UPDATED_AT = datetime(2020, 1, 2, 3, 4, 5)
+VERSIONS = {
+    PERSON_1.id: UPDATED_AT,
+    PERSON_2.id: UPDATED_AT - timedelta(days=1),
+}
+
+
+def person_version(person):
+    return VERSIONS[person.id]
+
+
+def address_retrieve_for(person_id):
+    return ADDRESS_1
+
+
+class TestConditionalRequests:
+
+    def setup(self):
+        self.graph = create_object_graph(name="example", testing=True)
+        self.person_schema = Mock(wraps=PersonSchema())
+        configure_crud(self.graph, Namespace(subject=Person), {
+            Operation.Retrieve: EndpointDefinition(
+                func=person_retrieve,
+                response_schema=self.person_schema,
+                version_func=person_version,
+            ),
+            Operation.Search: EndpointDefinition(
+                func=person_search,
+                request_schema=OffsetLimitPageSchema(),
+                response_schema=PersonSchema(),
+                version_func=person_version,
+            ),
+        })
+        configure_relation(self.graph, Namespace(subject=Person, object_=Address), {
+            Operation.RetrieveFor: EndpointDefinition(
+                func=address_retrieve_for,
+                response_schema=AddressCSVSchema(),
+                version_func=lambda address: 7,
+            ),
+        })
+        self.client = self.graph.flask.test_client()
+
+    def test_retrieve_includes_version_headers(self):
+        response = self.client.get("/api/person/{}".format(PERSON_1.id))
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.headers["ETag"], is_(equal_to(self.etag_for("/api/person/{}".format(PERSON_1.id)))))
+        assert_that(response.headers["Last-Modified"], is_(equal_to(http_date(UPDATED_AT))))
+        assert_that(response.headers["ETag"].startswith('W/"'), is_(equal_to(True)))
+
+    def test_retrieve_if_none_match(self):
+        uri = "/api/person/{}".format(PERSON_1.id)
+        etag = self.etag_for(uri)
+        self.person_schema.reset_mock()
+
+        response = self.client.get(uri, headers={"If-None-Match": etag})
+
+        assert_that(response.status_code, is_(equal_to(304)))
+        assert_that(response.data, is_(equal_to(b"")))
+        assert_that(response.headers["ETag"], is_(equal_to(etag)))
+        # the response was not serialized
+        assert_that(self.person_schema.dump.called, is_(equal_to(False)))
+
+    def test_retrieve_if_none_match_mismatch(self):
+        response = self.client.get(
+            "/api/person/{}".format(PERSON_1.id),
+            headers={"If-None-Match": 'W/"other", "another"'},
+        )
+
+        assert_that(response.status_code, is_(equal_to(200)))
+
+    def test_retrieve_if_modified_since(self):
+        uri = "/api/person/{}".format(PERSON_1.id)
+
+        response = self.client.get(uri, headers={"If-Modified-Since": http_date(UPDATED_AT)})
+        assert_that(response.status_code, is_(equal_to(304)))
+
+        response = self.client.get(uri, headers={"If-Modified-Since": http_date(UPDATED_AT - timedelta(seconds=1))})
+        assert_that(response.status_code, is_(equal_to(200)))
+
+    def test_if_none_match_takes_precedence(self):
+        response = self.client.get(
+            "/api/person/{}".format(PERSON_1.id),
+            headers={
+                "If-None-Match": '"other"',
+                "If-Modified-Since": http_date(UPDATED_AT),
+            },
+        )
+
+        assert_that(response.status_code, is_(equal_to(200)))
+
+    def test_search(self):
+        uri = "/api/person"
+        response = self.client.get(uri)
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.headers["Last-Modified"], is_(equal_to(http_date(UPDATED_AT))))
+
+        etag = response.headers["ETag"]
+        response = self.client.get(uri, headers={"If-None-Match": etag})
+        assert_that(response.status_code, is_(equal_to(304)))
+        assert_that(response.headers["X-Total-Count"], is_(equal_to("1")))
+
+        # updating any item changes the version
+        with patch.dict(VERSIONS, {PERSON_1.id: UPDATED_AT + timedelta(seconds=1)}):
+            response = self.client.get(uri, headers={"If-None-Match": etag})
+        assert_that(response.status_code, is_(equal_to(200)))
+
+    def test_retrieve_for(self):
+        uri = "/api/person/{}/address".format(PERSON_1.id)
+        etag = self.etag_for(uri)
+
+        response = self.client.get(uri, headers={"If-None-Match": etag})
+
+        assert_that(response.status_code, is_(equal_to(304)))
+        assert_that(response.headers, is_not(has_key("Last-Modified")))
+
+    def etag_for(self, uri):
+        return self.client.get(uri).headers["ETag"]
@@ -1,8 +1,17 @@
+from unittest.mock import patch
+
 from hamcrest import assert_that, equal_to, is_
-from microcosm.api import create_object_graph
+from microcosm.api import create_object_graph, load_from_dict
+from parameterized import parameterized
 
-from microcosm_flask.conventions.encoding import find_response_format
+from microcosm_flask.conventions.encoding import (
+    decode_request_json,
+    find_response_format,
+    load_request_data,
+)
 from microcosm_flask.enums import ResponseFormats
+from microcosm_flask.formatting.json_backends import StdlibJSONBackend
+from microcosm_flask.tests.conventions.fixtures import NewPersonSchema
 
 
 class TestEncoding:
@@ -41,3 +50,43 @@ class TestEncoding:
                 find_response_format([ResponseFormats.CSV, ResponseFormats.JSON]),
                 equal_to(ResponseFormats.CSV),
             )
+
+    @parameterized([
+        ("flask",),
+        ("json",),
+    ])
+    def test_decode_request_json(self, json_backend):
+        loader = load_from_dict(
+            flask=dict(
+                json_backend=json_backend,
+            ),
+        )
+        graph = create_object_graph(name="example", testing=True, loader=loader)
+
+        with graph.app.test_request_context(data='{"firstName": "Alice", "lastName": "Smith"}'):
+            with patch.object(StdlibJSONBackend, "loads", wraps=StdlibJSONBackend().loads) as mock_loads:
+                assert_that(
+                    load_request_data(NewPersonSchema()),
+                    is_(equal_to(dict(first_name="Alice", last_name="Smith"))),
+                )
+                # the decoded body is reused
+                assert_that(
+                    decode_request_json(),
+                    is_(equal_to(dict(firstName="Alice", lastName="Smith"))),
+                )
+                assert_that(mock_loads.call_count, is_(equal_to(0 if json_backend == "flask" else 1)))
+
+        with graph.app.test_request_context(data="{not json"):
+            assert_that(decode_request_json(), is_(equal_to(None)))
+
+        with graph.app.test_request_context():
+            assert_that(decode_request_json(), is_(equal_to(None)))
+
+    def test_decode_request_json_per_request(self):
+        with self.graph.app.app_context():
+            with self.graph.app.test_request_context(data='{"firstName": "Alice"}'):
+                assert_that(decode_request_json(), is_(equal_to(dict(firstName="Alice"))))
+
+            # a second request in the same (pushed) app context decodes its own body
+            with self.graph.app.test_request_context(data='{"firstName": "Bob"}'):
+                assert_that(decode_request_json(), is_(equal_to(dict(firstName="Bob"))))
@@ -0,0 +1,239 @@
+"""
+Metrics convention tests.
+
+"""
+from json import dumps
+from os import getpid, getppid
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest.mock import patch
+
+from hamcrest import (
+    assert_that,
+    calling,
+    contains_string,
+    equal_to,
+    is_,
+    none,
+    not_,
+    raises,
+)
+from microcosm.api import create_object_graph
+from microcosm.loaders import load_from_dict
+
+from microcosm_flask.conventions.metrics import (
+    CONTENT_TYPE,
+    HEADER,
+    MetricsFile,
+    format_sample,
+    parse_pid,
+)
+from microcosm_flask.histograms import Histogram
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+
+
+# NB: assumed not to be running
+STOPPED_PID = 4194305
+
+
+def create_graph(**kwargs):
+    loader = load_from_dict(
+        route_metrics=dict(
+            aggregate=True,
+        ),
+        metrics_convention=kwargs,
+    )
+    graph = create_object_graph(name="example", testing=True, loader=loader)
+    graph.use(
+        "metrics_convention",
+        "route",
+    )
+
+    ns = Namespace(
+        subject="foo",
+        version="v1",
+    )
+
+    @graph.route(ns.collection_path, Operation.Search, ns)
+    def search():
+        return ""
+
+    return graph
+
+
+def write_worker(directory, pid, count, in_flight, name=None, **process):
+    histogram = Histogram()
+    for _ in range(count):
+        histogram.record(1000)
+
+    MetricsFile(join(directory, "metrics_{}.db".format(name or pid))).write(dumps(dict(
+        histograms=[["foo.search.v1", "2xx", histogram.to_dict()]],
+        in_flight={"foo.search.v1": in_flight},
+        process=dict(threads=1, **process),
+    )).encode("utf-8"))
+
+
+def test_format_sample():
+    assert_that(format_sample("foo", [], 1), is_(equal_to("foo 1")))
+    assert_that(
+        format_sample("foo", [("bar", 'a"b\\c\n'), ("le", 0.5)], 0.25),
+        is_(equal_to('foo{bar="a\\"b\\\\c\\n",le="0.5"} 0.25')),
+    )
+
+
+def test_parse_pid():
+    assert_that(parse_pid("/tmp/metrics_123.db"), is_(equal_to(123)))
+    assert_that(parse_pid("/tmp/metrics_123_abcdef.db"), is_(equal_to(123)))
+
+
+def test_metrics_file():
+    directory = mkdtemp()
+    try:
+        path = join(directory, "metrics_1.db")
+        metrics_file = MetricsFile(path)
+        assert_that(MetricsFile.read(path), is_(none()))
+
+        metrics_file.write(b"foo")
+        assert_that(MetricsFile.read(path), is_(equal_to(b"foo")))
+
+        data = b"x" * 10000
+        metrics_file.write(data)
+        assert_that(MetricsFile.read(path), is_(equal_to(data)))
+
+        # a write in progress is never read
+        HEADER.pack_into(metrics_file.mmap, 0, metrics_file.sequence + 1, 0)
+        assert_that(MetricsFile.read(path), is_(none()))
+    finally:
+        rmtree(directory)
+
+
+def test_metrics():
+    graph = create_graph()
+    client = graph.flask.test_client()
+
+    for _ in range(2):
+        client.get("/api/v1/foo")
+
+    response = client.get("/api/metrics")
+    assert_that(response.status_code, is_(equal_to(200)))
+    assert_that(response.headers["Content-Type"], is_(equal_to(CONTENT_TYPE)))
+
+    text = response.get_data(as_text=True)
+    assert_that(text, contains_string("# TYPE route_duration_seconds histogram\n"))
+    assert_that(text, contains_string(
+        'route_duration_seconds_bucket{endpoint="foo.search.v1",classifier="2xx",le="10.0"} 2\n',
+    ))
+    assert_that(text, contains_string(
+        'route_duration_seconds_bucket{endpoint="foo.search.v1",classifier="2xx",le="+Inf"} 2\n',
+    ))
+    assert_that(text, contains_string(
+        'route_duration_seconds_count{endpoint="foo.search.v1",classifier="2xx"} 2\n',
+    ))
+    assert_that(text, contains_string(
+        'route_requests_total{endpoint="foo.search.v1",classifier="2xx"} 2\n',
+    ))
+    assert_that(text, contains_string("# TYPE route_phase_duration_seconds histogram\n"))
+    assert_that(text, contains_string(
+        'route_in_flight{endpoint="foo.search.v1"} 0\n',
+    ))
+    assert_that(text, contains_string("process_cpu_seconds_total "))
+    assert_that(text, contains_string("process_threads "))
+
+
+def test_metrics_skip_logging():
+    graph = create_graph()
+    client = graph.flask.test_client()
+
+    with patch("microcosm_flask.audit.getLogger") as mocked:
+        response = client.get("/api/metrics")
+
+    assert_that(response.status_code, is_(equal_to(200)))
+    mocked.return_value.info.assert_not_called()
+
+
+def test_metrics_multiprocess():
+    """
+    Metrics are summed across worker processes.
+
+    """
+    directory = mkdtemp()
+    try:
+        graph = create_graph(multiprocess_dir=directory)
+        client = graph.flask.test_client()
+
+        write_worker(directory, getppid(), count=3, in_flight=1)
+        write_worker(directory, STOPPED_PID, count=4, in_flight=5)
+
+        client.get("/api/v1/foo")
+        response = client.get("/api/metrics")
+        assert_that(response.status_code, is_(equal_to(200)))
+
+        text = response.get_data(as_text=True)
+        # counts include stopped workers
+        assert_that(text, contains_string(
+            'route_requests_total{endpoint="foo.search.v1",classifier="2xx"} 8\n',
+        ))
+        # gauges do not
+        assert_that(text, contains_string(
+            'route_in_flight{endpoint="foo.search.v1"} 1\n',
+        ))
+        assert_that(text, contains_string(
+            'process_threads{{pid="{}"}} 1\n'.format(getppid()),
+        ))
+        assert_that(text, not_(contains_string(
+            'pid="{}"'.format(STOPPED_PID),
+        )))
+    finally:
+        rmtree(directory)
+
+
+def test_metrics_multiprocess_pid_reuse():
+    """
+    Metrics of a stopped worker are kept when its pid is reused.
+
+    """
+    directory = mkdtemp()
+    try:
+        graph = create_graph(multiprocess_dir=directory)
+        client = graph.flask.test_client()
+
+        client.get("/api/v1/foo")
+        # a stopped worker that had the same pid (but started at another time)
+        write_worker(
+            directory,
+            getpid(),
+            count=4,
+            in_flight=5,
+            name="{}_stopped".format(getpid()),
+            start_time_seconds=0,
+        )
+
+        response = client.get("/api/metrics")
+        assert_that(response.status_code, is_(equal_to(200)))
+
+        text = response.get_data(as_text=True)
+        assert_that(text, contains_string(
+            'route_requests_total{endpoint="foo.search.v1",classifier="2xx"} 5\n',
+        ))
+        # gauges of the stopped worker are not
+        assert_that(text, contains_string(
+            'route_in_flight{endpoint="foo.search.v1"} 0\n',
+        ))
+        assert_that(text.count('process_threads{{pid="{}"}}'.format(getpid())), is_(equal_to(1)))
+    finally:
+        rmtree(directory)
+
+
+def test_metrics_write_errors():
+    graph = create_graph()
+    metrics = graph.metrics_convention
+
+    with patch.object(metrics, "write", side_effect=[Exception, SystemExit]), \
+            patch("microcosm_flask.conventions.metrics.sleep"), \
+            patch("microcosm_flask.conventions.metrics.logger") as mock_logger:
+        # NB: the writer continues after an error
+        assert_that(calling(metrics.run), raises(SystemExit))
+
+    mock_logger.exception.assert_called_once_with("Unable to write metrics")
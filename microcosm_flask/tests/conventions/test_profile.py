@@ -0,0 +1,93 @@
+"""
+Profile convention tests.
+
+"""
+from json import loads
+
+from hamcrest import (
+    assert_that,
+    contains_string,
+    equal_to,
+    has_entries,
+    has_length,
+    is_,
+    starts_with,
+)
+from microcosm.api import create_object_graph
+from microcosm.loaders import load_from_dict
+
+from microcosm_flask.basic_auth import encode_basic_auth
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+
+
+HEADERS = {
+    "Authorization": encode_basic_auth("default", "secret"),
+}
+
+
+class TestProfile:
+
+    def setup(self):
+        loader = load_from_dict(
+            continuous_profiler=dict(
+                enabled=True,
+                # NB: sample explicitly
+                hz=0.01,
+            ),
+        )
+        self.graph = create_object_graph(name="example", testing=True, loader=loader)
+        self.graph.use(
+            "profile_convention",
+            "route",
+        )
+
+        ns = Namespace(
+            subject="foo",
+            version="v1",
+        )
+
+        @self.graph.route(ns.collection_path, Operation.Search, ns)
+        def search():
+            self.graph.continuous_profiler.sample()
+            return ""
+
+        self.client = self.graph.flask.test_client()
+        self.client.get("/api/v1/foo")
+
+    def test_unauthorized(self):
+        response = self.client.get("/api/profile")
+        assert_that(response.status_code, is_(equal_to(401)))
+
+    def test_collapsed(self):
+        response = self.client.get("/api/profile", headers=HEADERS)
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.headers["Content-Type"], starts_with("text/plain"))
+
+        lines = response.data.decode("utf-8").splitlines()
+        assert_that(lines, has_length(1))
+        assert_that(lines[0], starts_with("foo.search.v1;"))
+        assert_that(lines[0], contains_string(";search ("))
+
+    def test_collapsed_endpoint(self):
+        response = self.client.get("/api/profile?endpoint=foo.create.v1", headers=HEADERS)
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.data, is_(equal_to(b"")))
+
+    def test_speedscope(self):
+        response = self.client.get("/api/profile?format=speedscope", headers=HEADERS)
+        assert_that(response.status_code, is_(equal_to(200)))
+
+        data = loads(response.data)
+        assert_that(data, has_entries({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "profiles": has_length(1),
+        }))
+        assert_that(data["profiles"][0], has_entries(
+            name="foo.search.v1",
+            samples=has_length(1),
+        ))
+
+    def test_invalid_format(self):
+        response = self.client.get("/api/profile?format=pprof", headers=HEADERS)
+        assert_that(response.status_code, is_(equal_to(422)))
@@ -0,0 +1,125 @@
+"""
+Test the endpoint registry.
+
+"""
+from threading import Barrier, Thread
+from unittest.mock import patch
+
+from hamcrest import (
+    assert_that,
+    contains,
+    empty,
+    equal_to,
+    has_length,
+    is_,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_flask.conventions.registry import (
+    ENDPOINT_REGISTRY,
+    EndpointRegistry,
+    get_endpoint_registry,
+    iter_endpoints,
+)
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+
+
+class TestEndpointRegistry:
+
+    def setup(self):
+        self.graph = create_object_graph(name="example", testing=True)
+
+        for ns in (Namespace("foo"), Namespace("bar"), Namespace("foo", version="v2")):
+            for path, operation in (
+                (ns.collection_path, Operation.Search),
+                (ns.instance_path, Operation.Retrieve),
+            ):
+                self.graph.route(path, operation, ns)(lambda **kwargs: None)
+
+    def find(self, **kwargs):
+        return [
+            (operation, ns.subject, ns.version, rule.rule)
+            for operation, ns, rule, func in iter_endpoints(self.graph, **kwargs)
+        ]
+
+    def test_find_by_operation(self):
+        assert_that(self.find(operations=[Operation.Search]), contains(
+            (Operation.Search, "foo", "v1", "/api/foo"),
+            (Operation.Search, "bar", "v1", "/api/bar"),
+            (Operation.Search, "foo", "v2", "/api/v2/foo"),
+        ))
+
+    def test_find_by_subject_and_version(self):
+        assert_that(self.find(subject="foo", version="v2"), contains(
+            (Operation.Search, "foo", "v2", "/api/v2/foo"),
+            (Operation.Retrieve, "foo", "v2", "/api/v2/foo/<uuid:foo_id>"),
+        ))
+
+    def test_find_by_path_prefix(self):
+        assert_that(self.find(path_prefix="/api/v2", operations=[Operation.Retrieve]), contains(
+            (Operation.Retrieve, "foo", "v2", "/api/v2/foo/<uuid:foo_id>"),
+        ))
+        assert_that(self.find(path_prefix="/api/v3"), is_(empty()))
+
+    def test_find_with_match_func(self):
+        def match_func(operation, ns, rule):
+            return ns.subject == "bar"
+
+        assert_that(
+            [operation for operation, _, _, _ in self.find(match_func=match_func)],
+            contains(Operation.Search, Operation.Retrieve),
+        )
+
+    def test_index_lazily(self):
+        # registering routes does not index them
+        endpoint_registry = self.graph.flask.extensions[ENDPOINT_REGISTRY]
+        assert_that(endpoint_registry.endpoints, is_(empty()))
+        assert_that(endpoint_registry.pending, has_length(6))
+
+        with patch.object(EndpointRegistry, "add", autospec=True, side_effect=EndpointRegistry.add) as mocked:
+            self.find()
+            self.find()
+
+        # each rule (including "static") is indexed once
+        assert_that(mocked.call_count, is_(equal_to(len(self.graph.flask.url_map._rules))))
+
+    def test_concurrent_sync(self):
+        barrier = Barrier(4)
+
+        def find():
+            barrier.wait()
+            self.find()
+
+        threads = [Thread(target=find) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_that(get_endpoint_registry(self.graph.flask).endpoints, has_length(6))
+
+    def test_find_waits_for_sync(self):
+        endpoint_registry = get_endpoint_registry(self.graph.flask)
+        results = []
+
+        with endpoint_registry.lock:
+            thread = Thread(target=lambda: results.append(endpoint_registry.find()))
+            thread.start()
+            thread.join(0.1)
+            # queries do not read a partially indexed registry
+            assert_that(results, is_(empty()))
+
+        thread.join()
+        assert_that(results[0], has_length(6))
+
+    def test_find_late_routes(self):
+        # routes registered without `graph.route` are indexed on demand
+        @self.graph.flask.route("/api/baz", endpoint="baz.search.v1")
+        def search_baz():
+            pass
+
+        assert_that(
+            self.find(subject="baz"),
+            is_(equal_to([(Operation.Search, "baz", "v1", "/api/baz")])),
+        )
@@ -0,0 +1,172 @@
+"""
+Streaming search tests.
+
+"""
+from json import loads
+from unittest import SkipTest
+from uuid import uuid4
+
+from hamcrest import (
+    assert_that,
+    equal_to,
+    has_key,
+    is_,
+    is_not,
+)
+from microcosm.api import create_object_graph
+
+from microcosm_flask.conventions.base import EndpointDefinition
+from microcosm_flask.conventions.crud import configure_crud
+from microcosm_flask.conventions.relation import configure_relation
+from microcosm_flask.enums import ResponseFormats
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+from microcosm_flask.paging import OffsetLimitPageSchema
+from microcosm_flask.tests.conventions.fixtures import (
+    ADDRESS_1,
+    PERSON_1,
+    PERSON_2,
+    PERSON_ID_1,
+    Address,
+    AddressCSVSchema,
+    Person,
+    PersonCSVSchema,
+    PersonSchema,
+)
+
+
+PERSON_4 = Person(uuid4(), "Dave", None)
+
+
+def person_search(offset, limit):
+    return (person for person in [PERSON_1, PERSON_2, PERSON_4][offset:offset + limit]), 4
+
+
+def person_search_empty(offset, limit):
+    return iter([]), 0
+
+
+def address_search_for(person_id, offset, limit):
+    return iter([ADDRESS_1]), 1, dict(person_id=person_id)
+
+
+class TestStreaming:
+
+    def setup(self):
+        self.graph = create_object_graph(name="example", testing=True)
+        self.person_ns = Namespace(subject=Person)
+        configure_crud(self.graph, self.person_ns, {
+            Operation.Search: EndpointDefinition(
+                func=person_search,
+                request_schema=OffsetLimitPageSchema(),
+                response_schema=PersonCSVSchema(),
+                response_formats=[
+                    ResponseFormats.JSON,
+                    ResponseFormats.CSV,
+                    ResponseFormats.NDJSON,
+                    ResponseFormats.ARROW,
+                ],
+            ),
+        })
+        configure_crud(self.graph, Namespace(subject="empty"), {
+            Operation.Search: (person_search_empty, OffsetLimitPageSchema(), PersonSchema()),
+        })
+        configure_relation(self.graph, Namespace(subject=Person, object_=Address), {
+            Operation.SearchFor: (address_search_for, OffsetLimitPageSchema(), AddressCSVSchema()),
+        })
+        self.client = self.graph.flask.test_client()
+
+    def test_search(self):
+        response = self.client.get("/api/person?limit=2")
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.headers["X-Total-Count"], is_(equal_to("4")))
+        assert_that(response.headers, is_not(has_key("ETag")))
+        assert_that(response.json, is_(equal_to({
+            "count": 4,
+            "offset": 0,
+            "limit": 2,
+            "items": [
+                {
+                    "id": str(PERSON_ID_1),
+                    "firstName": "Alice",
+                    "lastName": "Smith",
+                },
+                {
+                    "id": str(PERSON_2.id),
+                    "firstName": "Bob",
+                    "lastName": "Jones",
+                },
+            ],
+            "_links": {
+                "self": {
+                    "href": "http://localhost/api/person?offset=0&limit=2",
+                },
+                "next": {
+                    "href": "http://localhost/api/person?offset=2&limit=2",
+                },
+            },
+        })))
+
+    def test_search_skip_null(self):
+        response = self.client.get("/api/person?offset=2&limit=2", headers={"X-Response-Skip-Null": "true"})
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.json["items"], is_(equal_to([{
+            "id": str(PERSON_4.id),
+            "firstName": "Dave",
+        }])))
+
+    def test_search_empty(self):
+        response = self.client.get("/api/empty")
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.json["items"], is_(equal_to([])))
+        assert_that(response.json["count"], is_(equal_to(0)))
+
+    def test_search_for(self):
+        response = self.client.get("/api/person/{}/address".format(PERSON_ID_1))
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.json["items"][0]["addressLine"], is_(equal_to(ADDRESS_1.address_line)))
+        assert_that(
+            response.json["_links"]["self"]["href"],
+            is_(equal_to("http://localhost/api/person/{}/address?offset=0&limit=20".format(PERSON_ID_1))),
+        )
+
+    def test_search_csv(self):
+        response = self.client.get("/api/person", headers={"Accept": "text/csv"})
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.is_streamed, is_(equal_to(True)))
+        assert_that(response.headers, is_not(has_key("ETag")))
+        assert_that(response.data.decode("utf-8").splitlines(), is_(equal_to([
+            "id,firstName,lastName",
+            "{},Alice,Smith".format(PERSON_ID_1),
+            "{},Bob,Jones".format(PERSON_2.id),
+            "{},Dave,".format(PERSON_4.id),
+        ])))
+
+    def test_search_ndjson(self):
+        response = self.client.get("/api/person", headers={"Accept": "application/x-ndjson"})
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.is_streamed, is_(equal_to(True)))
+        assert_that(response.headers["X-Total-Count"], is_(equal_to("4")))
+        assert_that([loads(line) for line in response.data.splitlines()], is_(equal_to([
+            dict(id=str(PERSON_ID_1), firstName="Alice", lastName="Smith"),
+            dict(id=str(PERSON_2.id), firstName="Bob", lastName="Jones"),
+            dict(id=str(PERSON_4.id), firstName="Dave", lastName=None),
+        ])))
+
+    def test_search_arrow(self):
+        if not ResponseFormats.ARROW.available:
+            raise SkipTest
+
+        from pyarrow import ipc
+
+        response = self.client.get("/api/person", headers={"Accept": "application/vnd.apache.arrow.stream"})
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        table = ipc.open_stream(response.data).read_all()
+        assert_that(table.column("firstName").to_pylist(), is_(equal_to(["Alice", "Bob", "Dave"])))
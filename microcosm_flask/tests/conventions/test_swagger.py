@@ -0,0 +1,92 @@
+"""
+Test the swagger convention.
+
+"""
+from json import loads
+from unittest.mock import patch
+
+from hamcrest import (
+    assert_that,
+    equal_to,
+    has_key,
+    is_,
+    is_not,
+)
+from microcosm.api import create_object_graph, load_from_dict
+
+from microcosm_flask.conventions.crud import configure_crud
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+from microcosm_flask.swagger.definitions import build_swagger
+from microcosm_flask.tests.conventions.fixtures import (
+    Address,
+    AddressSchema,
+    Person,
+    PersonSchema,
+    address_retrieve,
+    person_retrieve,
+)
+
+
+class TestSwagger:
+
+    def setup(self):
+        self.graph = create_object_graph(name="example", testing=True)
+        self.graph.use("swagger_convention")
+        configure_crud(self.graph, Namespace(subject=Person), {
+            Operation.Retrieve: (person_retrieve, PersonSchema()),
+        })
+        self.client = self.graph.flask.test_client()
+
+    def test_cached_document(self):
+        with patch("microcosm_flask.conventions.swagger.build_swagger", wraps=build_swagger) as mocked:
+            response = self.client.get("/api/swagger")
+            cached_response = self.client.get("/api/swagger")
+
+        assert_that(mocked.call_count, is_(equal_to(1)))
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(loads(response.data)["paths"], has_key("/person/{person_id}"))
+        assert_that(cached_response.data, is_(equal_to(response.data)))
+        assert_that(cached_response.headers["ETag"], is_(equal_to(response.headers["ETag"])))
+
+    def test_not_modified(self):
+        etag = self.client.get("/api/swagger").headers["ETag"]
+
+        response = self.client.get("/api/swagger", headers={"If-None-Match": etag})
+        assert_that(response.status_code, is_(equal_to(304)))
+        assert_that(response.data, is_(equal_to(b"")))
+
+    def test_invalidate_on_new_routes(self):
+        response = self.client.get("/api/swagger")
+
+        configure_crud(self.graph, Namespace(subject=Address), {
+            Operation.Retrieve: (address_retrieve, AddressSchema()),
+        })
+
+        updated_response = self.client.get("/api/swagger", headers={"If-None-Match": response.headers["ETag"]})
+        assert_that(updated_response.status_code, is_(equal_to(200)))
+        assert_that(updated_response.headers["ETag"], is_not(equal_to(response.headers["ETag"])))
+        assert_that(loads(updated_response.data)["paths"], has_key("/address/{address_id}"))
+
+    def test_script_root(self):
+        response = self.client.get("/api/swagger")
+        prefixed_response = self.client.get("/api/swagger", base_url="http://localhost/prefix")
+
+        assert_that(prefixed_response.status_code, is_(equal_to(200)))
+        assert_that(prefixed_response.headers["ETag"], is_not(equal_to(response.headers["ETag"])))
+
+
+def test_prebuild():
+    loader = load_from_dict(swagger_convention=dict(prebuild=True))
+    graph = create_object_graph(name="example", testing=True, loader=loader)
+
+    with patch("microcosm_flask.conventions.swagger.build_swagger", wraps=build_swagger) as mocked:
+        # NB: documents are built when the convention is configured
+        graph.use("health_convention", "swagger_convention")
+        assert_that(mocked.call_count, is_(equal_to(1)))
+
+        client = graph.flask.test_client()
+        response = client.get("/api/swagger")
+        assert_that(mocked.call_count, is_(equal_to(1)))
+
+    assert_that(response.status_code, is_(equal_to(200)))
@@ -0,0 +1,94 @@
+"""
+Test Arrow formatting.
+
+"""
+from json import loads
+from unittest import SkipTest
+from unittest.mock import patch
+
+from hamcrest import assert_that, equal_to, is_
+from microcosm.api import create_object_graph, load_from_dict
+from parameterized import parameterized
+
+from microcosm_flask.formatting import ArrowFormatter
+from microcosm_flask.formatting.json_backends import StdlibJSONBackend, UjsonBackend
+
+
+def read_table(data):
+    from pyarrow import ipc
+
+    return ipc.open_stream(data).read_all()
+
+
+@parameterized([
+    ("flask",),
+    ("json",),
+])
+def test_make_response(json_backend):
+    if not ArrowFormatter.available:
+        raise SkipTest
+
+    graph = create_object_graph(
+        name="example",
+        testing=True,
+        loader=load_from_dict(flask=dict(json_backend=json_backend)),
+    )
+    formatter = ArrowFormatter()
+
+    with graph.app.test_request_context():
+        response = formatter(dict(
+            count=3,
+            items=[
+                dict(id="1", name="foo", score=1.5),
+                dict(id="2", name=None, score=2.0),
+                dict(id="3", score=2.5, tags=["bar"]),
+            ],
+            _links=dict(self=dict(href="http://localhost/api/foo")),
+        ))
+
+    assert_that(response.content_type, is_(equal_to("application/vnd.apache.arrow.stream")))
+
+    table = read_table(response.data)
+    assert_that(table.column_names, is_(equal_to(["id", "name", "score", "tags"])))
+    assert_that(table.to_pydict(), is_(equal_to(dict(
+        id=["1", "2", "3"],
+        name=["foo", None, None],
+        score=[1.5, 2.0, 2.5],
+        tags=[None, None, ["bar"]],
+    ))))
+    assert_that(loads(table.schema.metadata[b"count"]), is_(equal_to(3)))
+    assert_that(
+        loads(table.schema.metadata[b"_links"]),
+        is_(equal_to(dict(self=dict(href="http://localhost/api/foo")))),
+    )
+
+
+def test_make_response_uses_json_backend():
+    if not ArrowFormatter.available:
+        raise SkipTest
+
+    graph = create_object_graph(
+        name="example",
+        testing=True,
+        loader=load_from_dict(flask=dict(json_backend="ujson")),
+    )
+    formatter = ArrowFormatter()
+
+    with graph.app.test_request_context():
+        with patch.object(UjsonBackend, "available", True):
+            with patch.object(UjsonBackend, "dumps", side_effect=StdlibJSONBackend().dumps) as mocked:
+                response = formatter(dict(count=1, items=[dict(id="1")]))
+
+    assert_that(mocked.call_count, is_(equal_to(1)))
+    assert_that(loads(read_table(response.data).schema.metadata[b"count"]), is_(equal_to(1)))
+
+
+def test_make_response_single_item():
+    if not ArrowFormatter.available:
+        raise SkipTest
+
+    formatter = ArrowFormatter()
+
+    response = formatter(dict(id="1", name="foo"))
+
+    assert_that(read_table(response.data).to_pydict(), is_(equal_to(dict(id=["1"], name=["foo"]))))
@@ -0,0 +1,138 @@
+"""
+Test response compression.
+
+"""
+from gzip import decompress
+from json import loads
+
+from hamcrest import (
+    assert_that,
+    equal_to,
+    has_key,
+    is_,
+    is_not,
+)
+from microcosm.api import create_object_graph, load_from_dict
+
+from microcosm_flask.conventions.base import EndpointDefinition
+from microcosm_flask.conventions.crud import configure_crud
+from microcosm_flask.conventions.registry import compress
+from microcosm_flask.enums import ResponseFormats
+from microcosm_flask.formatting import TextFormatter
+from microcosm_flask.formatting.compression import ENCODINGS, iter_compressed
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+from microcosm_flask.paging import OffsetLimitPageSchema
+from microcosm_flask.tests.conventions.fixtures import (
+    PERSON_1,
+    Person,
+    PersonCSVSchema,
+    person_retrieve,
+)
+
+
+PEOPLE = [PERSON_1] * 100
+
+
+def person_search(offset, limit):
+    return PEOPLE[offset:offset + limit], len(PEOPLE)
+
+
+def person_search_streaming(offset, limit):
+    return iter(PEOPLE[offset:offset + limit]), len(PEOPLE)
+
+
+@compress(False)
+def person_retrieve_uncompressed(person_id):
+    return person_retrieve(person_id)
+
+
+class TestCompression:
+
+    def setup(self):
+        loader = load_from_dict(
+            flask=dict(
+                compression_enabled=True,
+                compression_encodings=["gzip"],
+                compression_min_size=256,
+            ),
+        )
+        self.graph = create_object_graph(name="example", testing=True, loader=loader)
+        configure_crud(self.graph, Namespace(subject=Person), {
+            Operation.Retrieve: (person_retrieve, PersonCSVSchema()),
+            Operation.Search: EndpointDefinition(
+                func=person_search,
+                request_schema=OffsetLimitPageSchema(),
+                response_schema=PersonCSVSchema(),
+                response_formats=[ResponseFormats.JSON, ResponseFormats.CSV],
+            ),
+        })
+        configure_crud(self.graph, Namespace(subject=Person, version="v2"), {
+            Operation.Retrieve: (person_retrieve_uncompressed, PersonCSVSchema()),
+            Operation.Search: (person_search_streaming, OffsetLimitPageSchema(), PersonCSVSchema()),
+        })
+        self.client = self.graph.flask.test_client()
+
+    def test_compress_json(self):
+        uncompressed = self.client.get("/api/person?limit=100")
+        response = self.client.get("/api/person?limit=100", headers={"Accept-Encoding": "gzip, deflate"})
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.headers["Content-Encoding"], is_(equal_to("gzip")))
+        assert_that(response.headers["Vary"], is_(equal_to("Accept-Encoding")))
+        assert_that(int(response.headers["Content-Length"]), is_(equal_to(len(response.data))))
+        assert_that(decompress(response.data), is_(equal_to(uncompressed.data)))
+        # the encoded variant has its own etag
+        assert_that(response.headers["ETag"], is_not(equal_to(uncompressed.headers["ETag"])))
+
+    def test_compress_csv(self):
+        response = self.client.get(
+            "/api/person?limit=100",
+            headers={"Accept": "text/csv", "Accept-Encoding": "gzip"},
+        )
+
+        assert_that(response.headers["Content-Encoding"], is_(equal_to("gzip")))
+        assert_that(len(decompress(response.data).splitlines()), is_(equal_to(101)))
+
+    def test_not_accepted(self):
+        response = self.client.get("/api/person?limit=100", headers={"Accept-Encoding": "br, gzip;q=0"})
+
+        assert_that(response.headers, is_not(has_key("Content-Encoding")))
+        assert_that(response.headers["Vary"], is_(equal_to("Accept-Encoding")))
+
+    def test_below_minimum_size(self):
+        response = self.client.get("/api/person/{}".format(PERSON_1.id), headers={"Accept-Encoding": "gzip"})
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.headers, is_not(has_key("Content-Encoding")))
+
+    def test_endpoint_opt_out(self):
+        response = self.client.get("/api/v2/person/{}".format(PERSON_1.id), headers={"Accept-Encoding": "gzip"})
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.headers, is_not(has_key("Vary")))
+        assert_that(response.headers, is_not(has_key("Content-Encoding")))
+
+    def test_compress_streaming(self):
+        response = self.client.get("/api/v2/person?limit=100", headers={"Accept-Encoding": "gzip"})
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.is_streamed, is_(equal_to(True)))
+        assert_that(response.headers["Content-Encoding"], is_(equal_to("gzip")))
+        assert_that(response.headers, is_not(has_key("Content-Length")))
+        assert_that(len(loads(decompress(response.data))["items"]), is_(equal_to(100)))
+
+
+def test_iter_compressed():
+    chunks = [b"foo", "bar", b"", b"baz"]
+
+    assert_that(
+        decompress(b"".join(iter_compressed(chunks, ENCODINGS["gzip"]))),
+        is_(equal_to(b"foobarbaz")),
+    )
+
+
+def test_compression_requires_request_context():
+    response = TextFormatter()("foo" * 1000, compress=True)
+
+    assert_that(response.headers, is_not(has_key("Content-Encoding")))
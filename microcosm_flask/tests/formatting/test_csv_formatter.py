@@ -6,10 +6,13 @@ from hamcrest import (
     assert_that,
     contains_inanyorder,
     equal_to,
+    greater_than,
     is_,
+    less_than,
 )
 
 from microcosm_flask.formatting import CSVFormatter
+from microcosm_flask.formatting.csv_formatter import CHUNK_SIZE
 from microcosm_flask.tests.conventions.fixtures import PersonCSVSchema
 from microcosm_flask.tests.formatting.base import etag_for
 
@@ -95,3 +98,52 @@ def test_make_response_ordered():
             spooky_hash='"0a7f40b47efb0a197b180444c4911b17"',
         )),
     ))
+
+
+def test_make_response_does_not_modify_column_order():
+    class Schema:
+        csv_column_order = ["id"]
+
+    schema = Schema()
+    formatter = CSVFormatter(schema)
+
+    for _ in range(2):
+        response = formatter(dict(items=[
+            dict(
+                firstName="First",
+                lastName="Last",
+                id="me",
+            )
+        ]))
+        assert_that(response.data, is_(equal_to(b"id,firstName,lastName\r\nme,First,Last\r\n")))
+
+    assert_that(schema.csv_column_order, is_(equal_to(["id"])))
+
+
+def test_make_response_streaming():
+    formatter = CSVFormatter(PersonCSVSchema())
+    items = (
+        dict(id=str(index), firstName="First", lastName="Last" if index % 2 else None)
+        for index in range(10000)
+    )
+
+    chunks = list(formatter.format(dict(items=items)))
+    lines = b"".join(chunk.encode("utf-8") for chunk in chunks).splitlines()
+
+    # rows are written in bounded chunks
+    assert_that(len(chunks), is_(greater_than(1)))
+    assert_that(max(len(chunk) for chunk in chunks), is_(less_than(2 * CHUNK_SIZE)))
+    assert_that(len(lines), is_(equal_to(10001)))
+    assert_that(lines[:3], is_(equal_to([
+        b"id,firstName,lastName",
+        b"0,First,",
+        b"1,First,Last",
+    ])))
+
+
+def test_make_response_empty():
+    formatter = CSVFormatter()
+
+    response = formatter(dict(items=[]))
+
+    assert_that(response.data, is_(equal_to(b"")))
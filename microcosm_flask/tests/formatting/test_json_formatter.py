@@ -2,18 +2,33 @@
 Test json formatting.
 
 """
+from datetime import datetime
+from enum import Enum
+from json import loads
+from unittest import SkipTest
+from uuid import uuid4
+
 from hamcrest import (
     assert_that,
     contains_inanyorder,
     equal_to,
     is_,
 )
-from microcosm.api import create_object_graph
+from microcosm.api import create_object_graph, load_from_dict
+from parameterized import parameterized
 
 from microcosm_flask.formatting import JSONFormatter
+from microcosm_flask.formatting.json_backends import JSON_BACKENDS, get_json_backend
 from microcosm_flask.tests.formatting.base import etag_for
 
 
+FOO_ID = uuid4()
+
+
+class Color(Enum):
+    RED = "red"
+
+
 def test_make_response():
     graph = create_object_graph(name="example", testing=True)
     formatter = JSONFormatter()
@@ -31,3 +46,64 @@ def test_make_response():
             spooky_hash='"af072b51e1eb2a8d7b2ab84dab972674"',
         )),
     ))
+
+
+def test_make_response_with_stdlib_backend():
+    loader = load_from_dict(
+        flask=dict(
+            json_backend="json",
+        ),
+    )
+    graph = create_object_graph(name="example", testing=True, loader=loader)
+    formatter = JSONFormatter()
+
+    with graph.app.test_request_context():
+        response = formatter(dict(
+            foo="bar",
+            bar=FOO_ID,
+            baz=datetime(2020, 1, 2, 3, 4, 5),
+            qux=Color.RED,
+        ))
+
+    assert_that(response.data, is_(equal_to(
+        '{{"bar":"{}","baz":"2020-01-02T03:04:05","foo":"bar","qux":"red"}}'.format(FOO_ID).encode("utf-8"),
+    )))
+    assert_that(response.content_type, is_(equal_to("application/json")))
+
+
+def test_make_response_without_sorting_keys():
+    loader = load_from_dict(
+        flask=dict(
+            json_backend="json",
+            json_sort_keys=False,
+        ),
+    )
+    graph = create_object_graph(name="example", testing=True, loader=loader)
+    formatter = JSONFormatter()
+
+    with graph.app.test_request_context():
+        response = formatter(dict(foo="bar", bar="baz"))
+
+    assert_that(response.data, is_(equal_to(b'{"foo":"bar","bar":"baz"}')))
+
+
+@parameterized([
+    ("orjson",),
+    ("ujson",),
+])
+def test_make_response_with_optional_backends(backend):
+    if not JSON_BACKENDS[backend].available:
+        raise SkipTest
+
+    data = dict(
+        foo="bar",
+        bar=FOO_ID,
+        baz=datetime(2020, 1, 2, 3, 4, 5),
+        qux=Color.RED,
+        items=[1, 2.5, None, True],
+    )
+    stdlib_data = get_json_backend("json").dumps(data)
+    assert_that(
+        loads(JSON_BACKENDS[backend].dumps(data)),
+        is_(equal_to(loads(stdlib_data))),
+    )
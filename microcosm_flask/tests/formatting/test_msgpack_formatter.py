@@ -0,0 +1,35 @@
+"""
+Test MessagePack formatting.
+
+"""
+from unittest import SkipTest
+from uuid import uuid4
+
+from hamcrest import assert_that, equal_to, is_
+
+from microcosm_flask.formatting import MsgpackFormatter
+
+
+def test_make_response():
+    if not MsgpackFormatter.available:
+        raise SkipTest
+
+    from msgpack import unpackb
+
+    foo_id = uuid4()
+    formatter = MsgpackFormatter()
+
+    response = formatter(dict(
+        count=1,
+        items=[
+            dict(id=foo_id, foo="bar", baz=[1, 2.5, None]),
+        ],
+    ))
+
+    assert_that(response.content_type, is_(equal_to("application/msgpack")))
+    assert_that(unpackb(response.data), is_(equal_to(dict(
+        count=1,
+        items=[
+            dict(id=str(foo_id), foo="bar", baz=[1, 2.5, None]),
+        ],
+    ))))
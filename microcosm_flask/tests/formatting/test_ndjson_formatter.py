@@ -0,0 +1,35 @@
+"""
+Test newline-delimited JSON formatting.
+
+"""
+from hamcrest import assert_that, equal_to, is_
+from microcosm.api import create_object_graph
+
+from microcosm_flask.formatting import NDJSONFormatter
+
+
+def test_make_response():
+    graph = create_object_graph(name="example", testing=True)
+    formatter = NDJSONFormatter()
+
+    with graph.app.test_request_context():
+        response = formatter(dict(
+            count=2,
+            items=[
+                dict(foo="bar"),
+                dict(foo="baz"),
+            ],
+        ))
+
+    assert_that(response.data, is_(equal_to(b'{"foo": "bar"}\n{"foo": "baz"}\n')))
+    assert_that(response.content_type, is_(equal_to("application/x-ndjson")))
+
+
+def test_make_response_single_item():
+    graph = create_object_graph(name="example", testing=True)
+    formatter = NDJSONFormatter()
+
+    with graph.app.test_request_context():
+        response = formatter(dict(foo="bar"))
+
+    assert_that(response.data, is_(equal_to(b'{"foo": "bar"}\n')))
@@ -2,14 +2,19 @@
 Test JSON Schema generation.
 
 """
+from unittest.mock import patch
+
 from hamcrest import (
     assert_that,
+    contains_inanyorder,
     equal_to,
     has_length,
     is_,
+    is_not,
 )
 
-from microcosm_flask.swagger.api import build_schema, iter_schemas
+from microcosm_flask.swagger.api import build_parameter, build_schema, iter_schemas
+from microcosm_flask.swagger.schemas import Schemas
 from microcosm_flask.tests.conventions.fixtures import NewPersonSchema, RecursiveSchema
 
 
@@ -87,3 +92,31 @@ def test_schema_iteration_recursive():
             "items": {"$ref": "#/definitions/Recursive"},
         }},
     })))
+
+
+def test_schema_generation_is_memoized():
+    schema = build_schema(NewPersonSchema())
+    with patch.object(Schemas, "build_uncached") as mock_build_uncached:
+        assert_that(build_schema(NewPersonSchema()), is_(equal_to(schema)))
+    assert_that(mock_build_uncached.called, is_(equal_to(False)))
+
+    # options are part of the key
+    partial_schema = build_schema(NewPersonSchema(only=("firstName",)))
+    assert_that(partial_schema["properties"].keys(), contains_inanyorder("firstName"))
+
+
+def test_parameter_generation_returns_copies():
+    field = NewPersonSchema().fields["firstName"]
+    parameter = build_parameter(field)
+    parameter["name"] = "firstName"
+
+    assert_that(build_parameter(field), is_(equal_to(dict(type="string"))))
+
+
+def test_schema_generation_returns_copies():
+    schema = build_schema(NewPersonSchema())
+    schema["properties"]["firstName"]["type"] = "integer"
+    schema["required"].append("foo")
+
+    assert_that(build_schema(NewPersonSchema()), is_not(equal_to(schema)))
+    assert_that(build_schema(NewPersonSchema())["properties"]["firstName"], is_(equal_to(dict(type="string"))))
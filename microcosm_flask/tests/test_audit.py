@@ -3,23 +3,36 @@ Audit structure tests.
 
 """
 from logging import DEBUG, NOTSET, getLogger
-from unittest.mock import MagicMock
-from uuid import uuid4
+from timeit import repeat
+from unittest.mock import MagicMock, patch
+from uuid import UUID, uuid4
 
 from flask import g
 from hamcrest import (
     assert_that,
+    calling,
     equal_to,
+    has_entry,
+    instance_of,
     is_,
     is_not,
+    less_than,
     none,
+    raises,
 )
 from microcosm.api import create_object_graph
 from werkzeug.exceptions import NotFound
 
 from microcosm_flask.audit import (
+    BLOCK,
+    DROP,
+    SAMPLE,
+    AsynchronousAuditSink,
     AuditOptions,
+    AuditSampler,
     RequestInfo,
+    id_header_field,
+    is_uuid,
     logging_levels,
     should_skip_logging,
 )
@@ -29,6 +42,74 @@ def test_func(*args, **kwargs):
     pass
 
 
+def test_is_uuid():
+    value = uuid4()
+
+    for candidate in (
+            str(value),
+            str(value).upper(),
+            value.hex,
+            "{{{}}}".format(value),
+            value.urn,
+    ):
+        assert_that(is_uuid(candidate), is_(equal_to(True)), candidate)
+
+    for candidate in (
+            "",
+            "20",
+            str(value)[:-1],
+            "{}0".format(value),
+            str(value).replace("a", "g").replace("b", "g").replace("c", "g"),
+            None,
+    ):
+        assert_that(is_uuid(candidate), is_(equal_to(False)), candidate)
+
+
+def test_id_header_field():
+    assert_that(id_header_field("X-FooBar-Id"), is_(equal_to("foo_bar_id")))
+    assert_that(id_header_field("X-Request-Id"), is_(equal_to("request_id")))
+    assert_that(id_header_field("X-Foo-Bar-Id"), is_(none()))
+    assert_that(id_header_field("Content-Type"), is_(none()))
+
+
+def benchmark(func):
+    # NB: the best of several runs is the least sensitive to load
+    return min(repeat(func, number=200, repeat=5))
+
+
+def test_is_uuid_is_faster():
+    """
+    Benchmark `is_uuid` against constructing a `UUID` for typical path and query values.
+
+    """
+    def construct_uuid(value):
+        try:
+            UUID(value)
+            return True
+        except Exception:
+            return False
+
+    values = [str(uuid4()), uuid4().hex, "foo", "1234", "true", "some-name"] * 20
+
+    is_uuid_time = benchmark(lambda: [is_uuid(value) for value in values])
+    construct_uuid_time = benchmark(lambda: [construct_uuid(value) for value in values])
+
+    assert_that(is_uuid_time, is_(less_than(construct_uuid_time * 0.6)))
+
+
+def test_id_header_field_is_faster():
+    """
+    Benchmark memoized response header mapping against mapping every header.
+
+    """
+    headers = ["X-FooBar-Id", "X-Request-Id", "Content-Type", "ETag"] * 25
+
+    memoized_time = benchmark(lambda: [id_header_field(header) for header in headers])
+    unmemoized_time = benchmark(lambda: [id_header_field.__wrapped__(header) for header in headers])
+
+    assert_that(memoized_time, is_(less_than(unmemoized_time * 0.6)))
+
+
 class TestRequestInfo:
     """
     Test capturing of request data.
@@ -69,6 +150,17 @@ class TestRequestInfo:
                 ))),
             )
 
+    def test_slots(self):
+        """
+        Request info does not allocate a per-instance dictionary.
+
+        """
+        with self.graph.flask.test_request_context("/"):
+            request_info = RequestInfo(self.options, test_func, None)
+
+            assert_that(hasattr(request_info, "__dict__"), is_(equal_to(False)))
+            assert_that(request_info.operation, is_(equal_to("test_func")))
+
     def test_request_context(self):
         """
         Log entries can include context from headers.
@@ -395,3 +487,292 @@ class TestRequestInfo:
             def func():
                 pass
             assert_that(should_skip_logging(func), is_(equal_to(True)))
+
+
+class TestAuditSink:
+    """
+    Test writing audit records (off the request thread).
+
+    """
+    def setup(self):
+        self.graph = create_object_graph("example", testing=True, debug=True)
+        self.graph.use(
+            "flask",
+            "request_context",
+        )
+
+        self.graph.flask.route("/<foo>")(test_func)
+
+        self.options = AuditOptions(
+            include_request_body=True,
+            include_response_body=True,
+            include_path=True,
+            include_query_string=True,
+        )
+
+    def snapshot(self):
+        with self.graph.flask.test_request_context("/bar"):
+            request_info = RequestInfo(self.options, test_func, self.graph.request_context)
+            request_info.capture_response(MagicMock(data='{"foo": "bar"}', status_code=200))
+            return request_info.snapshot()
+
+    def test_record_outside_request_context(self):
+        """
+        Snapshots are formatted without a request context.
+
+        """
+        record = self.snapshot()
+
+        logger = MagicMock()
+        record.log(logger)
+        logger.info.assert_called_with(dict(
+            operation="test_func",
+            method="GET",
+            func="test_func",
+            foo="bar",
+            success=True,
+            status_code=200,
+            response_body=dict(foo="bar"),
+        ))
+
+    def test_asynchronous(self):
+        """
+        Records are written on a background thread.
+
+        """
+        sink = AsynchronousAuditSink(queue_size=10, backpressure=BLOCK)
+        logger = MagicMock()
+
+        for _ in range(20):
+            sink.emit(self.snapshot(), logger)
+        sink.flush()
+
+        assert_that(logger.info.call_count, is_(equal_to(20)))
+        assert_that(sink.dropped, is_(equal_to(0)))
+
+        sink.close()
+        assert_that(sink.thread.is_alive(), is_(equal_to(False)))
+
+    def test_drop(self):
+        """
+        Records are dropped (and counted) when the queue is full.
+
+        """
+        sink = AsynchronousAuditSink(queue_size=2, backpressure=DROP)
+        logger = MagicMock()
+
+        with patch.object(sink, "start"):
+            for _ in range(3):
+                sink.emit(self.snapshot(), logger)
+
+        assert_that(sink.dropped, is_(equal_to(1)))
+        assert_that(sink.queue.qsize(), is_(equal_to(2)))
+
+        sink.flush()
+        logger.info.assert_not_called()
+
+    def test_sample(self):
+        """
+        Records are sampled once the queue is half full.
+
+        """
+        sink = AsynchronousAuditSink(queue_size=4, backpressure=SAMPLE, sample_rate=0.0)
+        logger = MagicMock()
+
+        with patch.object(sink, "start"):
+            for _ in range(3):
+                sink.emit(self.snapshot(), logger)
+
+        assert_that(sink.sampled_out, is_(equal_to(1)))
+        assert_that(sink.queue.qsize(), is_(equal_to(2)))
+
+    def test_report_discarded(self):
+        """
+        Discarded records are reported by the writer.
+
+        """
+        sink = AsynchronousAuditSink(queue_size=1, backpressure=DROP)
+        logger = MagicMock()
+
+        with patch.object(sink, "start"):
+            for _ in range(2):
+                sink.emit(self.snapshot(), logger)
+
+        sink.start()
+        sink.flush()
+        sink.close()
+
+        logger.info.assert_called_once()
+        logger.warning.assert_called_once_with(
+            "Discarded audit records",
+            extra=dict(dropped=1, sampled_out=0),
+        )
+
+    def test_unsupported_backpressure(self):
+        assert_that(
+            calling(AsynchronousAuditSink).with_args(backpressure="ignore"),
+            raises(ValueError),
+        )
+
+    def test_configure(self):
+        """
+        The audit decorator writes to an asynchronous sink when configured to.
+
+        """
+        def loader(metadata):
+            return dict(
+                audit=dict(
+                    asynchronous=True,
+                ),
+            )
+
+        graph = create_object_graph("example", testing=True, loader=loader)
+        assert_that(graph.audit.sink, is_(instance_of(AsynchronousAuditSink)))
+
+        @graph.flask.route("/")
+        @graph.audit
+        def foo():
+            return ""
+
+        with patch("microcosm_flask.audit.getLogger") as mocked:
+            response = graph.flask.test_client().get("/")
+            graph.audit.sink.flush()
+
+        assert_that(response.status_code, is_(equal_to(200)))
+        mocked.return_value.info.assert_called_once()
+        graph.audit.sink.close()
+
+
+class TestAuditSampler:
+    """
+    Test sampling of audit records.
+
+    """
+    def setup(self):
+        self.graph = create_object_graph("example", testing=True)
+        self.graph.use(
+            "flask",
+            "request_context",
+        )
+
+        self.graph.flask.route("/", endpoint="foo.search.v1")(test_func)
+
+        self.options = AuditOptions(
+            include_request_body=False,
+            include_response_body=False,
+            include_path=False,
+            include_query_string=False,
+        )
+
+    def should_log(self, sampler, request_id=None, status_code=200, error=None, elapsed_time=1.0):
+        headers = dict() if request_id is None else {"X-Request-Id": request_id}
+        with self.graph.flask.test_request_context("/", headers=headers):
+            request_info = RequestInfo(self.options, test_func, None)
+            request_info.timing.update(elapsed_time=elapsed_time)
+            if error is None:
+                request_info.capture_response(MagicMock(data="", status_code=status_code))
+            else:
+                request_info.capture_error(error)
+
+            return sampler.should_log(request_info), request_info.sample_rate
+
+    def test_rate_for(self):
+        sampler = AuditSampler(rate=0.5, rates={"search": 0.1, "bar.search.v1": 0.2})
+
+        assert_that(sampler.rate_for("foo.search.v1"), is_(equal_to(0.1)))
+        assert_that(sampler.rate_for("bar.search.v1"), is_(equal_to(0.2)))
+        assert_that(sampler.rate_for("foo.create.v1"), is_(equal_to(0.5)))
+        assert_that(sampler.rate_for(None), is_(equal_to(0.5)))
+
+    def test_enabled(self):
+        assert_that(AuditSampler().enabled, is_(equal_to(False)))
+        assert_that(AuditSampler(rates={"search": 0.1}).enabled, is_(equal_to(True)))
+
+    def test_sample_out(self):
+        sampler = AuditSampler(rate=0.0)
+
+        assert_that(self.should_log(sampler), is_(equal_to((False, None))))
+
+    def test_sample_in(self):
+        sampler = AuditSampler(rate=0.0, rates={"search": 1.0})
+
+        assert_that(self.should_log(sampler), is_(equal_to((True, None))))
+
+    def test_always_log_errors(self):
+        sampler = AuditSampler(rate=0.0)
+
+        assert_that(self.should_log(sampler, status_code=503), is_(equal_to((True, None))))
+        assert_that(self.should_log(sampler, error=NotFound()), is_(equal_to((True, None))))
+
+    def test_always_log_slow_requests(self):
+        sampler = AuditSampler(rate=0.0, slow_request_threshold_ms=100)
+
+        assert_that(self.should_log(sampler, elapsed_time=99.0), is_(equal_to((False, None))))
+        assert_that(self.should_log(sampler, elapsed_time=100.0), is_(equal_to((True, None))))
+
+    def test_deterministic(self):
+        """
+        Requests with the same id are sampled consistently.
+
+        """
+        sampler = AuditSampler(rate=0.5)
+        request_ids = [str(uuid4()) for _ in range(100)]
+
+        decisions = [self.should_log(sampler, request_id)[0] for request_id in request_ids]
+
+        assert_that(
+            [self.should_log(sampler, request_id)[0] for request_id in request_ids],
+            is_(equal_to(decisions)),
+        )
+        assert_that(any(decisions), is_(equal_to(True)))
+        assert_that(all(decisions), is_(equal_to(False)))
+
+    def test_log_sample_rate(self):
+        """
+        Sampled records include their sample rate.
+
+        """
+        sampler = AuditSampler(rate=0.5)
+        request_id = next(
+            request_id
+            for request_id in (str(uuid4()) for _ in range(100))
+            if self.should_log(sampler, request_id)[0]
+        )
+
+        with self.graph.flask.test_request_context("/", headers={"X-Request-Id": request_id}):
+            request_info = RequestInfo(self.options, test_func, None)
+            request_info.capture_response(MagicMock(data="", status_code=200))
+            sampler.should_log(request_info)
+
+            assert_that(request_info.to_dict(), has_entry("sample_rate", 0.5))
+
+    def test_configure(self):
+        """
+        The audit decorator skips sampled out requests.
+
+        """
+        def loader(metadata):
+            return dict(
+                audit=dict(
+                    sample_rate=0.0,
+                ),
+            )
+
+        graph = create_object_graph("example", testing=True, loader=loader)
+
+        @graph.flask.route("/")
+        @graph.audit
+        def foo():
+            return ""
+
+        @graph.flask.route("/error")
+        @graph.audit
+        def error():
+            raise NotFound()
+
+        with patch("microcosm_flask.audit.getLogger") as mocked:
+            graph.flask.test_client().get("/")
+            mocked.return_value.info.assert_not_called()
+
+            graph.flask.test_client().get("/error")
+            mocked.return_value.info.assert_called_once()
@@ -18,3 +18,17 @@ def test_request_context():
     }):
         with graph.opaque.initialize(graph.request_context):
             assert_that(graph.opaque["X-Request-Id"], is_(equal_to("foo")))
+
+
+def test_request_context_excludes_profile_tokens():
+    graph = create_object_graph(name="example", testing=True)
+    graph.use(
+        "opaque",
+        "request_context",
+    )
+
+    with graph.flask.test_request_context(headers={
+            "X-Request-Id": "foo",
+            "X-Request-Profile": "token",
+    }):
+        assert_that(graph.request_context(), is_(equal_to({"X-Request-Id": "foo"})))
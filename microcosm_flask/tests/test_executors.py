@@ -0,0 +1,143 @@
+"""
+Executor tests.
+
+"""
+from threading import Event, current_thread
+
+from flask import g, has_request_context
+from hamcrest import (
+    assert_that,
+    contains,
+    equal_to,
+    has_key,
+    is_,
+    is_not,
+)
+from microcosm.api import create_object_graph, load_from_dict
+
+from microcosm_flask.conventions.crud_adapter import CRUDStoreAdapter
+from microcosm_flask.executors import copy_current_context
+from microcosm_flask.session import register_session_factory
+from microcosm_flask.timing import get_phase_timings, timed
+
+
+class Session:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Store:
+    """
+    A store that only returns once both search and count are in flight.
+
+    """
+    concurrent_sessions = True
+
+    def __init__(self):
+        self.searching = Event()
+        self.counting = Event()
+
+    def search(self, offset, limit, **kwargs):
+        self.searching.set()
+        assert self.counting.wait(1)
+        return ["foo", "bar"][offset:offset + limit]
+
+    def count(self, **kwargs):
+        self.counting.set()
+        assert self.searching.wait(1)
+        return 2
+
+
+def test_copy_current_context():
+    graph = create_object_graph(name="example", testing=True)
+    sessions = []
+
+    def session_factory(graph):
+        sessions.append(Session())
+        return sessions[-1]
+
+    register_session_factory(graph, "session", session_factory)
+
+    teardowns = []
+
+    @graph.flask.teardown_request
+    def teardown(*args, **kwargs):
+        teardowns.append(current_thread().name)
+
+    def func():
+        with timed("func"):
+            pass
+        g.baz.append("baz")
+        return has_request_context(), g.bar, g.session, current_thread().name
+
+    with graph.flask.test_request_context():
+        graph.flask.preprocess_request()
+        g.bar = "bar"
+        g.baz = []
+        future = graph.search_executor.submit(func)
+        in_request_context, bar, session, thread_name = future.result()
+
+        assert_that(in_request_context, is_(equal_to(False)))
+        assert_that(bar, is_(equal_to("bar")))
+        assert_that(thread_name, is_not(equal_to(current_thread().name)))
+        # mutable values are not shared
+        assert_that(get_phase_timings(), is_not(has_key("func")))
+        assert_that(g.baz, is_(equal_to([])))
+        # the task gets (and closes) its own session
+        assert_that(session, is_not(equal_to(g.session)))
+        assert_that([session.closed for session in sessions], contains(False, True))
+
+    # teardown only runs (once) for the request
+    assert_that(teardowns, contains(current_thread().name))
+
+
+def test_copy_current_context_without_context():
+    def func():
+        pass
+
+    assert_that(copy_current_context(func), is_(equal_to(func)))
+
+
+def test_search_concurrently():
+    loader = load_from_dict(
+        search_executor=dict(
+            enabled=True,
+        ),
+    )
+    graph = create_object_graph(name="example", testing=True, loader=loader)
+    adapter = CRUDStoreAdapter(graph, Store())
+
+    with graph.flask.test_request_context():
+        items, count = adapter.search(offset=0, limit=1)
+
+    assert_that(items, is_(equal_to(["foo"])))
+    assert_that(count, is_(equal_to(2)))
+
+
+def test_search_serially():
+    loader = load_from_dict(
+        search_executor=dict(
+            enabled=True,
+        ),
+    )
+    graph = create_object_graph(name="example", testing=True, loader=loader)
+
+    class SharedSessionStore:
+        def search(self, offset, limit, **kwargs):
+            return ["foo", "bar"][offset:offset + limit]
+
+        def count(self, **kwargs):
+            return current_thread().name
+
+    adapter = CRUDStoreAdapter(graph, SharedSessionStore())
+
+    with graph.flask.test_request_context():
+        items, count = adapter.search(offset=0, limit=1)
+
+    assert_that(items, is_(equal_to(["foo"])))
+    # stores that do not opt in are counted on the request thread
+    assert_that(count, is_(equal_to(current_thread().name)))
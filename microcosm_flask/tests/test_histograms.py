@@ -0,0 +1,123 @@
+"""
+Histogram tests.
+
+"""
+from threading import Thread
+
+from hamcrest import (
+    assert_that,
+    close_to,
+    contains,
+    equal_to,
+    has_entries,
+    is_,
+)
+
+from microcosm_flask.histograms import (
+    Counters,
+    Histogram,
+    Histograms,
+    bucket_for,
+    bucket_range,
+)
+
+
+def test_buckets():
+    """
+    Buckets are contiguous and have bounded relative width.
+
+    """
+    for value in range(100000):
+        lower, upper = bucket_range(bucket_for(value))
+        assert_that(lower <= value <= upper, is_(equal_to(True)), value)
+        assert_that((upper - lower) / value if value else 0, is_(close_to(0, 1 / 64)), value)
+
+    assert_that(bucket_for(127), is_(equal_to(127)))
+    assert_that(bucket_for(128), is_(equal_to(128)))
+    assert_that(bucket_range(128), contains(128, 129))
+
+
+def test_percentile():
+    histogram = Histogram()
+    for value in range(1, 10001):
+        histogram.record(value)
+
+    assert_that(histogram.count, is_(equal_to(10000)))
+    assert_that(histogram.mean, is_(equal_to(5000.5)))
+    assert_that(histogram.max, is_(equal_to(10000)))
+    assert_that(histogram.percentile(50), is_(close_to(5000, 5000 / 64)))
+    assert_that(histogram.percentile(99), is_(close_to(9900, 9900 / 64)))
+    assert_that(histogram.percentile(100), is_(equal_to(10000)))
+
+
+def test_empty_percentile():
+    assert_that(Histogram().percentile(50), is_(equal_to(0)))
+
+
+def test_subtract():
+    histogram = Histogram()
+    for value in range(100):
+        histogram.record(value)
+    earlier = Histogram().merge(histogram)
+
+    for value in range(1000, 1100):
+        histogram.record(value)
+
+    delta = histogram.subtract(earlier)
+    assert_that(delta.count, is_(equal_to(100)))
+    assert_that(delta.percentile(1), is_(close_to(1000, 1000 / 64)))
+    assert_that(delta.max, is_(close_to(1099, 1099 / 64)))
+
+
+def test_histograms_across_threads():
+    histograms = Histograms()
+
+    def record():
+        for value in range(1000):
+            histograms.record("foo", value)
+        histograms.record("bar", 1)
+
+    threads = [Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    snapshot = histograms.snapshot()
+    assert_that(snapshot["foo"].count, is_(equal_to(4000)))
+    assert_that(snapshot["foo"].max, is_(equal_to(999)))
+    assert_that(snapshot["bar"].counts, has_entries({1: 4}))
+
+
+def test_histograms_retire_exited_threads():
+    histograms = Histograms()
+    histograms.record("foo", 1)
+
+    for _ in range(10):
+        thread = Thread(target=histograms.record, args=("foo", 2))
+        thread.start()
+        thread.join()
+
+    # the shards of exited threads are folded into the retired shard
+    assert_that(len(histograms.shards), is_(equal_to(2)))
+    for _ in range(2):
+        snapshot = histograms.snapshot()
+        assert_that(len(histograms.shards), is_(equal_to(1)))
+        assert_that(snapshot["foo"].counts, has_entries({1: 1, 2: 10}))
+
+    histograms.record("foo", 1)
+    assert_that(histograms.snapshot()["foo"].counts, has_entries({1: 2, 2: 10}))
+
+
+def test_counters_retire_exited_threads():
+    counters = Counters()
+    counters.add("foo")
+
+    for _ in range(10):
+        thread = Thread(target=counters.add, args=("foo", 2))
+        thread.start()
+        thread.join()
+
+    for _ in range(2):
+        assert_that(counters.snapshot(), is_(equal_to(dict(foo=21))))
+        assert_that(len(counters.shards), is_(equal_to(1)))
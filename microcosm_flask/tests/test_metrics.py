@@ -3,9 +3,17 @@ Metrics tests.
 
 """
 from unittest import SkipTest
-from unittest.mock import ANY
-
-from hamcrest import assert_that, equal_to, is_
+from unittest.mock import ANY, MagicMock, call
+from uuid import uuid4
+
+from hamcrest import (
+    assert_that,
+    contains_inanyorder,
+    equal_to,
+    has_entries,
+    has_key,
+    is_,
+)
 from microcosm.api import create_object_graph, load_from_dict
 from werkzeug.exceptions import NotFound
 
@@ -128,3 +136,85 @@ class TestRouteMetrics:
                 "classifier:4xx",
             ],
         )
+
+
+class TestAggregatedRouteMetrics:
+
+    def setup(self):
+        self.loader = load_from_dict(
+            route_metrics=dict(
+                aggregate=True,
+            ),
+        )
+        self.graph = create_object_graph("example", testing=True, loader=self.loader)
+        self.graph.use(
+            "flask",
+            "route",
+        )
+        self.client = self.graph.flask.test_client()
+
+        self.ns = Namespace(
+            subject="foo",
+            version="v1",
+        )
+
+        @self.graph.route(self.ns.collection_path, Operation.Search, self.ns)
+        def search():
+            return ""
+
+        @self.graph.route(self.ns.instance_path, Operation.Retrieve, self.ns)
+        def retrieve(foo_id):
+            raise NotFound
+
+    def test_enabled(self):
+        """
+        Aggregated metrics do not require a metrics client.
+
+        """
+        assert_that(self.graph.route_metrics.enabled, is_(equal_to(True)))
+        assert_that(self.graph.route_metrics.client_enabled, is_(equal_to(False)))
+
+    def test_summary(self):
+        for _ in range(10):
+            self.client.get("api/v1/foo")
+        self.client.get(f"api/v1/foo/{uuid4()}")
+
+        summary = self.graph.route_metrics.summary()
+
+        assert_that(summary["foo.search.v1"], has_key("2xx"))
+        assert_that(summary["foo.search.v1"]["2xx"], has_entries(
+            count=10,
+            p50=ANY,
+            p90=ANY,
+            p99=ANY,
+        ))
+        assert_that(summary["foo.retrieve.v1"]["4xx"], has_entries(
+            count=1,
+        ))
+
+    def test_flush(self):
+        """
+        Flushing sends the latencies recorded since the last flush.
+
+        """
+        route_metrics = self.graph.route_metrics
+        route_metrics.metrics = MagicMock()
+        route_metrics.client_enabled = True
+        route_metrics.thread = object()
+
+        for _ in range(3):
+            self.client.get("api/v1/foo")
+        route_metrics.flush()
+        self.client.get("api/v1/foo")
+        route_metrics.flush()
+
+        tags = [
+            "endpoint:foo.search.v1",
+            "backend_type:microcosm_flask",
+            "classifier:2xx",
+        ]
+        assert_that(route_metrics.metrics.increment.call_args_list, contains_inanyorder(
+            call("route.call.count", 3, tags=tags),
+            call("route.call.count", 1, tags=tags),
+        ))
+        route_metrics.metrics.gauge.assert_any_call("route.p99", ANY, tags=tags)
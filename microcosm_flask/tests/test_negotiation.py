@@ -0,0 +1,90 @@
+"""
+Content negotiation tests.
+
+"""
+from hamcrest import (
+    assert_that,
+    contains,
+    equal_to,
+    is_,
+    none,
+)
+from parameterized import parameterized
+
+from microcosm_flask.enums import ResponseFormats
+from microcosm_flask.negotiation import (
+    MediaRange,
+    negotiate,
+    parse_accept,
+    parse_media_range,
+)
+
+
+ALL_FORMATS = (
+    ResponseFormats.CSV,
+    ResponseFormats.HTML,
+    ResponseFormats.JSON,
+    ResponseFormats.TEXT,
+)
+
+
+@parameterized([
+    ("application/json", MediaRange("application", "json", 2, 1.0)),
+    ("Text/HTML; q=0.5", MediaRange("text", "html", 2, 0.5)),
+    ("text/html;level=1;q=0", MediaRange("text", "html", 3, 0.0)),
+    ("text/*;q=0.3", MediaRange("text", "*", 1, 0.3)),
+    ("*/*", MediaRange("*", "*", 0, 1.0)),
+    ("*/json", None),
+    ("json", None),
+    ("text/html;q=high", None),
+    ("text/html;q=2", None),
+])
+def test_parse_media_range(value, media_range):
+    assert_that(parse_media_range(value), is_(equal_to(media_range)))
+
+
+def test_parse_accept():
+    assert_that(
+        parse_accept("*/*;q=0.1, text/*;q=0.5, bogus, text/csv"),
+        contains(
+            MediaRange("text", "csv", 2, 1.0),
+            MediaRange("text", "*", 1, 0.5),
+            MediaRange("*", "*", 0, 0.1),
+        ),
+    )
+
+
+@parameterized([
+    # exact match
+    ("text/csv", ALL_FORMATS, ResponseFormats.CSV),
+    # wildcards resolve by server priority
+    ("*/*", ALL_FORMATS, ResponseFormats.JSON),
+    ("text/*", ALL_FORMATS, ResponseFormats.HTML),
+    # q-values win over server priority
+    ("application/json;q=0.5, text/csv", ALL_FORMATS, ResponseFormats.CSV),
+    ("text/html,application/xhtml+xml,*/*;q=0.8", ALL_FORMATS, ResponseFormats.HTML),
+    # the most specific range determines quality
+    ("text/*, text/csv;q=0", ALL_FORMATS, ResponseFormats.HTML),
+    ("*/*;q=0.1, text/plain", ALL_FORMATS, ResponseFormats.TEXT),
+    # only allowed formats are considered
+    ("text/csv, */*;q=0.1", (ResponseFormats.JSON,), ResponseFormats.JSON),
+    # nothing acceptable
+    ("application/pdf", ALL_FORMATS, None),
+    ("application/json;q=0", (ResponseFormats.JSON,), None),
+    ("", ALL_FORMATS, None),
+])
+def test_negotiate(accept, allowed_response_formats, response_format):
+    assert_that(negotiate(accept, allowed_response_formats), is_(equal_to(response_format)))
+
+
+def test_negotiate_is_cached():
+    negotiate.cache_clear()
+
+    negotiate("text/csv", ALL_FORMATS)
+    negotiate("text/csv", ALL_FORMATS)
+    negotiate("text/csv", (ResponseFormats.JSON,))
+
+    cache_info = negotiate.cache_info()
+    assert_that(cache_info.hits, is_(equal_to(1)))
+    assert_that(cache_info.misses, is_(equal_to(2)))
+    assert_that(negotiate("application/pdf", ALL_FORMATS), is_(none()))
@@ -2,21 +2,44 @@
 Paging tests.
 
 """
+from datetime import datetime, timezone
+from json import loads
+from unittest.mock import Mock
+from urllib.parse import parse_qsl, urlsplit
+from uuid import uuid4
+
 from hamcrest import (
     assert_that,
     calling,
+    contains,
     equal_to,
     has_entry,
+    has_key,
     is_,
+    is_not,
     raises,
 )
 from marshmallow import Schema
 from microcosm.api import create_object_graph
+from microcosm.errors import ValidationError
+from microcosm.loaders import load_from_dict
 from werkzeug.exceptions import UnprocessableEntity
 
+from microcosm_flask.conventions.base import EndpointDefinition
+from microcosm_flask.conventions.crud import configure_crud
+from microcosm_flask.conventions.crud_adapter import CRUDStoreAdapter
 from microcosm_flask.namespaces import Namespace
 from microcosm_flask.operations import Operation
-from microcosm_flask.paging import OffsetLimitPage, OffsetLimitPageSchema
+from microcosm_flask.paging import (
+    CursorPage,
+    CursorPageSchema,
+    HasMorePage,
+    HasMorePageSchema,
+    OffsetLimitPage,
+    OffsetLimitPageSchema,
+    identity,
+)
+from microcosm_flask.tests.conventions.fixtures import Person, PersonCSVSchema
 
 
 def test_default_values_for_offset_limit_page():
@@ -95,3 +118,215 @@ def test_offset_limit_page_to_paginated_list():
                     ),
                 ),
             ))))
+
+
+def test_has_more_page_to_dict():
+    page = HasMorePage.from_dict(dict(offset=10, limit=10, foo="bar"))
+    assert_that(page.to_dict(), is_(equal_to(dict(offset=10, limit=11, count=False, foo="bar"))))
+
+
+def test_has_more_page_to_paginated_list():
+    graph = create_object_graph(name="example", testing=True)
+
+    ns = Namespace("foo")
+
+    @graph.flask.route("/", methods=["GET"], endpoint="foo.search.v1")
+    def search():
+        pass
+
+    with graph.flask.test_request_context():
+        page = HasMorePage(offset=0, limit=2)
+        paginated_list, headers = page.to_paginated_list(iter([1, 2, 3]), _ns=ns, _operation=Operation.Search)
+
+        assert_that(headers, is_(equal_to(dict())))
+        assert_that(paginated_list.items, is_(equal_to([1, 2])))
+        assert_that(paginated_list.count, is_(equal_to(None)))
+        assert_that(
+            paginated_list._links,
+            is_(equal_to(dict(
+                self=dict(href="http://localhost/?offset=0&limit=2"),
+                next=dict(href="http://localhost/?offset=2&limit=2"),
+            ))),
+        )
+
+        page = HasMorePage(offset=2, limit=2, count=True)
+        paginated_list, headers = page.to_paginated_list(([3], 3), _ns=ns, _operation=Operation.Search)
+
+        assert_that(headers, is_(equal_to({"X-Total-Count": 3})))
+        assert_that(paginated_list.count, is_(equal_to(3)))
+        assert_that(paginated_list._links, is_not(has_key("next")))
+
+
+def create_cursor_graph(cursor_secret_key="secret"):
+    loader = load_from_dict(
+        flask=dict(
+            cursor_secret_key=cursor_secret_key,
+        ),
+    )
+    return create_object_graph(name="example", testing=True, loader=loader)
+
+
+def test_cursor_page_round_trip():
+    graph = create_cursor_graph()
+    with graph.flask.test_request_context():
+        page = CursorPage(limit=2, foo="bar").page_after(dict(id=2, name="Bob"))
+        assert_that(page.after, is_(equal_to([2])))
+
+        next_page = CursorPage.from_dict(dict(page.to_items(func=str)))
+        assert_that(next_page.to_dict(), is_(equal_to(dict(after=[2], limit=2, count=False, foo="bar"))))
+
+
+def test_cursor_page_round_trip_types():
+    graph = create_cursor_graph()
+    sort_key_values = [
+        datetime(2020, 1, 2, 3, 4, 5, 6, tzinfo=timezone.utc),
+        uuid4(),
+        "foo",
+        1,
+    ]
+    with graph.flask.test_request_context():
+        cursor = CursorPage.encode_cursor(sort_key_values)
+        assert_that(CursorPage(cursor=cursor).after, is_(equal_to(sort_key_values)))
+
+
+def test_cursor_page_requires_secret_key():
+    graph = create_cursor_graph(cursor_secret_key=None)
+    assert_that(
+        calling(configure_crud).with_args(graph, Namespace(subject=Person), {}, page_cls=CursorPage),
+        raises(ValidationError),
+    )
+
+
+def test_cursor_page_falls_back_to_app_secret_key():
+    graph = create_cursor_graph(cursor_secret_key=None)
+    graph.flask.secret_key = "secret"
+    configure_crud(graph, Namespace(subject=Person), {}, page_cls=CursorPage)
+
+
+def test_cursor_page_skips_store_count():
+    graph = create_cursor_graph()
+    store = Mock()
+    adapter = CRUDStoreAdapter(graph, store)
+    with graph.flask.test_request_context():
+        adapter.search(**CursorPage(limit=2).to_dict(func=identity))
+        assert_that(store.count.called, is_(equal_to(False)))
+
+        adapter.search(**CursorPage(limit=2, count=True).to_dict(func=identity))
+        assert_that(store.count.called, is_(equal_to(True)))
+
+
+def test_cursor_page_rejects_tampered_cursor():
+    graph = create_cursor_graph()
+    with graph.flask.test_request_context():
+        cursor = CursorPage.encode_cursor([2])
+        assert_that(
+            calling(CursorPage).with_args(cursor=cursor[:-1] + "x"),
+            raises(UnprocessableEntity),
+        )
+
+
+PEOPLE = [
+    Person(id=uuid4(), first_name="Person {}".format(index), last_name=None)
+    for index in range(5)
+]
+
+
+def person_search(after, limit, count):
+    ids = [person.id for person in PEOPLE]
+    start = 0 if after is None else ids.index(after[0]) + 1
+    items = PEOPLE[start:start + limit]
+    if count:
+        return items, len(PEOPLE)
+    return items, 10
+
+
+class TestCursorPaging:
+
+    def setup(self):
+        self.graph = create_cursor_graph()
+        configure_crud(self.graph, Namespace(subject=Person), {
+            Operation.Search: EndpointDefinition(
+                func=person_search,
+                request_schema=CursorPageSchema(),
+                response_schema=PersonCSVSchema(),
+            ),
+        }, page_cls=CursorPage)
+        self.client = self.graph.flask.test_client()
+
+    def test_search_pages_through_cursors(self):
+        uri, names = "/api/person?limit=2", []
+        while uri is not None:
+            response = self.client.get(uri)
+            assert_that(response.status_code, is_(equal_to(200)))
+            data = loads(response.data)
+            assert_that(data, has_entry("count", None))
+            names.extend(item["firstName"] for item in data["items"])
+            next_link = data["_links"].get("next")
+            uri = None if next_link is None else "{0.path}?{0.query}".format(urlsplit(next_link["href"]))
+
+        assert_that(names, contains(*[person.first_name for person in PEOPLE]))
+
+    def test_search_without_count(self):
+        response = self.client.get("/api/person?limit=2")
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.headers, is_not(has_key("X-Total-Count")))
+        assert_that(response.headers["X-Estimated-Count"], is_(equal_to("10")))
+
+    def test_search_with_count(self):
+        response = self.client.get("/api/person?limit=2&count=true")
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.headers["X-Total-Count"], is_(equal_to("5")))
+
+        data = loads(response.data)
+        assert_that(data["count"], is_(equal_to(5)))
+        next_query = dict(parse_qsl(urlsplit(data["_links"]["next"]["href"]).query))
+        assert_that(next_query, has_entry("count", "True"))
+
+    def test_search_invalid_cursor(self):
+        response = self.client.get("/api/person?cursor=foo")
+        assert_that(response.status_code, is_(equal_to(422)))
+
+
+def person_search_counting(offset, limit, count):
+    items = PEOPLE[offset:offset + limit]
+    if count:
+        return items, len(PEOPLE)
+    return items, 10
+
+
+class TestHasMorePaging:
+
+    def setup(self):
+        self.graph = create_object_graph(name="example", testing=True)
+        configure_crud(self.graph, Namespace(subject=Person), {
+            Operation.Search: EndpointDefinition(
+                func=person_search_counting,
+                request_schema=HasMorePageSchema(),
+                response_schema=PersonCSVSchema(),
+            ),
+        }, page_cls=HasMorePage)
+        self.client = self.graph.flask.test_client()
+
+    def test_search_without_count(self):
+        response = self.client.get("/api/person?offset=2&limit=2")
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.headers, is_not(has_key("X-Total-Count")))
+        assert_that(response.headers["X-Estimated-Count"], is_(equal_to("10")))
+
+        data = loads(response.data)
+        assert_that(data["count"], is_(equal_to(None)))
+        assert_that(len(data["items"]), is_(equal_to(2)))
+        assert_that(data["_links"]["next"]["href"], is_(equal_to("http://localhost/api/person?offset=4&limit=2")))
+
+    def test_search_with_count(self):
+        response = self.client.get("/api/person?offset=4&limit=2&count=true")
+        assert_that(response.status_code, is_(equal_to(200)))
+        assert_that(response.headers["X-Total-Count"], is_(equal_to("5")))
+
+        data = loads(response.data)
+        assert_that(data["count"], is_(equal_to(5)))
+        assert_that(data["_links"], is_not(has_key("next")))
+        assert_that(
+            data["_links"]["prev"]["href"],
+            is_(equal_to("http://localhost/api/person?offset=2&limit=2&count=True")),
+        )
@@ -0,0 +1,300 @@
+"""
+Request profiling tests.
+
+"""
+from glob import glob
+from os import utime
+from os.path import join
+from shutil import rmtree
+from sys import _getframe
+from tempfile import mkdtemp
+from time import perf_counter
+from unittest.mock import patch
+
+from hamcrest import (
+    assert_that,
+    contains_inanyorder,
+    contains_string,
+    empty,
+    equal_to,
+    has_entries,
+    has_length,
+    is_,
+    matches_regexp,
+    starts_with,
+)
+from microcosm.api import create_object_graph, load_from_dict
+
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+from microcosm_flask.profiling import (
+    PROFILE_HEADER,
+    StackSampler,
+    collapse,
+    parse_frame_label,
+)
+
+
+def spin():
+    start_time = perf_counter()
+    while perf_counter() - start_time < 0.05:
+        pass
+
+
+def test_collapse():
+    def inner():
+        return collapse(_getframe())
+
+    stack = inner()
+    assert_that(stack, contains_string("test_collapse ("))
+    assert_that(stack.split(";")[-2], starts_with("test_collapse ("))
+    assert_that(stack.split(";")[-1], starts_with("inner ("))
+
+
+def test_parse_frame_label():
+    assert_that(
+        parse_frame_label("wrapper (/path/to/some (file).py:42)"),
+        is_(equal_to(("wrapper", "/path/to/some (file).py", 42))),
+    )
+
+
+def test_stack_sampler_restarts_after_fork():
+    sampler = StackSampler()
+
+    with patch("microcosm_flask.profiling.Thread") as mock_thread:
+        sampler.begin("foo")
+        sampler.end()
+        sampler.begin("foo")
+        sampler.end()
+        assert_that(mock_thread.call_count, is_(equal_to(1)))
+
+        # NB: a forked process starts its own sampler thread
+        with patch("microcosm_flask.profiling.getpid", return_value=-1):
+            sampler.begin("foo")
+            sampler.end()
+        assert_that(mock_thread.call_count, is_(equal_to(2)))
+
+
+class TestRequestProfiler:
+
+    def setup(self):
+        self.profile_dir = mkdtemp()
+
+    def teardown(self):
+        rmtree(self.profile_dir)
+
+    def create_graph(self, **kwargs):
+        loader = load_from_dict(
+            request_profiler=dict(
+                enabled=True,
+                interval=0.001,
+                profile_dir=self.profile_dir,
+                **kwargs
+            ),
+        )
+        graph = create_object_graph("example", testing=True, loader=loader)
+        graph.use("flask", "route")
+
+        self.ns = Namespace(subject="foo", version="v1")
+
+        @graph.route(self.ns.collection_path, Operation.Search, self.ns)
+        def search():
+            spin()
+            return ""
+
+        @graph.route(self.ns.collection_path, Operation.Create, self.ns)
+        def create():
+            spin()
+            return ""
+
+        return graph
+
+    def profiles(self):
+        return sorted(glob(join(self.profile_dir, "*.collapsed")))
+
+    def test_sample_every(self):
+        graph = self.create_graph(sample_every=1)
+        client = graph.flask.test_client()
+
+        client.get("/api/v1/foo")
+        client.post("/api/v1/foo")
+        graph.request_profiler.flush()
+
+        profiles = self.profiles()
+        assert_that(profiles, has_length(2))
+        assert_that(profiles[0], contains_string("foo.create.v1."))
+        assert_that(profiles[1], contains_string("foo.search.v1."))
+
+        with open(profiles[1]) as profile:
+            lines = profile.read().splitlines()
+        assert_that(any("search (" in line and "spin (" in line for line in lines), is_(equal_to(True)))
+        for line in lines:
+            assert_that(line, matches_regexp(r"^\S.* \d+$"))
+
+    def test_not_sampled(self):
+        graph = self.create_graph()
+        client = graph.flask.test_client()
+
+        client.get("/api/v1/foo")
+        graph.request_profiler.flush()
+
+        assert_that(self.profiles(), has_length(0))
+
+    def test_endpoints(self):
+        graph = self.create_graph(sample_every=1, endpoints="foo.search.v1")
+        client = graph.flask.test_client()
+
+        client.get("/api/v1/foo")
+        client.post("/api/v1/foo")
+        graph.request_profiler.flush()
+
+        profiles = self.profiles()
+        assert_that(profiles, has_length(1))
+        assert_that(profiles[0], contains_string("foo.search.v1."))
+
+    def test_token(self):
+        graph = self.create_graph(secret_key="secret")
+        client = graph.flask.test_client()
+
+        client.get("/api/v1/foo", headers={PROFILE_HEADER: "invalid"})
+        graph.request_profiler.flush()
+        assert_that(self.profiles(), has_length(0))
+
+        token = graph.request_profiler.make_token()
+        client.get("/api/v1/foo", headers={PROFILE_HEADER: token})
+        graph.request_profiler.flush()
+        assert_that(self.profiles(), has_length(1))
+
+    def test_rotate(self):
+        graph = self.create_graph(max_bytes=10)
+
+        for index, name in enumerate(["a", "b", "c"]):
+            path = join(self.profile_dir, f"{name}.collapsed")
+            with open(path, "w") as profile:
+                profile.write("x 1\n")
+            utime(path, (index, index))
+
+        graph.request_profiler.rotate()
+
+        assert_that(self.profiles(), contains_inanyorder(
+            join(self.profile_dir, "b.collapsed"),
+            join(self.profile_dir, "c.collapsed"),
+        ))
+
+
+class TestContinuousProfiler:
+
+    def setup(self):
+        self.profile_dir = mkdtemp()
+        loader = load_from_dict(
+            continuous_profiler=dict(
+                enabled=True,
+                # NB: sample explicitly
+                hz=0.01,
+                windows=2,
+            ),
+            flask=dict(
+                profile_dir=self.profile_dir,
+            ),
+        )
+        self.graph = create_object_graph("example", testing=True, loader=loader)
+        self.graph.use("flask", "route")
+        self.profiler = self.graph.continuous_profiler
+
+        self.ns = Namespace(subject="foo", version="v1")
+
+        @self.graph.route(self.ns.collection_path, Operation.Search, self.ns)
+        def search():
+            self.profiler.sample()
+            return ""
+
+        @self.graph.route(self.ns.collection_path, Operation.Create, self.ns)
+        def create():
+            self.profiler.sample()
+            return ""
+
+        self.client = self.graph.flask.test_client()
+
+    def teardown(self):
+        rmtree(self.profile_dir)
+
+    def rotate(self):
+        self.profiler.maybe_rotate(now=self.profiler.current.start_time + self.profiler.window_seconds)
+
+    def test_sample(self):
+        self.client.get("/api/v1/foo")
+        self.client.get("/api/v1/foo")
+        self.client.post("/api/v1/foo")
+
+        samples, _ = self.profiler.profile()
+        assert_that(samples, has_entries({
+            "foo.search.v1": has_length(1),
+            "foo.create.v1": has_length(1),
+        }))
+        (stack, count), = samples["foo.search.v1"].items()
+        assert_that(stack.split(";")[-1], starts_with("sample ("))
+        assert_that(stack, contains_string(";search ("))
+        assert_that(count, is_(equal_to(2)))
+
+        # requests are no longer attributed once they complete
+        assert_that(self.profiler.endpoints, is_(empty()))
+
+    def test_windows(self):
+        self.client.get("/api/v1/foo")
+        self.rotate()
+        self.client.post("/api/v1/foo")
+
+        assert_that(self.profiler.profile()[0], has_length(2))
+        assert_that(self.profiler.profile(windows=0)[0], has_length(1))
+        assert_that(self.profiler.profile(endpoint="foo.search.v1")[0], has_length(1))
+
+        # asking for more windows than are kept includes all of them
+        self.rotate()
+        assert_that(self.profiler.windows, has_length(2))
+        assert_that(self.profiler.profile(windows=3)[0], has_length(2))
+        assert_that(self.profiler.profile(windows=1)[0], has_length(1))
+
+        # only the most recent windows are kept
+        self.rotate()
+        assert_that(self.profiler.windows, has_length(2))
+        assert_that(self.profiler.profile()[0], has_length(1))
+        assert_that(self.profiler.profile()[0], has_entries({
+            "foo.create.v1": has_length(1),
+        }))
+
+        # completed windows are persisted
+        profiles = sorted(glob(join(self.profile_dir, "continuous-*.collapsed")))
+        assert_that(profiles, has_length(2))
+        with open(profiles[0]) as profile:
+            lines = profile.read().splitlines()
+        assert_that(lines, has_length(1))
+        assert_that(lines[0], matches_regexp(r"^foo\.search\.v1;.*;sample \(.* 1$"))
+
+    def test_to_collapsed(self):
+        self.client.get("/api/v1/foo")
+        self.client.post("/api/v1/foo")
+
+        lines = self.profiler.to_collapsed().splitlines()
+        assert_that(lines, has_length(2))
+        assert_that(lines[0], starts_with("foo.create.v1;"))
+        assert_that(lines[1], starts_with("foo.search.v1;"))
+
+    def test_to_speedscope(self):
+        self.client.get("/api/v1/foo")
+        self.client.get("/api/v1/foo")
+
+        profile = self.profiler.to_speedscope()
+        frames = profile["shared"]["frames"]
+        (sampled,) = profile["profiles"]
+        assert_that(sampled, has_entries(
+            type="sampled",
+            name="foo.search.v1",
+            unit="seconds",
+            weights=[2 * self.profiler.interval],
+            endValue=2 * self.profiler.interval,
+        ))
+        (stack,) = sampled["samples"]
+        assert_that(frames[stack[-1]], has_entries(
+            name="sample",
+            file=contains_string("profiling.py"),
+        ))
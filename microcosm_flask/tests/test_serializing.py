@@ -0,0 +1,236 @@
+"""
+Compiled serialization tests.
+
+"""
+from timeit import repeat
+from unittest.mock import patch
+
+from hamcrest import (
+    assert_that,
+    equal_to,
+    has_key,
+    is_,
+    is_not,
+    less_than,
+)
+from marshmallow import Schema, fields, post_dump
+from microcosm.api import create_object_graph, load_from_dict
+
+from microcosm_flask.conventions.crud import configure_crud
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+from microcosm_flask.paging import OffsetLimitPage, OffsetLimitPageSchema
+from microcosm_flask.serializing import compile_schema, remove_null_values
+from microcosm_flask.tests.conventions.fixtures import (
+    PERSON_1,
+    PERSON_2,
+    EyeColor,
+    Person,
+    PersonSchema,
+    RecursiveSchema,
+    person_retrieve,
+    person_search,
+)
+
+
+class Pet:
+    def __init__(self, name, age, owner=None, nicknames=None, vaccinated=None):
+        self.name = name
+        self.age = age
+        self.owner = owner
+        self.nicknames = nicknames
+        self.vaccinated = vaccinated
+
+
+class OwnerSchema(Schema):
+    firstName = fields.String(attribute="first_name")
+    eyeColor = fields.Method("get_eye_color")
+
+    def get_eye_color(self, obj):
+        return EyeColor.TEAL.name
+
+
+class PetSchema(Schema):
+    name = fields.String(required=True)
+    age = fields.Integer()
+    weight = fields.Float(default=1.5)
+    ownerName = fields.String(attribute="owner.first_name")
+    owner = fields.Nested(OwnerSchema, allow_none=True)
+    nicknames = fields.List(fields.String())
+    vaccinated = fields.Boolean()
+    secret = fields.String(load_only=True)
+    tags = fields.Raw()
+
+
+class PostDumpSchema(Schema):
+    name = fields.String()
+
+    @post_dump
+    def upper(self, data, **kwargs):
+        return {key: value.upper() for key, value in data.items()}
+
+
+def make_pets():
+    return [
+        Pet("Fido", 3, owner=PERSON_1, nicknames=["Fi", "Do"], vaccinated=1),
+        Pet("Rex", "4", nicknames=[], vaccinated=False),
+        dict(name="Spot", age=5.0, owner=None, secret="hidden", tags=dict(color="black", size=None)),
+    ]
+
+
+def test_compiled_schema_matches_marshmallow():
+    schema = PetSchema()
+    compiled_schema = compile_schema(schema)
+
+    for pet in make_pets():
+        assert_that(compiled_schema.dump(pet), is_(equal_to(schema.dump(pet))))
+
+    assert_that(
+        compiled_schema.dump(make_pets(), many=True),
+        is_(equal_to(schema.dump(make_pets(), many=True))),
+    )
+
+
+def test_compiled_schema_matches_marshmallow_with_options():
+    schema = PetSchema(only=("name", "owner"), many=True)
+    compiled_schema = compile_schema(schema)
+
+    assert_that(compiled_schema.dump(make_pets()), is_(equal_to(schema.dump(make_pets()))))
+
+
+def test_compiled_schema_matches_attributeless_fields():
+    class LabelSchema(Schema):
+        label = fields.Method("get_label")
+        kind = fields.Constant("pet")
+        name = fields.String()
+
+        def get_label(self, obj):
+            return obj.name.upper()
+
+    schema = LabelSchema()
+    compiled_schema = compile_schema(schema)
+
+    for pet in make_pets()[:2]:
+        assert_that(compiled_schema.dump(pet), is_(equal_to(schema.dump(pet))))
+        assert_that(compiled_schema.dump(pet, skip_null=True), is_(equal_to(schema.dump(pet))))
+
+
+def test_compiled_schema_matches_recursive_schema():
+    schema = RecursiveSchema()
+    compiled_schema = compile_schema(schema)
+    tree = dict(children=[dict(children=[dict(children=[])]), dict()])
+
+    assert_that(compiled_schema.dump(tree), is_(equal_to(schema.dump(tree))))
+
+
+def test_compiled_schema_skips_null_values():
+    schema = PetSchema()
+    compiled_schema = compile_schema(schema)
+    pets = make_pets() + [Pet(None, None, owner=dict(first_name=None), nicknames=[None])]
+
+    for pet in pets:
+        assert_that(
+            compiled_schema.dump(pet, skip_null=True),
+            is_(equal_to(remove_null_values(schema.dump(pet)))),
+        )
+
+
+def test_compiled_schema_falls_back_for_hooks():
+    schema = PostDumpSchema()
+    compiled_schema = compile_schema(schema)
+
+    assert_that(compiled_schema.dump(dict(name="foo")), is_(equal_to(dict(name="FOO"))))
+
+
+def test_compiled_schema_delegates_attributes():
+    compiled_schema = compile_schema(PersonSchema())
+
+    assert_that(compiled_schema.csv_column_order, is_(equal_to(["id", "firstName", "lastName"])))
+    assert_that(compile_schema(compiled_schema), is_(compiled_schema))
+
+
+def test_compiled_paginated_list_schema_matches_marshmallow():
+    graph = create_object_graph(name="example", testing=True)
+    ns = Namespace(subject=Person)
+    configure_crud(graph, ns, {
+        Operation.Retrieve: (person_retrieve, PersonSchema()),
+        Operation.Search: (person_search, OffsetLimitPageSchema(), PersonSchema()),
+    })
+
+    schema = OffsetLimitPage.make_paginated_list_schema_class(ns, PersonSchema())()
+    compiled_schema = compile_schema(schema)
+
+    with graph.flask.test_request_context():
+        page = OffsetLimitPage(offset=0, limit=2)
+        paginated_list, _ = page.to_paginated_list(([PERSON_1, PERSON_2], 5), ns, Operation.Search)
+
+        assert_that(compiled_schema.dump(paginated_list), is_(equal_to(schema.dump(paginated_list))))
+
+
+def test_compiled_response_schemas_in_conventions():
+    loader = load_from_dict(
+        route=dict(
+            compile_response_schemas=True,
+        ),
+    )
+    graph = create_object_graph(name="example", testing=True, loader=loader)
+    ns = Namespace(subject=Person)
+    configure_crud(graph, ns, {
+        Operation.Retrieve: (person_retrieve, PersonSchema()),
+        Operation.Search: (person_search, OffsetLimitPageSchema(), PersonSchema()),
+    })
+    client = graph.flask.test_client()
+
+    response = client.get("/api/person")
+    assert_that(response.status_code, is_(equal_to(200)))
+    assert_that(response.json["items"][0]["firstName"], is_(equal_to("Alice")))
+
+    response = client.get("/api/person/{}".format(PERSON_1.id))
+    assert_that(response.status_code, is_(equal_to(200)))
+    assert_that(response.json["lastName"], is_(equal_to("Smith")))
+
+    response = client.get("/api/person", headers={"X-Response-Skip-Null": "true"})
+    assert_that(response.status_code, is_(equal_to(200)))
+    assert_that(response.json["items"][0]["firstName"], is_(equal_to("Alice")))
+    assert_that(response.json["_links"], is_not(has_key("prev")))
+
+
+def test_skip_null_without_compiled_response_schemas():
+    graph = create_object_graph(name="example", testing=True)
+    ns = Namespace(subject=Person)
+
+    def retrieve(person_id):
+        return Person(person_id, "Alice", None)
+
+    configure_crud(graph, ns, {
+        Operation.Retrieve: (retrieve, PersonSchema()),
+    })
+    client = graph.flask.test_client()
+
+    with patch("microcosm_flask.conventions.encoding.remove_null_values") as mock_remove_null_values:
+        response = client.get("/api/person/{}".format(PERSON_1.id))
+        assert_that(response.json, has_key("lastName"))
+
+        response = client.get("/api/person/{}".format(PERSON_1.id), headers={"X-Response-Skip-Null": "true"})
+
+    assert_that(response.status_code, is_(equal_to(200)))
+    assert_that(response.json["firstName"], is_(equal_to("Alice")))
+    assert_that(response.json, is_not(has_key("lastName")))
+    # null values are omitted while dumping, not in a second pass
+    assert_that(mock_remove_null_values.called, is_(equal_to(False)))
+
+
+def test_compiled_schema_is_faster():
+    """
+    Benchmark compiled serialization against marshmallow.
+
+    """
+    schema = PetSchema(many=True)
+    compiled_schema = compile_schema(schema)
+    pets = make_pets() * 50
+
+    # NB: the best of several runs is the least sensitive to load
+    marshmallow_time = min(repeat(lambda: schema.dump(pets), number=100, repeat=5))
+    compiled_time = min(repeat(lambda: compiled_schema.dump(pets), number=100, repeat=5))
+
+    assert_that(compiled_time, is_(less_than(marshmallow_time * 0.6)))
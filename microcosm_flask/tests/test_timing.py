@@ -0,0 +1,202 @@
+"""
+Phase timing tests.
+
+"""
+from itertools import count
+from unittest.mock import patch
+
+from hamcrest import (
+    assert_that,
+    contains_inanyorder,
+    equal_to,
+    greater_than_or_equal_to,
+    has_entries,
+    has_key,
+    is_,
+    is_not,
+    matches_regexp,
+)
+from microcosm.api import create_object_graph
+from microcosm.loaders import load_from_dict
+
+from microcosm_flask.conventions.crud import configure_crud
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+from microcosm_flask.paging import OffsetLimitPageSchema
+from microcosm_flask.tests.conventions.fixtures import (
+    Person,
+    PersonLookupSchema,
+    PersonSchema,
+    person_retrieve,
+    person_search,
+)
+from microcosm_flask.timing import (
+    SERVER_TIMING_HEADER,
+    format_server_timing,
+    get_phase_timings,
+    timed,
+)
+
+
+MAPPINGS = {
+    Operation.Retrieve: (person_retrieve, PersonLookupSchema(), PersonSchema()),
+    Operation.Search: (person_search, OffsetLimitPageSchema(), PersonSchema()),
+}
+
+
+def create_graph(**kwargs):
+    loader = load_from_dict(
+        flask=dict(
+            enable_server_timing=True,
+        ),
+        **kwargs,
+    )
+    graph = create_object_graph(name="example", testing=True, loader=loader)
+    configure_crud(graph, Namespace(subject=Person), MAPPINGS)
+    return graph
+
+
+def test_timed():
+    graph = create_object_graph(name="example", testing=True)
+
+    with graph.flask.test_request_context("/"):
+        with timed("foo"):
+            pass
+        with timed("foo"):
+            pass
+        with timed("bar"):
+            pass
+
+        assert_that(get_phase_timings(), has_entries(
+            foo=greater_than_or_equal_to(0.0),
+            bar=greater_than_or_equal_to(0.0),
+        ))
+
+    with graph.flask.test_request_context("/"):
+        assert_that(get_phase_timings(), is_(equal_to(dict())))
+
+
+def test_timed_per_request():
+    """
+    Requests within the same (pushed) app context do not share timings.
+
+    """
+    graph = create_object_graph(name="example", testing=True)
+
+    with graph.flask.app_context():
+        for _ in range(2):
+            with graph.flask.test_request_context("/"):
+                assert_that(get_phase_timings(), is_(equal_to(dict())))
+                with timed("foo"):
+                    pass
+                assert_that(list(get_phase_timings()), contains_inanyorder("foo"))
+
+
+def test_timed_without_context():
+    with timed("foo"):
+        pass
+
+    assert_that(get_phase_timings(), is_(equal_to(dict())))
+
+
+def test_format_server_timing():
+    assert_that(
+        format_server_timing(dict(load=1.0, func=2.5)),
+        is_(equal_to("load;dur=1.000, func;dur=2.500")),
+    )
+
+
+def test_server_timing():
+    """
+    Conventions report phase timings on request.
+
+    """
+    graph = create_graph()
+    client = graph.flask.test_client()
+
+    response = client.get("/api/person", headers={SERVER_TIMING_HEADER: "true"})
+    assert_that(response.status_code, is_(equal_to(200)))
+
+    phases = [
+        entry.split(";")[0]
+        for entry in response.headers["Server-Timing"].split(", ")
+    ]
+    assert_that(phases, contains_inanyorder("load", "func", "dump", "format", "compress", "etag"))
+    assert_that(response.headers["Server-Timing"], matches_regexp(r"^load;dur=\d+\.\d{3}, "))
+
+
+def test_server_timing_not_requested():
+    graph = create_graph()
+    client = graph.flask.test_client()
+
+    response = client.get("/api/person")
+    assert_that(response.status_code, is_(equal_to(200)))
+    assert_that(response.headers, is_not(has_key("Server-Timing")))
+
+
+def test_server_timing_disabled():
+    graph = create_object_graph(name="example", testing=True)
+    configure_crud(graph, Namespace(subject=Person), MAPPINGS)
+    client = graph.flask.test_client()
+
+    response = client.get("/api/person", headers={SERVER_TIMING_HEADER: "true"})
+    assert_that(response.status_code, is_(equal_to(200)))
+    assert_that(response.headers, is_not(has_key("Server-Timing")))
+
+
+def test_audit_phase_timings():
+    """
+    Phase timings are audit logged.
+
+    """
+    graph = create_graph()
+    client = graph.flask.test_client()
+
+    with patch("microcosm_flask.audit.getLogger") as mocked:
+        response = client.get("/api/person")
+
+    assert_that(response.status_code, is_(equal_to(200)))
+    dct = mocked.return_value.info.call_args[0][0]
+    assert_that(dct["phase_timings"], has_entries(
+        load=greater_than_or_equal_to(0.0),
+        func=greater_than_or_equal_to(0.0),
+        dump=greater_than_or_equal_to(0.0),
+    ))
+
+
+def test_server_timing_per_request():
+    graph = create_graph()
+    client = graph.flask.test_client()
+
+    with graph.flask.app_context():
+        with patch("microcosm_flask.timing.perf_counter", side_effect=count()):
+            headers = [
+                client.get("/api/person", headers={SERVER_TIMING_HEADER: "true"}).headers["Server-Timing"]
+                for _ in range(2)
+            ]
+
+    # timings do not accumulate across requests
+    assert_that(headers[1], is_(equal_to(headers[0])))
+
+
+def test_route_metrics_phases():
+    """
+    Phase timings are aggregated by route metrics.
+
+    """
+    graph = create_graph(
+        route_metrics=dict(
+            aggregate=True,
+        ),
+    )
+    client = graph.flask.test_client()
+
+    for _ in range(3):
+        client.get("/api/person")
+
+    summary = graph.route_metrics.phase_summary()
+    assert_that(summary["person.search.v1"], has_entries(
+        load=has_entries(count=3),
+        func=has_entries(count=3),
+        dump=has_entries(count=3),
+    ))
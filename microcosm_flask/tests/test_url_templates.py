@@ -0,0 +1,88 @@
+"""
+URL template tests.
+
+"""
+from urllib.parse import urljoin
+from uuid import uuid4
+
+from flask import request
+from hamcrest import (
+    assert_that,
+    calling,
+    equal_to,
+    is_,
+    none,
+    raises,
+)
+from microcosm.api import create_object_graph
+from werkzeug.routing import BuildError
+
+from microcosm_flask.linking import Link
+from microcosm_flask.namespaces import Namespace
+from microcosm_flask.operations import Operation
+from microcosm_flask.url_templates import expand_url_template
+
+
+class TestURLTemplates:
+
+    def setup(self):
+        self.graph = create_object_graph(name="example", testing=True)
+        self.ns = Namespace(subject="foo")
+        self.relation_ns = Namespace(subject="foo", object_="bar")
+        self.string_ns = Namespace(subject="baz", identifier_type="string")
+
+        for path, operation, ns in [
+            (self.ns.collection_path, Operation.Search, self.ns),
+            (self.ns.instance_path, Operation.Retrieve, self.ns),
+            (self.relation_ns.relation_path, Operation.SearchFor, self.relation_ns),
+            (self.string_ns.instance_path, Operation.Retrieve, self.string_ns),
+        ]:
+            self.graph.route(path, operation, ns)(lambda **kwargs: None)
+
+    def assert_matches_url_for(self, ns, operation, **kwargs):
+        expected = urljoin(request.url_root, ns.url_for(operation, **kwargs))
+        assert_that(expand_url_template(ns.endpoint_for(operation), kwargs), is_(equal_to(expected)))
+
+    def test_expand(self):
+        with self.graph.flask.test_request_context():
+            self.assert_matches_url_for(self.ns, Operation.Search)
+            self.assert_matches_url_for(self.ns, Operation.Retrieve, foo_id=uuid4())
+            self.assert_matches_url_for(self.relation_ns, Operation.SearchFor, foo_id=uuid4())
+            self.assert_matches_url_for(self.string_ns, Operation.Retrieve, baz_id="a b/ü")
+
+    def test_expand_with_script_root(self):
+        with self.graph.flask.test_request_context(base_url="https://example.com:8443/prefix/"):
+            self.assert_matches_url_for(self.ns, Operation.Retrieve, foo_id=uuid4())
+
+    def test_expand_per_request(self):
+        with self.graph.flask.app_context():
+            # requests in the same (pushed) app context do not share their prefix
+            for base_url in ("http://host-a.example", "http://host-b.example/prefix"):
+                with self.graph.flask.test_request_context(base_url=base_url):
+                    self.assert_matches_url_for(self.ns, Operation.Retrieve, foo_id=uuid4())
+
+    def test_fallback(self):
+        with self.graph.flask.test_request_context():
+            # missing and extra arguments defer to url_for
+            assert_that(expand_url_template(self.ns.endpoint_for(Operation.Retrieve), {}), is_(none()))
+            assert_that(
+                expand_url_template(self.ns.endpoint_for(Operation.Search), dict(offset=1)),
+                is_(none()),
+            )
+            assert_that(
+                self.ns.href_for(Operation.Search, offset=1),
+                is_(equal_to("http://localhost/api/foo?offset=1")),
+            )
+            assert_that(
+                calling(self.ns.href_for).with_args(Operation.Retrieve),
+                raises(BuildError),
+            )
+
+    def test_templated_link(self):
+        with self.graph.flask.test_request_context():
+            link = Link.for_(Operation.Retrieve, self.ns, allow_templates=True)
+
+        assert_that(link.to_dict(), is_(equal_to(dict(
+            href="http://localhost/api/foo/{foo_id}",
+            templated=True,
+        ))))
@@ -0,0 +1,86 @@
+"""
+Per-request phase timing.
+
+Conventions record the time spent in each phase of a request (e.g. loading request data,
+calling the controller, dumping the response) for the audit log and route metrics. Timings
+may also be reported in the `Server-Timing` response header.
+
+Timings are stored on the request context (not on `g`, which may be shared by several
+requests within a pushed app context); phases timed outside of a request are not recorded.
+
+"""
+from contextlib import contextmanager
+from time import perf_counter
+
+from flask import _request_ctx_stack, has_request_context, request
+
+
+SERVER_TIMING_HEADER = "X-Request-Server-Timing"
+
+# phases
+LOAD = "load"
+FUNC = "func"
+DUMP = "dump"
+SKIP_NULL = "skip_null"
+FORMAT = "format"
+COMPRESS = "compress"
+ETAG = "etag"
+
+
+@contextmanager
+def timed(phase):
+    """
+    Record the elapsed time (in milliseconds) of a phase of the current request.
+
+    Repeated phases accumulate.
+
+    """
+    start_time = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (perf_counter() - start_time) * 1000
+        if has_request_context():
+            phase_timings = get_phase_timings()
+            phase_timings[phase] = phase_timings.get(phase, 0.0) + elapsed_ms
+
+
+def get_phase_timings():
+    """
+    Get the phase timings (in milliseconds) of the current request.
+
+    """
+    if not has_request_context():
+        return dict()
+
+    request_ctx = _request_ctx_stack.top
+    try:
+        return request_ctx.phase_timings
+    except AttributeError:
+        request_ctx.phase_timings = dict()
+        return request_ctx.phase_timings
+
+
+def format_server_timing(phase_timings):
+    return ", ".join(
+        "{};dur={:.3f}".format(phase, elapsed_ms)
+        for phase, elapsed_ms in phase_timings.items()
+    )
+
+
+def configure_server_timing(app):
+    """
+    Report phase timings in the `Server-Timing` header of responses to requests that
+    ask for them (using the `X-Request-Server-Timing` header).
+
+    """
+    @app.after_request
+    def add_server_timing(response):
+        if request.headers.get(SERVER_TIMING_HEADER, "false").lower() not in ("1", "true", "yes", "on"):
+            return response
+
+        phase_timings = get_phase_timings()
+        if phase_timings:
+            response.headers["Server-Timing"] = format_server_timing(phase_timings)
+
+        return response
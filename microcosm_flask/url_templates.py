@@ -0,0 +1,125 @@
+"""
+Precompiled URL templates.
+
+Building links with `flask.url_for` is relatively expensive: each call resolves the endpoint's
+rules, applies URL defaults, and assembles an external URL from the request's URL adapter.
+
+Routes registered through `graph.route` are compiled once (at registration time) into templates
+of static parts and converters; expanding a template only converts and joins path arguments onto
+an external URL prefix that is computed once per request.
+
+Endpoints that rely on more general routing features (rule defaults, subdomains, host matching,
+URL default functions, extra values that become query string arguments, etc) are not expanded
+here; callers should fall back to `url_for`.
+
+"""
+from flask import _request_ctx_stack, current_app
+from werkzeug.routing import parse_rule
+from werkzeug.urls import url_quote
+
+
+URL_TEMPLATES = "microcosm_flask.url_templates"
+
+
+class URLTemplate:
+    """
+    A compiled URL rule.
+
+    Parts are either (quoted) static strings or (to_url, argument) tuples.
+
+    """
+    def __init__(self, parts, arguments):
+        self.parts = parts
+        self.arguments = arguments
+
+    @classmethod
+    def compile(cls, rule):
+        """
+        Compile a (bound) werkzeug rule.
+
+        Returns None if the rule cannot be expanded without werkzeug.
+
+        """
+        if rule.defaults or rule.subdomain or rule.host or rule.websocket or rule.map.host_matching:
+            return None
+
+        parts = []
+        for converter, _, variable in parse_rule(rule.rule):
+            if converter is not None:
+                parts.append((rule._converters[variable].to_url, variable))
+                continue
+            static = url_quote(variable.encode(rule.map.charset), safe="/:|+")
+            if parts and isinstance(parts[-1], str):
+                parts[-1] += static
+            else:
+                parts.append(static)
+
+        return cls(parts, frozenset(rule.arguments))
+
+    def expand(self, values):
+        return "".join(
+            part if isinstance(part, str) else part[0](values[part[1]])
+            for part in self.parts
+        )
+
+
+def register_url_template(app, endpoint):
+    """
+    Compile the URL template for an endpoint.
+
+    Endpoints with more than one rule are never expanded.
+
+    """
+    rules = list(app.url_map.iter_rules(endpoint))
+    url_template = URLTemplate.compile(rules[0]) if len(rules) == 1 else None
+    app.extensions.setdefault(URL_TEMPLATES, {})[endpoint] = url_template
+
+
+def get_url_prefix():
+    """
+    Compute (and cache) the external URL prefix for the current request.
+
+    Matches the prefix werkzeug uses for external URLs. The prefix depends on the request's
+    scheme, host, and script root, so it is cached on the request context (not on `g`).
+
+    """
+    request_ctx = _request_ctx_stack.top
+    try:
+        return request_ctx.url_template_prefix
+    except AttributeError:
+        pass
+
+    url_adapter = request_ctx.url_adapter
+    url_scheme = url_adapter.url_scheme
+    if url_scheme:
+        url_scheme = "https:" if url_scheme in ("https", "wss") else "http:"
+
+    request_ctx.url_template_prefix = "{}//{}{}".format(
+        url_scheme,
+        url_adapter.get_host(""),
+        url_adapter.script_name[:-1],
+    )
+    return request_ctx.url_template_prefix
+
+
+def expand_url_template(endpoint, values):
+    """
+    Build an external URL for an endpoint, equivalent to `url_for(endpoint, _external=True, **values)`.
+
+    Must be called within a request context.
+
+    Returns None if the endpoint has no (usable) template.
+
+    """
+    url_template = current_app.extensions.get(URL_TEMPLATES, {}).get(endpoint)
+    if url_template is None or current_app.url_default_functions:
+        return None
+
+    if values.keys() != url_template.arguments or any(value is None for value in values.values()):
+        # let url_for raise build errors (or append query string arguments)
+        return None
+
+    if _request_ctx_stack.top.url_adapter is None:
+        return None
+
+    return "{}/{}".format(get_url_prefix(), url_template.expand(values).lstrip("/"))
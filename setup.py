@@ -35,10 +35,16 @@ setup(
         "rfc3986>=1.2.0",
     ],
     extras_require={
+        "arrow": "pyarrow>=3.0.0",
+        "brotli": "brotli>=1.0.0",
         "metrics": "microcosm-metrics>=2.2.0",
+        "msgpack": "msgpack>=1.0.0",
+        "orjson": "orjson>=3.0.0",
         "profiling": "pyinstrument>=3.0",
         "sentry": "sentry-sdk>=0.14.4",
         "spooky": "spooky>=2.0.0",
+        "ujson": "ujson>=5.4.0",
+        "zstd": "zstandard>=0.15.0",
         "test": [
             "nose>=1.3.7",
             "sentry-sdk>=0.14.4",
@@ -80,14 +86,19 @@ setup(
             "config_convention = microcosm_flask.conventions.config:configure_config",
             "landing_convention = microcosm_flask.conventions.landing:configure_landing",
             "logging_level_convention = microcosm_flask.conventions.logging_level:configure_logging_level",
+            "metrics_convention = microcosm_flask.conventions.metrics:configure_metrics",
+            "profile_convention = microcosm_flask.conventions.profile:configure_profile",
             "port_forwarding = microcosm_flask.forwarding:configure_port_forwarding",
             "request_context = microcosm_flask.context:configure_request_context",
             "route = microcosm_flask.routing:configure_route_decorator",
             "route_metrics = microcosm_flask.metrics:RouteMetrics",
+            "search_executor = microcosm_flask.executors:SearchExecutor",
             "sentry_logging = microcosm_flask.sentry:configure_sentry",
             "swagger_convention = microcosm_flask.conventions.swagger:configure_swagger",
             "uuid = microcosm_flask.converters:configure_uuid",
             "memory_profiler = microcosm_flask.memory:MemoryProfiler",
+            "request_profiler = microcosm_flask.profiling:RequestProfiler",
+            "continuous_profiler = microcosm_flask.profiling:ContinuousProfiler",
         ],
     },
     tests_require=[